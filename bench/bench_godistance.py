@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+Benchmark of GoDistanceCounter on the deepest terms of an ontology.
+
+It compares the path based algorithm used on a plain graph with the
+breadth-first search used on a compiled graph, checks that both return
+the same scores and reports the speedup.
+
+Usage: python bench_godistance.py gene_ontology.obo [--terms 20]
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+from src import PyGoLib
+from src.godistance import GoDistanceCounter
+from src.oboio import OboIO
+
+
+class Timeout(Exception):
+    """ Raised when scoring one pair takes too long. """
+    pass
+
+
+def _on_alarm(signum, frame):
+    """ Interrupt the current computation. """
+    raise Timeout()
+
+
+def get_deepest_terms(graph, number):
+    """ Return the identifiers of the terms with the most is_a edges
+    between them and the top of the tree.
+    :arg graph, a compiled graph.
+    :arg number, the number of terms to return.
+    """
+    graph.build_closure()
+    depth = [0] * len(graph.ids)
+    for node in sorted(xrange(len(graph.ids)), key=graph.rank.__getitem__):
+        parents = graph.parents(node)
+        if parents:
+            depth[node] = 1 + max(depth[parent] for (parent, _) in parents)
+    order = sorted(xrange(len(graph.ids)), key=lambda idx: -depth[idx])
+    return [(graph.accession(idx), depth[idx]) for idx in order[:number]]
+
+
+def time_pairs(scorer, pairs, timeout=None):
+    """ Score the pairs, return the scores and the time spent.
+    Pairs taking longer than timeout seconds are skipped.
+    :arg scorer, a GoDistanceCounter.
+    :arg pairs, a list of (id1, id2) pairs.
+    :kwarg timeout, the maximum number of seconds spent per pair.
+    """
+    scores = {}
+    start = time.time()
+    for (id1, id2) in pairs:
+        if timeout:
+            signal.alarm(timeout)
+        try:
+            scores[(id1, id2)] = scorer.scores(id1, id2)
+        except Timeout:
+            scores[(id1, id2)] = Timeout
+        finally:
+            signal.alarm(0)
+    return (scores, time.time() - start)
+
+
+def main():
+    """ Run the benchmark. """
+    parser = argparse.ArgumentParser(description=(
+        'Benchmark of GoDistanceCounter on the deepest terms of an '
+        'ontology.'))
+    parser.add_argument('ontology', help='The OBO file to use.')
+    parser.add_argument('--terms', type=int, default=20,
+                        help='Number of deepest terms to compare pairwise.')
+    parser.add_argument('--timeout', type=int, default=60,
+                        help='Maximum number of seconds per pair for the '
+                        'path based algorithm.')
+    args = parser.parse_args()
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+    terms = OboIO().get_graph(args.ontology)
+    start = time.time()
+    graph = PyGoLib(terms).compile()
+    graph.build_closure()
+    print 'Graph compiled in %.3fs' % (time.time() - start)
+
+    deepest = get_deepest_terms(graph, args.terms)
+    print 'Deepest terms: %s' % ', '.join(
+        '%s (%s)' % (termid, depth) for (termid, depth) in deepest)
+    ids = [termid for (termid, _) in deepest]
+    pairs = [(id1, id2) for (cnt, id1) in enumerate(ids)
+             for id2 in ids[cnt + 1:]]
+
+    (new, new_time) = time_pairs(GoDistanceCounter(graph), pairs)
+    (old, old_time) = time_pairs(GoDistanceCounter(terms), pairs,
+                                 timeout=args.timeout)
+    skipped = [pair for pair in pairs if old[pair] is Timeout]
+    differ = [pair for pair in pairs
+              if old[pair] is not Timeout and old[pair] != new[pair]]
+    print '%s pairs scored' % len(pairs)
+    print 'Paths:    %.3fs (%s pairs skipped after %ss)' % (
+        old_time, len(skipped), args.timeout)
+    print 'Compiled: %.3fs' % new_time
+    print 'Speedup:  %.0fx (at least)' % (old_time / max(new_time, 1e-9))
+    if differ:
+        print '%s pairs with a different score:' % len(differ)
+        for pair in differ:
+            print ' %s %s: %s != %s' % (pair + (old[pair], new[pair]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Seeded generator of synthetic ontologies with the shape of the Gene
+Ontology: three namespaces, terms with several is_a parents, part_of
+relationships, alternative identifiers and a depth of up to 15 levels.
+The same seed always gives the same file.
+
+Usage: python gen_obo.py output.obo [--terms 45000] [--seed 42]
+"""
+
+import argparse
+import random
+
+# Namespaces, their root and their share of the terms
+NAMESPACES = [
+    ('biological_process', 'GO:0008150', 0.64),
+    ('molecular_function', 'GO:0003674', 0.24),
+    ('cellular_component', 'GO:0005575', 0.12),
+]
+# Distribution of the number of is_a parents of a term
+PARENTS = [1, 1, 1, 1, 2, 2, 2, 3, 3, 4]
+# Share of the terms with a part_of relationship and with alt_ids
+PART_OF = 0.15
+ALT_ID = 0.05
+WORDS = ['regulation', 'positive', 'negative', 'process', 'activity',
+         'binding', 'complex', 'cellular', 'metabolic', 'transport',
+         'biosynthetic', 'catabolic', 'response', 'signaling', 'membrane',
+         'receptor', 'protein', 'nucleic', 'acid', 'development']
+
+
+def _get_depths(number, max_depth, rand):
+    """ Return the depth of each term of a namespace, the number of
+    terms growing with the depth up to the middle levels like in GO.
+    :arg number, the number of terms of the namespace.
+    :arg max_depth, the maximum depth.
+    :arg rand, the random generator.
+    """
+    weights = [min(level, max_depth + 1 - level) ** 2
+               for level in range(1, max_depth + 1)]
+    depths = []
+    for _ in xrange(number):
+        depths.append(1 + _weighted_choice(weights, rand))
+    depths.sort()
+    return depths
+
+
+def _weighted_choice(weights, rand):
+    """ Return the position of an element chosen according to its
+    weight.
+    :arg weights, the list of the weights.
+    :arg rand, the random generator.
+    """
+    value = rand.random() * sum(weights)
+    for (position, weight) in enumerate(weights):
+        value = value - weight
+        if value < 0:
+            return position
+    return len(weights) - 1
+
+
+def generate(stream, terms=45000, seed=42, max_depth=15):
+    """ Write a synthetic ontology in the OBO format.
+    :arg stream, the opened file to write to.
+    :kwarg terms, the number of terms to generate.
+    :kwarg seed, the seed of the random generator.
+    :kwarg max_depth, the maximum number of is_a edges between a term
+        and the root of its namespace.
+    """
+    rand = random.Random(seed)
+    stream.write('format-version: 1.2\n')
+    stream.write('data-version: synthetic/seed-%s\n' % seed)
+    stream.write('default-namespace: gene_ontology\n\n')
+
+    counter = [10000]
+
+    def new_id():
+        """ Return a new unused identifier. """
+        counter[0] = counter[0] + 1
+        return 'GO:%07d' % counter[0]
+
+    for (namespace, root, share) in NAMESPACES:
+        write_term(stream, root, namespace.replace('_', ' '), namespace,
+                   [], [], [])
+        # Terms of each level of the namespace
+        levels = [[root]]
+        for depth in _get_depths(int(terms * share) - 1, max_depth, rand):
+            while len(levels) <= depth:
+                levels.append([])
+            candidates = [level for level in levels[:depth] if level]
+            termid = new_id()
+            # The first parent is at the level just above, the others
+            # anywhere above
+            parents = [rand.choice(candidates[-1])]
+            for _ in xrange(rand.choice(PARENTS) - 1):
+                parent = rand.choice(rand.choice(candidates))
+                if parent not in parents:
+                    parents.append(parent)
+            part_of = []
+            if rand.random() < PART_OF and len(candidates) > 1:
+                parent = rand.choice(rand.choice(candidates[1:]))
+                if parent not in parents:
+                    part_of.append(parent)
+            alternatives = []
+            while rand.random() < ALT_ID:
+                alternatives.append(new_id())
+            name = ' '.join(rand.sample(WORDS, rand.randint(2, 5)))
+            write_term(stream, termid, name, namespace, parents, part_of,
+                       alternatives)
+            levels[depth].append(termid)
+
+    stream.write('[Typedef]\nid: part_of\nname: part of\n'
+                 'is_transitive: true\n\n')
+
+
+def write_term(stream, termid, name, namespace, parents, part_of,
+               alternatives):
+    """ Write a [Term] stanza.
+    :arg stream, the opened file to write to.
+    :arg termid, the identifier of the term.
+    :arg name, the name of the term.
+    :arg namespace, the namespace of the term.
+    :arg parents, the identifiers of its is_a parents.
+    :arg part_of, the identifiers of its part_of parents.
+    :arg alternatives, its alternative identifiers.
+    """
+    stream.write('[Term]\nid: %s\nname: %s\nnamespace: %s\n' % (
+        termid, name, namespace))
+    for alternative in alternatives:
+        stream.write('alt_id: %s\n' % alternative)
+    stream.write('def: "Synthetic term %s." [GOC:bench]\n' % termid)
+    for parent in parents:
+        stream.write('is_a: %s\n' % parent)
+    for parent in part_of:
+        stream.write('relationship: part_of %s\n' % parent)
+    stream.write('\n')
+
+
+def main():
+    """ Generate an ontology from the command line arguments. """
+    parser = argparse.ArgumentParser(description=(
+        'Seeded generator of synthetic ontologies with the shape of the '
+        'Gene Ontology.'))
+    parser.add_argument('output', help='The OBO file to write.')
+    parser.add_argument('--terms', type=int, default=45000,
+                        help='Number of terms to generate.')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed of the random generator.')
+    parser.add_argument('--max-depth', type=int, default=15,
+                        help='Maximum depth of the terms.')
+    args = parser.parse_args()
+    with open(args.output, 'w') as stream:
+        generate(stream, terms=args.terms, seed=args.seed,
+                 max_depth=args.max_depth)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Benchmark suite of the library on a synthetic ontology of the size of
+the Gene Ontology (see gen_obo.py) or on a given OBO file.
+
+Each scenario is timed and the results are written as JSON, along with
+the commit and the Python version, so runs can be compared across
+commits with --compare.
+
+Usage: python run_bench.py [--ontology go.obo] [--output results.json]
+                           [--compare previous.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+from src import Profiler, PyGoLib
+from src.gafio import GeneIndex
+from src.godistance import GoDistanceCounter
+from src.gsesame import GsesameGO, GsesameGene
+from src.oboio import OboIO
+
+from gen_obo import generate
+
+SCENARIOS = ['parse', 'compile', 'get_path', 'godistance_pair',
+             'gsesame_pair', 'all_pairs', 'top_k', 'gene_pair',
+             'gene_screen']
+
+
+class Timeout(Exception):
+    """ Raised when one item of a scenario takes too long. """
+    pass
+
+
+def _on_alarm(signum, frame):
+    """ Interrupt the current computation. """
+    raise Timeout()
+
+
+def _has_numpy():
+    """ Return whether NumPy is installed. """
+    try:
+        import numpy
+    except ImportError:
+        return False
+    return True
+
+
+def get_commit():
+    """ Return the commit of the working tree, if it is a git checkout.
+    """
+    try:
+        return subprocess.Popen(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE).communicate()[0].strip() or None
+    except OSError:
+        return None
+
+
+class Bench(object):
+    """ Run the scenarios on one ontology and keep their results. """
+
+    def __init__(self, ontology, seed=42, pairs=1000, terms=200, genes=500,
+                 timeout=10):
+        """ Constructor.
+        :arg ontology, the OBO file to use.
+        :kwarg seed, the seed used to draw the terms and the genes.
+        :kwarg pairs, the number of pairs scored one at a time.
+        :kwarg terms, the number of terms scored against each other.
+        :kwarg genes, the number of synthetic genes.
+        :kwarg timeout, the maximum number of seconds spent on one term
+            by the path based scenarios.
+        """
+        self.ontology = ontology
+        self.rand = random.Random(seed)
+        self.pairs = pairs
+        self.terms = terms
+        self.genes = genes
+        self.timeout = timeout
+        self.graph = None
+        self.compiled = None
+        self.results = {}
+
+    def record(self, name, seconds, count, **extra):
+        """ Store and print the result of a scenario.
+        :arg name, the name of the scenario.
+        :arg seconds, the time spent.
+        :arg count, the number of items handled.
+        :kwarg extra, other values to store.
+        """
+        result = {'seconds': round(seconds, 6), 'count': count,
+                  'per_second': round(count / max(seconds, 1e-9), 3)}
+        result.update(extra)
+        self.results[name] = result
+        print '%-16s %10.3fs %10s items %12.1f items/s %s' % (
+            name, seconds, count, result['per_second'],
+            ' '.join('%s=%s' % item for item in sorted(extra.items())))
+
+    def sample_terms(self, number):
+        """ Return the identifiers of terms drawn at random.
+        :arg number, the number of terms to draw.
+        """
+        ids = self.compiled.ids
+        return [ids[self.rand.randrange(len(ids))] for _ in xrange(number)]
+
+    def sample_pairs(self, number):
+        """ Return pairs of terms drawn at random.
+        :arg number, the number of pairs to draw.
+        """
+        terms = self.sample_terms(2 * number)
+        return zip(terms[::2], terms[1::2])
+
+    def bench_parse(self):
+        """ Parse the OBO file. """
+        start = time.time()
+        self.graph = OboIO().get_graph(self.ontology)
+        self.record('parse', time.time() - start,
+                    len(set(term['id'] for term in self.graph.values())))
+
+    def bench_compile(self):
+        """ Compile the graph and build the closures. """
+        start = time.time()
+        self.compiled = PyGoLib(self.graph).compile()
+        self.compiled.build_closure(False)
+        self.compiled.build_closure(True)
+        self.record('compile', time.time() - start, len(self.compiled.ids))
+
+    def bench_get_path(self):
+        """ Browse all the paths to the top of the tree of terms. """
+        golib = PyGoLib(self.graph)
+        count = 0
+        skipped = 0
+        spent = 0
+        for termid in self.sample_terms(self.terms):
+            signal.alarm(self.timeout)
+            start = time.time()
+            try:
+                count = count + len(golib.get_path(
+                    self.graph[termid], pred=termid, paths=[]))
+            except Timeout:
+                skipped = skipped + 1
+            finally:
+                signal.alarm(0)
+                spent = spent + time.time() - start
+        self.record('get_path', spent, self.terms - skipped, paths=count,
+                    skipped=skipped)
+
+    def bench_godistance_pair(self):
+        """ Score pairs of terms one at a time with GoDistanceCounter. """
+        gdc = GoDistanceCounter(self.compiled)
+        pairs = self.sample_pairs(self.pairs)
+        start = time.time()
+        for (id1, id2) in pairs:
+            gdc.scores(id1, id2)
+        self.record('godistance_pair', time.time() - start, len(pairs))
+
+    def bench_gsesame_pair(self):
+        """ Score pairs of terms one at a time with GsesameGO, starting
+        from an empty cache. """
+        self.compiled.caches.pop('gsesame', None)
+        gsgo = GsesameGO(self.compiled)
+        pairs = self.sample_pairs(self.pairs)
+        start = time.time()
+        for (id1, id2) in pairs:
+            gsgo.scores(id1, id2)
+        self.record('gsesame_pair', time.time() - start, len(pairs),
+                    hits=gsgo.cache.hits, misses=gsgo.cache.misses)
+
+    def bench_all_pairs(self):
+        """ Score all the pairs of a set of terms with GsesameGO. """
+        self.compiled.caches.pop('gsesame', None)
+        gsgo = GsesameGO(self.compiled)
+        terms = self.sample_terms(self.terms)
+        count = len(terms) * (len(terms) - 1) / 2
+        start = time.time()
+        if _has_numpy():
+            gsgo.similarity_matrix(terms)
+            method = 'similarity_matrix'
+        else:
+            for (cnt, id1) in enumerate(terms):
+                for id2 in terms[cnt + 1:]:
+                    gsgo.scores(id1, id2)
+            method = 'scores'
+        self.record('all_pairs', time.time() - start, count, method=method)
+
+    def bench_top_k(self):
+        """ Find the ten terms the most similar to terms drawn at random
+        with GsesameGO, starting from an empty cache. """
+        self.compiled.caches.pop('gsesame', None)
+        gsgo = GsesameGO(self.compiled, profiler=Profiler())
+        terms = self.sample_terms(20)
+        start = time.time()
+        for termid in terms:
+            gsgo.top_k(termid, 10)
+        counters = gsgo.profiler.report()['counters']
+        self.record('top_k', time.time() - start, len(terms),
+                    candidates=counters['candidates'],
+                    scored=counters['scored'])
+
+    def get_gene_index(self):
+        """ Return an index of synthetic genes annotated with 1 to 10
+        terms drawn at random. """
+        index = GeneIndex()
+        for cnt in xrange(self.genes):
+            positions = set(index.get_term_position(termid) for termid in
+                            self.sample_terms(self.rand.randint(1, 10)))
+            index.add_gene('GENE%s' % cnt, positions)
+        return index
+
+    def bench_gene_pair(self):
+        """ Score pairs of synthetic genes one at a time with
+        GsesameGene. """
+        self.compiled.caches.pop('gsesame', None)
+        index = self.get_gene_index()
+        sesamegene = GsesameGene(self.compiled)
+        genes = list(index)
+        pairs = [(self.rand.choice(genes), self.rand.choice(genes))
+                 for _ in xrange(self.pairs)]
+        start = time.time()
+        for (gene1, gene2) in pairs:
+            sesamegene.scores(index.get_terms(gene1), index.get_terms(gene2))
+        self.record('gene_pair', time.time() - start, len(pairs))
+
+    def bench_gene_screen(self):
+        """ Score a few synthetic genes against all the others. """
+        if not _has_numpy():
+            print 'gene_screen      skipped, NumPy is not installed'
+            return
+        self.compiled.caches.pop('gsesame', None)
+        index = self.get_gene_index()
+        sesamegene = GsesameGene(self.compiled)
+        queries = list(index)[:10]
+        start = time.time()
+        for gene in queries:
+            for _ in sesamegene.scores_against_all(gene, index):
+                pass
+        self.record('gene_screen', time.time() - start,
+                    len(queries) * (len(index) - 1))
+
+    def run(self, scenarios):
+        """ Run the given scenarios, parsing and compiling the ontology
+        first when needed.
+        :arg scenarios, the names of the scenarios to run.
+        """
+        signal.signal(signal.SIGALRM, _on_alarm)
+        for name in SCENARIOS:
+            if name in scenarios:
+                getattr(self, 'bench_%s' % name)()
+            elif name == 'parse':
+                self.graph = OboIO().get_graph(self.ontology)
+            elif name == 'compile':
+                self.compiled = PyGoLib(self.graph).compile()
+
+
+def compare(previous, current):
+    """ Print the ratio between the times of two runs.
+    :arg previous, the results of the reference run.
+    :arg current, the results of the new run.
+    """
+    print '\nCompared with %s (%s):' % (previous['meta'].get('commit'),
+                                       previous['meta'].get('date'))
+    for name in SCENARIOS:
+        if name not in previous['scenarios'] or \
+                name not in current['scenarios']:
+            continue
+        before = previous['scenarios'][name]['seconds']
+        after = current['scenarios'][name]['seconds']
+        print '%-16s %10.3fs -> %10.3fs  x%.2f' % (
+            name, before, after, before / max(after, 1e-9))
+
+
+def main():
+    """ Run the benchmark. """
+    parser = argparse.ArgumentParser(description=(
+        'Benchmark suite of the library on a synthetic ontology of the '
+        'size of the Gene Ontology or on a given OBO file.'))
+    parser.add_argument('--ontology', default=None,
+                        help='The OBO file to use, a synthetic ontology is '
+                        'generated if none is given.')
+    parser.add_argument('--size', type=int, default=45000,
+                        help='Number of terms of the synthetic ontology.')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed of the random generators.')
+    parser.add_argument('--pairs', type=int, default=1000,
+                        help='Number of pairs scored one at a time.')
+    parser.add_argument('--terms', type=int, default=200,
+                        help='Number of terms scored against each other.')
+    parser.add_argument('--genes', type=int, default=500,
+                        help='Number of synthetic genes.')
+    parser.add_argument('--timeout', type=int, default=10,
+                        help='Maximum number of seconds per term for the '
+                        'path based scenarios.')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='Comma ( , ) separated list of the scenarios '
+                        'to run among: %s.' % ', '.join(SCENARIOS))
+    parser.add_argument('--output', default=None,
+                        help='The JSON file to write the results to.')
+    parser.add_argument('--compare', default=None,
+                        help='A JSON file of a previous run to compare '
+                        'with.')
+    args = parser.parse_args()
+
+    ontology = args.ontology
+    if not ontology:
+        (handle, ontology) = tempfile.mkstemp(suffix='.obo')
+        with os.fdopen(handle, 'w') as stream:
+            generate(stream, terms=args.size, seed=args.seed)
+    try:
+        bench = Bench(ontology, seed=args.seed, pairs=args.pairs,
+                      terms=args.terms, genes=args.genes,
+                      timeout=args.timeout)
+        bench.run(args.scenarios.split(','))
+    finally:
+        if not args.ontology:
+            os.unlink(ontology)
+
+    results = {
+        'meta': {
+            'commit': get_commit(),
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'ontology': args.ontology or 'synthetic',
+            'size': args.size,
+            'seed': args.seed,
+            'pairs': args.pairs,
+            'terms': args.terms,
+            'genes': args.genes,
+        },
+        'scenarios': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as stream:
+            compare(json.load(stream), results)
+
+
+if __name__ == '__main__':
+    main()
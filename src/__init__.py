@@ -32,13 +32,28 @@ THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import datetime
+import glob
+import json
 import logging
 import os
-import urllib
+import sys
+import time
+import urllib2
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
 
 __version__ = '0.1.0'
 
 GOURL = 'http://geneontology.org/ontology/obo_format_1_2/gene_ontology_ext.obo'
+# Size of the chunks read from the network and written to the disk
+DOWNLOAD_CHUNK = 1 << 16
 
 logging.basicConfig()
 LOG = logging.getLogger('golib')
@@ -52,56 +67,277 @@ class PyGoLibException(Exception):
     pass
 
 
+class LRUCache(object):
+    """ A dictionary-like cache holding at most `maxsize` entries, the
+    least recently used entries being evicted first.
+    It counts its hits and misses.
+    """
+
+    def __init__(self, maxsize=None):
+        """ Constructor.
+        :kwarg maxsize, the maximum number of entries kept in the cache,
+            None for no limit.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def get(self, key, default=None):
+        """ Return the value stored for a key and mark it as the most
+        recently used, or default if it is not in the cache.
+        :arg key, the key to look for.
+        :kwarg default, the value to return if the key is not cached.
+        """
+        try:
+            value = self.__data.pop(key)
+        except KeyError:
+            self.misses = self.misses + 1
+            return default
+        self.hits = self.hits + 1
+        self.__data[key] = value
+        return value
+
+    def set(self, key, value):
+        """ Store a value in the cache, evicting the least recently used
+        entries if the cache is full.
+        :arg key, the key of the value.
+        :arg value, the value to store.
+        """
+        self.__data.pop(key, None)
+        self.__data[key] = value
+        self.resize(self.maxsize)
+
+    def items(self):
+        """ Return the list of the (key, value) of the cache, from the
+        least to the most recently used. """
+        return self.__data.items()
+
+    def discard(self, keys):
+        """ Remove some keys from the cache, if they are in it.
+        :arg keys, an iterable of keys.
+        """
+        for key in keys:
+            self.__data.pop(key, None)
+
+    def clear(self):
+        """ Empty the cache and reset its counters. """
+        self.__data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def resize(self, maxsize):
+        """ Change the maximum size of the cache, evicting the least
+        recently used entries if needed.
+        :arg maxsize, the maximum number of entries, None for no limit.
+        """
+        self.maxsize = maxsize
+        if maxsize is not None:
+            while len(self.__data) > maxsize:
+                self.__data.popitem(last=False)
+
+    def info(self):
+        """ Return the statistics of the cache as a dictionary. """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.__data), 'maxsize': self.maxsize}
+
+
+class Profiler(object):
+    """ Collects the time spent in each phase of a computation (ie:
+    load, index, score) and counters of the work done (ie: paths,
+    edges), along with the statistics of the caches watched.
+    A phase entered again while it is running, for example when a gene
+    is scored through the scores of its GO terms, is timed once.
+    """
+
+    def __init__(self):
+        """ Constructor. """
+        self.timers = {}
+        self.counters = {}
+        self.caches = {}
+        self.__running = set()
+
+    @contextmanager
+    def phase(self, name):
+        """ Time the code run in the `with` block as part of a phase.
+        :arg name, the name of the phase.
+        """
+        if name in self.__running:
+            yield
+            return
+        self.__running.add(name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.__running.discard(name)
+            timer = self.timers.setdefault(name, [0.0, 0])
+            timer[0] = timer[0] + time.time() - start
+            timer[1] = timer[1] + 1
+
+    def count(self, name, value=1):
+        """ Increase a counter.
+        :arg name, the name of the counter.
+        :kwarg value, the value to add to the counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def maximum(self, name, value):
+        """ Keep the highest value seen for a counter.
+        :arg name, the name of the counter.
+        :arg value, the value seen.
+        """
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+    def watch_cache(self, name, cache):
+        """ Include the statistics of a cache in the reports.
+        :arg name, the name of the cache.
+        :arg cache, the LRUCache to watch.
+        """
+        self.caches[name] = cache
+
+    def reset(self):
+        """ Reset the timers and the counters. """
+        self.timers.clear()
+        self.counters.clear()
+
+    def report(self):
+        """ Return the timers, counters, caches statistics and peak
+        memory (in kilobytes) as a dictionary. """
+        return {
+            'timers': dict(
+                (name, {'seconds': seconds, 'calls': calls})
+                for (name, (seconds, calls)) in self.timers.items()),
+            'counters': dict(self.counters),
+            'caches': dict((name, cache.info())
+                           for (name, cache) in self.caches.items()),
+            'peak_memory_kb': get_peak_memory(),
+        }
+
+    def summary(self):
+        """ Return the report as human readable text. """
+        lines = []
+        for (name, (seconds, calls)) in sorted(self.timers.items()):
+            lines.append('%-20s %10.3fs (%s calls)' % (name, seconds, calls))
+        for (name, value) in sorted(self.counters.items()):
+            lines.append('%-20s %10s' % (name, value))
+        for (name, cache) in sorted(self.caches.items()):
+            lines.append('%(name)-20s hits=%(hits)s misses=%(misses)s '
+                         'size=%(size)s' % dict(cache.info(), name=name))
+        memory = get_peak_memory()
+        if memory is not None:
+            lines.append('%-20s %10s KB' % ('peak memory', memory))
+        return '\n'.join(lines)
+
+
+class _NoPhase(object):
+    """ Context manager doing nothing, see NullProfiler.phase(). """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class NullProfiler(Profiler):
+    """ Profiler collecting nothing, used when no statistics are asked
+    for, so the computations are not slowed down by the timers.
+    """
+
+    def phase(self, name):
+        """ Return a context manager doing nothing.
+        :arg name, the name of the phase.
+        """
+        return _NO_PHASE
+
+    def count(self, name, value=1):
+        """ Ignore the counter.
+        :arg name, the name of the counter.
+        :kwarg value, the value to add to the counter.
+        """
+        pass
+
+    def maximum(self, name, value):
+        """ Ignore the counter.
+        :arg name, the name of the counter.
+        :arg value, the value seen.
+        """
+        pass
+
+    def watch_cache(self, name, cache):
+        """ Ignore the cache.
+        :arg name, the name of the cache.
+        :arg cache, the LRUCache to watch.
+        """
+        pass
+
+
+def get_peak_memory():
+    """ Return the peak memory (resident set size) used by the process
+    and its finished children, in kilobytes, or None if it is unknown.
+    """
+    if resource is None:
+        return None
+    memory = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == 'darwin':
+        # In bytes on Mac OS X
+        memory = memory / 1024
+    return memory
+
+
+class Graph(dict):
+    """ The graph of ontologies: a dictionary of the terms by identifier
+    (and by alt_id), as built by OboIO.get_graph().
+    Like CompiledGraph, it keeps in `caches` the data derived from the
+    graph by the algorithms, by name, so they are shared by all the
+    objects working on the graph.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.caches = {}
+
+
 class PyGoLib(object):
     """ Utility class with some functions to play with the graph."""
 
-    def __init__(self, graph=None):
-        """ Constructor. """
+    def __init__(self, graph=None, profiler=None):
+        """ Constructor.
+        :kwarg graph, the graph of ontologies.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, none are collected by default.
+        """
         self.graph = graph
         if not self.graph:
             self.graph = {}
         self.log = get_logger()
+        self.profiler = profiler
+        if self.profiler is None:
+            self.profiler = NullProfiler()
         self.subgraph = {}
-
-    def __do_handle_parent(self, termid, level, pred, paths,
-                           verbose=False, details=False, rtype=""):
-        """ Handle the output for one parent of a term.
-        It will retrieve the GO term for the given ID, add it to the pred
-        building up the path and keep building the upper part of the
-        tree.
-        If verbose is True, it will print the line of the tree.
-
-        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
-            identifier is in your ontology).
-        :arg level, the level in which we are while building the tree
-        :arg pred, the precedant part of the paths browsed
-        :arg paths, the list of paths already browsed
-        :kwarg verbose, a boolean to actually print the tree or not.
-        """
-        if verbose:
-            print " " * level, "\_", termid
-        if '!' in termid:
-            parentid = termid.split('!')[0].strip()
-        else:
-            parentid = termid
-
-        if pred == "":
-            pred = parentid
-        else:
-            if details:
-                pred = '%s,%s,%s' % (pred, rtype, parentid)
-            else:
-                pred = '%s,%s' % (pred, parentid)
-        parent = self.graph[parentid]
-        self.get_path(parent, level=level + 1,
-                      pred=pred, paths=paths, verbose=verbose,
-                      details=details)
+        # Index of the children of the terms, by value of `details`
+        self.children = {}
 
     def fix_go_graph(self):
         """ Add a root node to the main three categories. This way we
         can always link different terms even if they are in separate
         branch.
         """
+        if getattr(self.graph, 'caches', None):
+            # The data derived from the graph no longer hold
+            self.graph.caches.clear()
         info = {'id': 'GO:OOOO000', 'name': 'root'}
         root = {'id': info['id'], 'info': info}
         self.graph[root['id']] = root
@@ -114,57 +350,401 @@ class PyGoLib(object):
                 pass
         return self.graph
 
+    def compile(self):
+        """ Return the compiled, integer-indexed, version of the graph.
+        The compiled graph can be given to GoDistanceCounter, GsesameGO
+        or get_sub_graph() in place of the graph itself.
+        """
+        if getattr(self.graph, 'is_compiled', False):
+            return self.graph
+        from .compiled import CompiledGraph
+        with self.profiler.phase('index'):
+            return CompiledGraph(self.graph)
+
+    def get_children_index(self, details=False):
+        """ Return the index of the children of each term of the graph,
+        as a dictionary of lists, built once and kept.
+        :kwarg details, if True the part_of relations are indexed as
+            well as the is_a ones.
+        """
+        if details in self.children:
+            return self.children[details]
+        keys = ['is_a']
+        if details:
+            keys.append('part_of')
+        children = {}
+        seen = set()
+        for term in self.graph.values():
+            if term['id'] in seen:
+                continue
+            seen.add(term['id'])
+            for key in keys:
+                for parentid in get_parent_ids(term, key):
+                    if parentid in self.graph:
+                        # The parent may be given by one of its alt_id
+                        parentid = self.graph[parentid]['id']
+                    children.setdefault(parentid, []).append(term['id'])
+        self.children[details] = children
+        return children
+
+    def get_descendants(self, termid, details=False):
+        """ Return the set of identifiers of all the terms having the
+        given term as ancestor. Only the descendants are visited.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        if getattr(self.graph, 'is_compiled', False):
+            graph = self.graph
+            return set(graph.accession(idx) for idx in graph.descendants(
+                graph.term_index(termid), details=details))
+        if getattr(self.graph, 'is_store', False):
+            return self.graph.get_descendants(termid, details=details)
+        children = self.get_children_index(details=details)
+        descendants = set()
+        stack = [self.graph[termid]['id']]
+        while stack:
+            for child in children.get(stack.pop(), []):
+                if child not in descendants:
+                    descendants.add(child)
+                    stack.append(child)
+        return descendants
+
     def get_sub_graph(self, graph, termid, verbose=False):
         """ From the list of GO terms, retrieve all the one which have
         for parent the provided termid.
+        The terms are found through the index of the children of the
+        terms, so only the sub graph is visited.
         """
-        for key in graph.keys():
-            term = graph[key]
+        golib = self
+        if graph is not self.graph:
+            golib = PyGoLib(graph)
+        for descendant in golib.get_descendants(termid):
+            term = graph[descendant]
             if verbose:
                 print term['id']
-            pathways = self.get_path(term, pred=term['id'], paths=[],
-                                     verbose=verbose)
-            for step in pathways:
-                if termid in step:
-                    for tid in step.split(termid)[0].split(','):
-                        if tid:
-                            term = self.graph[tid]
-                            if term['id'] not in self.subgraph.keys():
-                                self.subgraph[term['id']] = term
+            self.subgraph[term['id']] = term
         return self.subgraph
 
-    def get_path(self, term, level=0, pred="", paths=[], verbose=False,
-                 details=False):
-        """ This is an iterative method which is used to retrieve the top
-        parent of a given term.
-        """
-        if 'is_a' in term.keys():
-            if isinstance(term['is_a'], list):
-                before = pred
-                for parent in term['is_a']:
-                    self.__do_handle_parent(
-                        parent, level, before, paths,
-                        verbose=verbose, details=details, rtype='is_a')
+    def get_ancesters(self, termid, details=False):
+        """ Return the set of identifiers of all the ancestors of a term,
+        the term included.
+        On a compiled graph or a SqliteGraph this comes from its ancestor
+        closure, otherwise each ancestor is visited once.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        if getattr(self.graph, 'is_compiled', False):
+            return set(self.graph.accession(idx) for idx in
+                       self.graph.ancesters_sorted(
+                           self.graph.term_index(termid), details=details))
+        if getattr(self.graph, 'is_store', False):
+            return self.graph.get_ancesters(termid, details=details)
+        keys = ['is_a']
+        if details:
+            keys.append('part_of')
+        termid = self.graph[termid]['id']
+        ancesters = set([termid])
+        stack = [termid]
+        while stack:
+            term = self.graph[stack.pop()]
+            for key in keys:
+                for parentid in get_parent_ids(term, key):
+                    if parentid not in ancesters:
+                        ancesters.add(parentid)
+                        stack.append(parentid)
+        return ancesters
+
+    def get_common_ancesters(self, id1, id2, details=False):
+        """ Return the set of identifiers of the ancestors shared by two
+        terms.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        :arg id2, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        return self.get_ancesters(id1, details=details).intersection(
+            self.get_ancesters(id2, details=details))
+
+    def iter_paths(self, term, details=False, unique=False, max_paths=None):
+        """ Iterate over the paths going from a term to the top of the
+        tree, depth first and in the order of the parents of the terms,
+        the is_a parents before the part_of ones.
+        Each path is a tuple of identifiers starting with the term
+        itself. If details is True, the relation (is_a or part_of)
+        linking two terms is inserted between them.
+        The paths are browsed with an explicit stack, so the depth of
+        the graph is not limited by the recursion limit.
+        :arg term, a GO term as stored in the graph.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        :kwarg unique, if True, a path reached several times (ie: a
+            parent listed twice) is yielded only once.
+        :kwarg max_paths, the maximum number of paths to yield, None for
+            no limit.
+        """
+        keys = ['is_a']
+        if details:
+            keys.append('part_of')
+        seen = set()
+        count = 0
+        edges = 0
+        stack = [(term, (term['id'],))]
+        try:
+            while stack:
+                (node, path) = stack.pop()
+                if 'is_a' not in node and 'part_of' not in node:
+                    if unique:
+                        if path in seen:
+                            continue
+                        seen.add(path)
+                    depth = len(path) - 1
+                    if details:
+                        depth = depth / 2
+                    self.profiler.maximum('max_depth', depth)
+                    count = count + 1
+                    yield path
+                    if max_paths is not None and count >= max_paths:
+                        return
+                    continue
+                following = []
+                for key in keys:
+                    for parentid in get_parent_ids(node, key):
+                        if parentid in path:
+                            self.log.warning('Cycle found going from %s '
+                                             'to %s' % (path[-1], parentid))
+                            continue
+                        if details:
+                            following.append((self.graph[parentid],
+                                              path + (key, parentid)))
+                        else:
+                            following.append((self.graph[parentid],
+                                              path + (parentid,)))
+                edges = edges + len(following)
+                following.reverse()
+                stack.extend(following)
+        finally:
+            self.profiler.count('edges', edges)
+            self.profiler.count('paths', count)
+
+    def get_label(self, termid):
+        """ Return the identifier of a term followed by its name, as the
+        parents are written in the OBO files (ie: GO:0043226 ! organelle).
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        """
+        name = self.graph[termid].get('name')
+        if name:
+            return '%s ! %s' % (termid, name.strip())
+        return termid
+
+    def iter_tree(self, term, details=False, max_paths=None):
+        """ Iterate over the ancesters of a term, depth first, and yield
+        the (level, parent, relation) tuples of the lines of its tree,
+        a parent appearing once for each path going through it.
+        Only the ancesters of the path being browsed are kept in memory.
+        :arg term, a GO term as stored in the graph.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        :kwarg max_paths, stop once this number of paths reached the top
+            of the tree, None for no limit.
+        """
+        keys = ['is_a']
+        if details:
+            keys.append('part_of')
+
+        def iter_parents(node):
+            """ Iterate over the (identifier, relation) of the parents of
+            a term. """
+            for key in keys:
+                for parentid in get_parent_ids(node, key):
+                    yield (parentid, key)
+
+        count = 0
+        ids = [term['id']]
+        stack = [iter_parents(term)]
+        while stack:
+            for (parentid, rel) in stack[-1]:
+                if parentid in ids:
+                    self.log.warning('Cycle found going from %s to %s' % (
+                        ids[-1], parentid))
+                    continue
+                yield (len(stack) - 1, parentid, rel)
+                parent = self.graph[parentid]
+                if 'is_a' not in parent and 'part_of' not in parent:
+                    count = count + 1
+                    if max_paths is not None and count >= max_paths:
+                        return
+                ids.append(parentid)
+                stack.append(iter_parents(parent))
+                break
+            else:
+                stack.pop()
+                ids.pop()
+
+    def iter_dag(self, term, details=False):
+        """ Iterate over the ancesters of a term, depth first and in the
+        same order as iter_tree(), but expanding each ancester once.
+        The (level, parent, relation, expanded) tuples of the lines of
+        the tree are yielded; a parent already met is yielded again with
+        expanded set to False, as a reference to the subtree shown
+        above, so the work done is linear in the number of edges.
+        :arg term, a GO term as stored in the graph.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        keys = ['is_a']
+        if details:
+            keys.append('part_of')
+
+        def iter_parents(node):
+            """ Iterate over the (identifier, relation) of the parents of
+            a term. """
+            for key in keys:
+                for parentid in get_parent_ids(node, key):
+                    yield (self.graph[parentid]['id'], key)
+
+        seen = set([term['id']])
+        stack = [iter_parents(term)]
+        edges = 0
+        while stack:
+            for (parentid, rel) in stack[-1]:
+                edges = edges + 1
+                if parentid in seen:
+                    yield (len(stack) - 1, parentid, rel, False)
+                    continue
+                seen.add(parentid)
+                yield (len(stack) - 1, parentid, rel, True)
+                stack.append(iter_parents(self.graph[parentid]))
+                break
             else:
-                self.__do_handle_parent(
-                    term['is_a'], level, pred, paths,
-                    verbose=verbose, details=details, rtype='is_a')
-        if details and 'part_of' in term.keys():
-            if isinstance(term['part_of'], list):
-                before = pred
-                for parent in term['part_of']:
-                    self.__do_handle_parent(
-                        parent, level, before, paths,
-                        verbose=verbose, details=details, rtype='part_of')
+                stack.pop()
+        self.profiler.count('edges', edges)
+
+    def get_ancester_edges(self, term, details=False):
+        """ Return the list of the (child, parent, relation) edges of the
+        graph of the ancesters of a term, each ancester being visited
+        once.
+        :arg term, a GO term as stored in the graph.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        keys = ['is_a']
+        if details:
+            keys.append('part_of')
+        edges = []
+        seen = set([term['id']])
+        stack = [term['id']]
+        while stack:
+            childid = stack.pop()
+            child = self.graph[childid]
+            for key in keys:
+                for parentid in get_parent_ids(child, key):
+                    parentid = self.graph[parentid]['id']
+                    edges.append((childid, parentid, key))
+                    if parentid not in seen:
+                        seen.add(parentid)
+                        stack.append(parentid)
+        self.profiler.count('edges', len(edges))
+        return edges
+
+    def export_ancesters(self, term, fmt='dot', details=False):
+        """ Return the graph of the ancesters of a term as text, in the
+        DOT language of Graphviz or in JSON.
+        :arg term, a GO term as stored in the graph.
+        :kwarg fmt, the format of the text: 'dot' or 'json'.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        edges = self.get_ancester_edges(term, details=details)
+        ids = [term['id']]
+        for (_, parentid, _) in edges:
+            ids.append(parentid)
+        ids = sorted(set(ids))
+        if fmt == 'json':
+            nodes = [dict((key, self.graph[termid].get(key))
+                          for key in ('id', 'name', 'namespace'))
+                     for termid in ids]
+            return json.dumps(
+                {'term': term['id'], 'nodes': nodes,
+                 'edges': [{'child': child, 'parent': parent,
+                            'relation': rel}
+                           for (child, parent, rel) in edges]},
+                indent=2, sort_keys=True)
+        if fmt != 'dot':
+            raise PyGoLibException('Unknown format: %s' % fmt)
+        lines = ['digraph "%s" {' % term['id'], '  rankdir=BT;']
+        for termid in ids:
+            label = termid
+            name = self.graph[termid].get('name')
+            if name:
+                label = '%s\\n%s' % (termid, name.replace('"', '\\"'))
+            lines.append('  "%s" [label="%s"];' % (termid, label))
+        for (child, parent, rel) in edges:
+            style = ''
+            if rel != 'is_a':
+                style = ' [label="%s", style=dashed]' % rel
+            lines.append('  "%s" -> "%s"%s;' % (child, parent, style))
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def get_path(self, term, level=0, pred="", paths=None, verbose=False,
+                 details=False, unique=False, max_paths=None):
+        """ Return the list of the paths going from a term to the top of
+        the tree, as strings of comma separated identifiers (and
+        relations if details is True), see iter_paths().
+        :arg term, a GO term as stored in the graph.
+        :kwarg level, the indentation of the tree printed.
+        :kwarg pred, the identifier with which each path starts, the
+            paths start with the first parent if it is empty.
+        :kwarg paths, a list to which the paths are appended.
+        :kwarg verbose, a boolean to print the tree of the ancesters.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        :kwarg unique, if True, each path is returned only once.
+        :kwarg max_paths, the maximum number of paths to return, None
+            for no limit.
+        """
+        if paths is None:
+            paths = []
+        if verbose:
+            for (depth, parentid, _) in self.iter_tree(
+                    term, details=details, max_paths=max_paths):
+                print " " * (level + depth), "\_", self.get_label(parentid)
+        for path in self.iter_paths(term, details=details, unique=unique,
+                                    max_paths=max_paths):
+            if pred:
+                paths.append(','.join((pred,) + path[1:]))
+            elif details:
+                paths.append(','.join(path[2:]))
             else:
-                self.__do_handle_parent(
-                    term['part_of'], level, pred, paths,
-                    verbose=verbose, details=details, rtype='part_of')
-        if 'is_a' not in term.keys() and 'part_of' not in term.keys():
-            paths.append(pred)
+                paths.append(','.join(path[1:]))
         return paths
 
 
+def get_parent_ids(term, key):
+    """ Return the list of identifiers of the parents of a term for the
+    given relation, stripping the comment after the '!' if any.
+    :arg term, a GO term as stored in the graph.
+    :arg key, the relation to look at ('is_a' or 'part_of').
+    """
+    values = getattr(term, key, None)
+    if isinstance(values, tuple):
+        # A Term, whose identifiers are already parsed
+        return list(values)
+    values = term.get(key)
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        values = [values]
+    return [value.split('!')[0].strip() for value in values]
+
+
 def get_logger():
     """ Return the logger. """
     return LOG
@@ -178,30 +758,174 @@ def set_logger(quiet=False, debug=False):
         LOG.setLevel(logging.WARNING)
 
 
-def download_go_graph(outputfile=None, force_dl=False):
+def _read_validators(filename):
+    """ Return the URL and the validators (ETag, Last-Modified) saved
+    along with a downloaded file, an empty dictionary if there are none.
+    :arg filename, the name of the downloaded file.
+    """
+    try:
+        with open(filename + '.http') as stream:
+            return json.load(stream)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write_validators(filename, url, headers):
+    """ Save the URL and the validators of a downloaded file next to it,
+    to send conditional requests for it afterwards.
+    :arg filename, the name of the downloaded file.
+    :arg url, the URL the file was downloaded from.
+    :arg headers, the headers of the response.
+    """
+    info = {'url': url}
+    for key in ('ETag', 'Last-Modified'):
+        if headers.get(key):
+            info[key] = headers.get(key)
+    with open(filename + '.http', 'w') as stream:
+        json.dump(info, stream)
+
+
+def _remove(filename):
+    """ Remove a file and the validators saved along with it, if any.
+    :arg filename, the name of the file to remove.
+    """
+    for name in (filename, filename + '.http'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _gunzip(source, target):
+    """ Decompress a gzip file to the disk by chunks.
+    :arg source, the name of the compressed file.
+    :arg target, the name of the file to write.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    with open(source, 'rb') as instream:
+        with open(target, 'wb') as outstream:
+            for chunk in iter(lambda: instream.read(DOWNLOAD_CHUNK), ''):
+                outstream.write(decompressor.decompress(chunk))
+            outstream.write(decompressor.flush())
+
+
+def download_go_graph(outputfile=None, force_dl=False, url=None,
+                      timeout=60):
     """ Retrieve the GO data from the specified file on the
     filesystem is provided or from the web or using the local
     version if dated from the day.
 
+    When an older dated version is present, it is only downloaded again
+    if it changed upstream (using its ETag and Last-Modified date), and
+    the older version is returned otherwise.
+    An interrupted download is resumed where it stopped on the next call,
+    and ontologies compressed with gzip (.obo.gz) are decompressed.
+
     :kwarg outputfile, name of the file in which the geneontology will
     be saved. If not provided it will be of the form:
     'geneontology-DATE.obo'
     :kwarg force_dl, boolean to force the (re)download of the GO
     annotation file from the geneontology.org website. Defaults to
     False.
+    :kwarg url, the URL of the ontology to download, to use a mirror,
+    defaults to GOURL.
+    :kwarg timeout, the timeout of the connection in seconds.
     """
-    LOG.debug('download_go_graph: outputfile %s - force_dl %s' %
-              (outputfile, force_dl))
+    url = url or GOURL
+    LOG.debug('download_go_graph: outputfile %s - force_dl %s - url %s' %
+              (outputfile, force_dl, url))
     if not outputfile:
         go_file = 'geneontology-%s.obo' % \
             datetime.datetime.now().strftime('%Y%m%d')
     else:
         go_file = outputfile
     LOG.debug('Downloading GO term into: %s' % go_file)
-    if force_dl or not os.path.exists(go_file):
-        LOG.info('Retrieving GO from %s' % GOURL)
-        urllib.urlretrieve(GOURL, go_file)
-    else:
+    if not force_dl and os.path.exists(go_file):
         LOG.info(
             '%s already exists, no need to re-download it' % go_file)
+        return go_file
+
+    headers = {}
+    previous = None
+    if not force_dl and not outputfile:
+        versions = sorted(glob.glob(os.path.join(
+            os.path.dirname(go_file), 'geneontology-*.obo')))
+        if versions:
+            previous = versions[-1]
+            validators = _read_validators(previous)
+            if validators.get('url') == url:
+                if 'ETag' in validators:
+                    headers['If-None-Match'] = validators['ETag']
+                if 'Last-Modified' in validators:
+                    headers['If-Modified-Since'] = \
+                        validators['Last-Modified']
+
+    part = go_file + '.part'
+    partial = 0
+    if os.path.exists(part):
+        validators = _read_validators(part)
+        validator = validators.get('ETag') or \
+            validators.get('Last-Modified')
+        if validators.get('url') == url and validator:
+            partial = os.path.getsize(part)
+            headers['Range'] = 'bytes=%s-' % partial
+            headers['If-Range'] = validator
+
+    LOG.info('Retrieving GO from %s' % url)
+    try:
+        response = urllib2.urlopen(urllib2.Request(url, headers=headers),
+                                   timeout=timeout)
+    except urllib2.HTTPError, err:
+        if err.code == 304:
+            LOG.info('%s did not change, using %s' % (url, previous))
+            return previous
+        if err.code == 416 and partial:
+            # The partial download is not valid anymore, start over
+            _remove(part)
+            return download_go_graph(outputfile, force_dl=force_dl, url=url,
+                                     timeout=timeout)
+        raise PyGoLibException('Could not download %s: %s' % (url, err))
+    except IOError, err:
+        if previous:
+            LOG.warning('Could not download %s (%s), using %s' %
+                        (url, err, previous))
+            return previous
+        raise PyGoLibException('Could not download %s: %s' % (url, err))
+
+    info = response.info()
+    if response.getcode() == 206:
+        LOG.info('Resuming the download after %s bytes' % partial)
+        mode = 'ab'
+    else:
+        partial = 0
+        mode = 'wb'
+        _write_validators(part, url, info)
+    size = partial
+    try:
+        with open(part, mode) as stream:
+            for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK), ''):
+                stream.write(chunk)
+                size = size + len(chunk)
+    except IOError, err:
+        raise PyGoLibException(
+            'Download of %s interrupted after %s bytes, it will be resumed '
+            'on the next try: %s' % (url, size, err))
+    finally:
+        response.close()
+    if info.get('Content-Length') and \
+            size < partial + int(info.get('Content-Length')):
+        raise PyGoLibException(
+            'Download of %s interrupted after %s bytes, it will be resumed '
+            'on the next try' % (url, size))
+
+    if url.endswith('.gz') or info.get('Content-Encoding') == 'gzip':
+        try:
+            _gunzip(part, go_file)
+        except zlib.error, err:
+            _remove(part)
+            raise PyGoLibException('Invalid gzip file from %s: %s' %
+                                   (url, err))
+        os.remove(part)
+    else:
+        os.rename(part, go_file)
+    os.rename(part + '.http', go_file + '.http')
+    LOG.info('%s bytes retrieved into %s' % (size, go_file))
     return go_file
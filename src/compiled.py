@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module provides a compiled, integer-indexed, representation of the
+graph returned by OboIO.get_graph().
+Terms are mapped to dense integer identifiers and the is_a and part_of
+edges are stored in CSR (compressed sparse row) arrays in both
+directions, so traversing the ontology no longer costs a string split
+and a dictionary lookup per edge.
+"""
+
+import os
+import sys
+from array import array
+
+try:
+    from pygolib import get_logger, get_parent_ids
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger, get_parent_ids
+
+IS_A = 0
+PART_OF = 1
+RELATIONS = ('is_a', 'part_of')
+
+
+def _build_csr(size, sources, targets, rels):
+    """ Build CSR arrays from a list of edges.
+    Edges keep their original order within one row.
+    :arg size, the number of rows.
+    :arg sources, the row of each edge.
+    :arg targets, the column of each edge.
+    :arg rels, the relation type of each edge.
+    """
+    ptr = array('i', [0] * (size + 1))
+    for source in sources:
+        ptr[source + 1] += 1
+    for row in xrange(size):
+        ptr[row + 1] += ptr[row]
+    fill = array('i', ptr)
+    idx = array('i', [0] * len(sources))
+    rel = array('B', [0] * len(sources))
+    for cnt in xrange(len(sources)):
+        pos = fill[sources[cnt]]
+        idx[pos] = targets[cnt]
+        rel[pos] = rels[cnt]
+        fill[sources[cnt]] = pos + 1
+    return (ptr, idx, rel)
+
+
+class CompiledGraph(object):
+    """ Integer-indexed view of a graph of ontologies.
+    It behaves like the dictionary it was built from (so it can be used
+    wherever a graph is expected) but also exposes the adjacency of the
+    terms as CSR arrays which the algorithms use when they are given a
+    compiled graph.
+    """
+
+    is_compiled = True
+
+    def __init__(self, graph=None):
+        """ Constructor.
+        :arg graph, the graph of ontologies as returned by
+            OboIO.get_graph().
+        """
+        self.graph = graph
+        if self.graph is None:
+            self.graph = {}
+        self.log = get_logger()
+        # id <-> accession tables
+        self.ids = []
+        self.index = {}
+        # CSR arrays of the parents and of the children of each term
+        self.parent_ptr = self.parent_idx = self.parent_rel = None
+        self.child_ptr = self.child_idx = self.child_rel = None
+        # Position of each term in a topological order of the graph
+        self.rank = None
+        # Ancestor closures, indexed by the value of `details`
+        self.closure = {}
+        # Data derived from the graph by the algorithms, by name
+        self.caches = {}
+        self.__compile()
+
+    @classmethod
+    def restore(cls, graph, ids, arrays, closure=None):
+        """ Rebuild a compiled graph from its previously computed arrays,
+        for example read from a snapshot, without compiling it again.
+        :arg graph, the graph of ontologies.
+        :arg ids, the list of identifiers of the terms, the position in
+            the list being their integer identifier.
+        :arg arrays, a dictionary of the CSR and rank arrays, by name.
+        :kwarg closure, the ancestor closures as returned by
+            build_closure(), indexed by the value of `details`.
+        """
+        compiled = cls.__new__(cls)
+        compiled.graph = graph
+        compiled.log = get_logger()
+        compiled.ids = ids
+        compiled.index = dict((termid, cnt) for (cnt, termid) in
+                              enumerate(ids))
+        for key in graph:
+            compiled.index[key] = compiled.index[graph[key]['id']]
+        for name in ('parent_ptr', 'parent_idx', 'parent_rel',
+                     'child_ptr', 'child_idx', 'child_rel', 'rank'):
+            setattr(compiled, name, arrays.get(name))
+        compiled.closure = dict(closure or {})
+        compiled.caches = {}
+        return compiled
+
+    def __compile(self):
+        """ Build the id tables and the CSR arrays from the graph. """
+        self.ids = sorted(set(term['id'] for term in self.graph.values()))
+        self.index = dict((termid, cnt)
+                          for (cnt, termid) in enumerate(self.ids))
+        # alt_id point to the same integer identifier as their term
+        for key in self.graph:
+            self.index[key] = self.index[self.graph[key]['id']]
+
+        sources = array('i')
+        targets = array('i')
+        rels = array('B')
+        for (cnt, termid) in enumerate(self.ids):
+            term = self.graph[termid]
+            for rel in (IS_A, PART_OF):
+                for parentid in get_parent_ids(term, RELATIONS[rel]):
+                    if parentid not in self.index:
+                        self.log.warning(
+                            '%s is a parent of %s but is not in the '
+                            'ontology' % (parentid, termid))
+                        continue
+                    sources.append(cnt)
+                    targets.append(self.index[parentid])
+                    rels.append(rel)
+        size = len(self.ids)
+        (self.parent_ptr, self.parent_idx, self.parent_rel) = _build_csr(
+            size, sources, targets, rels)
+        (self.child_ptr, self.child_idx, self.child_rel) = _build_csr(
+            size, targets, sources, rels)
+        self.log.debug('%s terms and %s edges compiled' % (
+            size, len(sources)))
+
+    def __build_rank(self):
+        """ Compute the position of each term in a topological order of
+        the graph in which parents always come before their children.
+        """
+        size = len(self.ids)
+        pending = array('i', [self.parent_ptr[idx + 1] - self.parent_ptr[idx]
+                              for idx in xrange(size)])
+        queue = [idx for idx in xrange(size) if not pending[idx]]
+        self.rank = array('i', [-1] * size)
+        cnt = 0
+        while queue:
+            node = queue.pop()
+            self.rank[node] = cnt
+            cnt = cnt + 1
+            for pos in xrange(self.child_ptr[node], self.child_ptr[node + 1]):
+                child = self.child_idx[pos]
+                pending[child] -= 1
+                if not pending[child]:
+                    queue.append(child)
+        if cnt != size:
+            self.log.warning(
+                '%s terms are part of a cycle and are left out of the '
+                'ancestor closure' % (size - cnt))
+
+    def build_closure(self, details=False, reuse=None):
+        """ Compute once the transitive closure of the ancestors of all
+        the terms of the graph.
+        The ancestors of each term (the term included) are stored as an
+        int array sorted by topological rank, parents first.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        :kwarg reuse, a function returning the ancestors of a term when
+            they are already known (ie: from a previous release of the
+            ontology), or None if they have to be computed. The ancestors
+            returned are stored as they are, so they must be in a
+            topological order, parents first.
+        """
+        if details in self.closure:
+            return self.closure[details]
+        if self.rank is None:
+            self.__build_rank()
+        size = len(self.ids)
+        order = sorted((idx for idx in xrange(size) if self.rank[idx] >= 0),
+                       key=self.rank.__getitem__)
+        sets = [None] * size
+        reused = set()
+        for node in order:
+            if reuse is not None:
+                ancesters = reuse(node)
+                if ancesters is not None:
+                    sets[node] = ancesters
+                    reused.add(node)
+                    continue
+            ancesters = set([node])
+            for (parent, _) in self.parents(node, details=details):
+                ancesters.update(sets[parent])
+            sets[node] = ancesters
+
+        ptr = array('i', [0] * (size + 1))
+        idx = array('i')
+        rank = self.rank.__getitem__
+        for node in xrange(size):
+            if node in reused:
+                idx.extend(sets[node])
+                sets[node] = None
+            elif sets[node] is not None:
+                idx.extend(sorted(sets[node], key=rank))
+                sets[node] = None
+            ptr[node + 1] = len(idx)
+        self.closure[details] = (ptr, idx)
+        self.log.debug('Ancestor closure built: %s entries' % len(idx))
+        return self.closure[details]
+
+    def ancesters_sorted(self, idx, details=False):
+        """ Return the ancestors of a term (the term included) as an int
+        array sorted by topological rank, parents first.
+        :arg idx, integer identifier of a term.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        (ptr, values) = self.build_closure(details=details)
+        return values[ptr[idx]:ptr[idx + 1]]
+
+    def ancesters(self, idx, details=False):
+        """ Return the set of the ancestors of a term, the term included.
+        :arg idx, integer identifier of a term.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        return frozenset(self.ancesters_sorted(idx, details=details))
+
+    def common_ancesters(self, idx1, idx2, details=False):
+        """ Return the set of the ancestors shared by two terms.
+        :arg idx1, integer identifier of a term.
+        :arg idx2, integer identifier of a term.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        return self.ancesters(idx1, details=details).intersection(
+            self.ancesters_sorted(idx2, details=details))
+
+    def __getitem__(self, key):
+        return self.graph[key]
+
+    def __contains__(self, key):
+        return key in self.graph
+
+    def __iter__(self):
+        return iter(self.graph)
+
+    def __len__(self):
+        return len(self.graph)
+
+    def get(self, key, default=None):
+        """ Return the term for the given identifier or default. """
+        return self.graph.get(key, default)
+
+    def keys(self):
+        """ Return the identifiers (alt_id included) of the graph. """
+        return self.graph.keys()
+
+    def values(self):
+        """ Return the terms of the graph. """
+        return self.graph.values()
+
+    def items(self):
+        """ Return the (identifier, term) pairs of the graph. """
+        return self.graph.items()
+
+    def term_index(self, termid):
+        """ Return the integer identifier of a term.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology), alt_id are accepted.
+        """
+        return self.index[termid]
+
+    def accession(self, idx):
+        """ Return the identifier of the term for a given integer
+        identifier.
+        :arg idx, integer identifier of a term.
+        """
+        return self.ids[idx]
+
+    def is_root(self, idx):
+        """ Return whether the term has no parent at all.
+        :arg idx, integer identifier of a term.
+        """
+        return self.parent_ptr[idx] == self.parent_ptr[idx + 1]
+
+    def parents(self, idx, details=False):
+        """ Return the list of (parent, relation) of a term.
+        :arg idx, integer identifier of a term.
+        :kwarg details, if True the part_of relations are returned as
+            well as the is_a ones.
+        """
+        output = []
+        for pos in xrange(self.parent_ptr[idx], self.parent_ptr[idx + 1]):
+            rel = self.parent_rel[pos]
+            if details or rel == IS_A:
+                output.append((self.parent_idx[pos], rel))
+        return output
+
+    def children(self, idx, details=False):
+        """ Return the list of (child, relation) of a term.
+        :arg idx, integer identifier of a term.
+        :kwarg details, if True the part_of relations are returned as
+            well as the is_a ones.
+        """
+        output = []
+        for pos in xrange(self.child_ptr[idx], self.child_ptr[idx + 1]):
+            rel = self.child_rel[pos]
+            if details or rel == IS_A:
+                output.append((self.child_idx[pos], rel))
+        return output
+
+    def iter_paths(self, idx, details=False):
+        """ Iterate over all the paths going from a term to the top of
+        the tree, in the same order as PyGoLib.iter_paths().
+        Each path is a tuple of integer identifiers starting with the
+        term itself.
+        :arg idx, integer identifier of a term.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        stack = [(idx,)]
+        while stack:
+            path = stack.pop()
+            node = path[-1]
+            if self.is_root(node):
+                yield path
+                continue
+            parents = self.parents(node, details=details)
+            for (parent, _) in reversed(parents):
+                stack.append(path + (parent,))
+
+    def descendants(self, idx, details=False):
+        """ Return the set of all the terms having the given term as
+        ancestor.
+        :arg idx, integer identifier of a term.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        output = set()
+        stack = [idx]
+        while stack:
+            node = stack.pop()
+            for (child, _) in self.children(node, details=details):
+                if child not in output:
+                    output.add(child)
+                    stack.append(child)
+        return output
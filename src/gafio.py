@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module reads GAF (GO Annotation File) files, compressed with gzip
+or not, and stores the GO terms annotating each gene in a compact
+index.
+"""
+
+import gzip
+import io
+import os
+import sys
+from array import array
+
+try:
+    from pygolib import get_logger
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger
+
+# Columns of the GAF format used (0 based)
+DB = 0
+DB_OBJECT_ID = 1
+DB_OBJECT_SYMBOL = 2
+QUALIFIER = 3
+GO_ID = 4
+EVIDENCE = 6
+ASPECT = 8
+
+
+class GeneIndex(object):
+    """ Compact index of the GO terms annotating each gene.
+    The genes and the GO terms are each stored once, in tables, and the
+    annotations of the genes are stored as CSR arrays of positions in
+    the table of GO terms.
+    """
+
+    def __init__(self):
+        """ Constructor. """
+        self.genes = []
+        self.positions = {}
+        self.terms = []
+        self.term_positions = {}
+        self.gene_ptr = array('i', [0])
+        self.term_idx = array('i')
+
+    def __len__(self):
+        return len(self.genes)
+
+    def __contains__(self, gene):
+        return gene in self.positions
+
+    def __iter__(self):
+        return iter(self.genes)
+
+    def get_term_position(self, termid):
+        """ Return the position of a GO term in the table of the terms,
+        adding it if needed.
+        :arg termid, identifier of a GO term.
+        """
+        position = self.term_positions.get(termid)
+        if position is None:
+            position = len(self.terms)
+            self.terms.append(termid)
+            self.term_positions[termid] = position
+        return position
+
+    def add_gene(self, gene, positions):
+        """ Add a gene and its annotations to the index.
+        :arg gene, the identifier of the gene.
+        :arg positions, the positions of its GO terms in the table of
+            the terms, see get_term_position().
+        """
+        if gene in self.positions:
+            raise ValueError('%s is already in the index' % gene)
+        self.positions[gene] = len(self.genes)
+        self.genes.append(gene)
+        self.term_idx.extend(sorted(positions))
+        self.gene_ptr.append(len(self.term_idx))
+
+    def get_term_positions(self, gene):
+        """ Return the positions of the GO terms of a gene in the table
+        of the terms.
+        :arg gene, the identifier of the gene.
+        """
+        position = self.positions[gene]
+        return self.term_idx[self.gene_ptr[position]:
+                             self.gene_ptr[position + 1]]
+
+    def get_terms(self, gene):
+        """ Return the identifiers of the GO terms of a gene.
+        :arg gene, the identifier of the gene.
+        """
+        return [self.terms[position]
+                for position in self.get_term_positions(gene)]
+
+
+class GafIO(object):
+    """ This class handles the reading of GAF files. """
+
+    def __init__(self, graph=None):
+        """ Constructor.
+        :kwarg graph, the graph of ontologies. If provided, the GO terms
+            are replaced by their main identifier (for alt_id) and the
+            ones missing in the ontology are skipped.
+        """
+        self.graph = graph
+        self.log = get_logger()
+
+    def iter_annotations(self, filename, key='id', exclude_evidence=None,
+                         aspects=None):
+        """ Read the GAF file line by line and yield its (gene, GO term)
+        annotations one at a time.
+        Annotations with a NOT qualifier are skipped.
+        :arg filename, the name of the file to read, it is decompressed
+            on the fly if its name ends with '.gz', or an already opened
+            stream.
+        :kwarg key, how to identify the genes: 'id' for their database
+            and identifier (ie: UniProtKB:P12345), 'symbol' for their
+            symbol.
+        :kwarg exclude_evidence, a list of evidence codes (ie: IEA) for
+            which the annotations are skipped.
+        :kwarg aspects, a list of aspects (P, F or C) to keep, all by
+            default.
+        """
+        exclude_evidence = set(exclude_evidence or [])
+        if hasattr(filename, 'read'):
+            stream = filename
+        elif filename.endswith('.gz'):
+            stream = io.BufferedReader(gzip.open(filename, 'rb'))
+        else:
+            stream = open(filename)
+        try:
+            for row in stream:
+                if row.startswith('!') or not row.strip():
+                    continue
+                fields = row.rstrip('\r\n').split('\t')
+                if len(fields) < 9:
+                    self.log.debug('Invalid GAF line: %s' % row)
+                    continue
+                if 'NOT' in fields[QUALIFIER].split('|'):
+                    continue
+                if fields[EVIDENCE] in exclude_evidence:
+                    continue
+                if aspects and fields[ASPECT] not in aspects:
+                    continue
+                if key == 'symbol':
+                    gene = fields[DB_OBJECT_SYMBOL]
+                else:
+                    gene = '%s:%s' % (fields[DB], fields[DB_OBJECT_ID])
+                yield (gene, fields[GO_ID])
+        finally:
+            if stream is not filename:
+                stream.close()
+
+    def get_gene_index(self, filename, key='id', exclude_evidence=None,
+                       aspects=None):
+        """ Read the GAF file and return the index of the GO terms
+        annotating each gene, see GeneIndex.
+        The arguments are the ones of iter_annotations().
+        """
+        self.log.info('Loading GO annotations...')
+        index = GeneIndex()
+        annotations = {}
+        order = []
+        missing = set()
+        for (gene, termid) in self.iter_annotations(
+                filename, key=key, exclude_evidence=exclude_evidence,
+                aspects=aspects):
+            if self.graph is not None:
+                if termid not in self.graph:
+                    missing.add(termid)
+                    continue
+                termid = self.graph[termid]['id']
+            if gene not in annotations:
+                annotations[gene] = set()
+                order.append(gene)
+            annotations[gene].add(index.get_term_position(termid))
+        for gene in order:
+            index.add_gene(gene, annotations.pop(gene))
+        if missing:
+            self.log.warning('%s GO terms of the annotations are not in '
+                             'the ontology' % len(missing))
+        self.log.info('%s genes annotated with %s GO terms retrieved' % (
+            len(index), len(index.terms)))
+        return index
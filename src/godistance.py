@@ -41,6 +41,7 @@ difference between the two terms.
 
 import os
 import sys
+from array import array
 
 try:
     from pygolib import get_logger, PyGoLib
@@ -65,15 +66,31 @@ class GoDistanceCounter(object):
     distance between two GO terms.
     """
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, profiler=None, max_paths=None):
         """ Constructor.
         :arg data, the graph of ontologies
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, none are collected by default.
+        :kwarg max_paths, the maximum number of paths to the top of the
+            tree browsed for each term, None for no limit. It is not
+            used on compiled graphs, which do not browse the paths.
         """
         self.goterms = data
         if self.goterms is None:
             self.goterms = {}
         self.log = get_logger()
-        self.pygo = PyGoLib(self.goterms)
+        self.pygo = PyGoLib(self.goterms, profiler=profiler)
+        self.profiler = self.pygo.profiler
+        self.max_paths = max_paths
+
+    def __get_paths(self, termid):
+        """ Return the list of the distinct paths going from a term to
+        the top of the tree, as tuples of identifiers.
+        :arg termid, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        """
+        return list(self.pygo.iter_paths(
+            self.goterms[termid], unique=True, max_paths=self.max_paths))
 
     def __score_cousins(self, goid1, goid2, path1=None, path2=None):
         """ For two given GO term ID and the list of their path, return
@@ -83,21 +100,19 @@ class GoDistanceCounter(object):
         :arg goid2, GO term ID (ie: GO:0043229, or whatever identifier is
             in your ontology).
         :kwarg path1, the list path from the first GO term to the top of
-        the tree, as returned by get_path().
+        the tree, as returned by iter_paths().
         :kwarg path2, the list path from the second GO term to the top
-        of the tree, as returned by get_path().
+        of the tree, as returned by iter_paths().
         """
         if path1 is None:
-            path1 = self.pygo.get_path(self.goterms[goid1])
+            path1 = self.__get_paths(goid1)
         if path2 is None:
-            path2 = self.pygo.get_path(self.goterms[goid2])
+            path2 = self.__get_paths(goid2)
 
         mindist = None
         deltalevel = None
-        for path in path1:
-            step1 = path.split(',')
-            for opath in path2:
-                step2 = opath.split(',')
+        for step1 in path1:
+            for step2 in path2:
                 inter = _get_ancester(step1, step2)
                 if inter:
                     index1 = step1.index(inter)
@@ -120,24 +135,22 @@ class GoDistanceCounter(object):
         :arg goid2, GO term ID (ie: GO:0043229, or whatever identifier is
             in your ontology).
         :kwarg path1, the list path from the first GO term to the top of
-        the tree, as returned by get_path().
+        the tree, as returned by iter_paths().
         :kwarg path2, the list path from the second GO term to the top
-        of the tree, as returned by get_path().
+        of the tree, as returned by iter_paths().
         """
         if path1 is None:
-            path1 = self.pygo.get_path(self.goterms[goid1])
+            path1 = self.__get_paths(goid1)
         scores = []
-        for paths in path1:
-            steps = paths.split(',')
+        for steps in path1:
             if goid2 in steps:
                 start = steps.index(goid1)
                 stop = steps.index(goid2)
                 score = abs(stop - start)
                 scores.append(score)
         if path2 is None:
-            path2 = self.pygo.get_path(self.goterms[goid2])
-        for paths in path2:
-            steps = paths.split(',')
+            path2 = self.__get_paths(goid2)
+        for steps in path2:
             if goid1 in steps:
                 start = steps.index(goid1)
                 stop = steps.index(goid2)
@@ -145,6 +158,161 @@ class GoDistanceCounter(object):
                 scores.append(score)
         return scores
 
+    def __get_distances(self, idx):
+        """ Return the number of is_a edges between a term and each of
+        its ancestors, following the shortest way up, as a dictionary.
+        Like with get_path(), only the ancestors from which the top of
+        the tree can be reached are considered.
+        :arg idx, integer identifier of a term.
+        """
+        graph = self.goterms
+        grounded = self.__get_grounded()
+        distances = {idx: 0}
+        level = [idx]
+        edges = 0
+        while level:
+            following = []
+            for node in level:
+                parents = graph.parents(node)
+                edges = edges + len(parents)
+                for (parent, _) in parents:
+                    if parent not in distances and grounded[parent]:
+                        distances[parent] = distances[node] + 1
+                        following.append(parent)
+            level = following
+        self.profiler.count('edges', edges)
+        return distances
+
+    def __get_grounded(self):
+        """ Return, for each term of the compiled graph, whether the top
+        of the tree can be reached from it following is_a relations.
+        It is computed once per graph.
+        """
+        graph = self.goterms
+        grounded = graph.caches.get('grounded')
+        if grounded is None:
+            with self.profiler.phase('index'):
+                graph.build_closure()
+                order = sorted(xrange(len(graph.ids)),
+                               key=graph.rank.__getitem__)
+                grounded = array('B', [0] * len(graph.ids))
+                for node in order:
+                    if graph.rank[node] < 0:
+                        continue
+                    grounded[node] = graph.is_root(node) or any(
+                        grounded[parent]
+                        for (parent, _) in graph.parents(node))
+            graph.caches['grounded'] = grounded
+        return grounded
+
+    def __scores_compiled(self, id1, id2):
+        """ Returns the score between two given GO terms of a compiled
+        graph without building any path.
+        The number of edges between each term and its ancestors comes
+        from a breadth-first search up the graph from both terms; the
+        lowest common ancestor is the one minimizing the number of edges
+        between the two terms. If several common ancestors are at the
+        same distance, the one found first by the path based algorithm
+        is used, so the scores are the same on both graphs.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        :arg id2, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        """
+        graph = self.goterms
+        idx1 = graph.term_index(id1)
+        idx2 = graph.term_index(id2)
+        grounded = self.__get_grounded()
+        if not grounded[idx1] or not grounded[idx2]:
+            return None
+        distances1 = self.__get_distances(idx1)
+        distances2 = self.__get_distances(idx2)
+        if idx2 in distances1 or idx1 in distances2:
+            score = distances1.get(idx2, distances2.get(idx1))
+            self.log.debug("%s and %s are parents" % (id1, id2))
+            return (score, score)
+
+        mindist = None
+        closest = []
+        for (ancester, dist1) in distances1.iteritems():
+            dist2 = distances2.get(ancester)
+            if dist2 is None:
+                continue
+            if mindist is None or dist1 + dist2 < mindist:
+                mindist = dist1 + dist2
+                closest = [ancester]
+            elif dist1 + dist2 == mindist:
+                closest.append(ancester)
+        if mindist is None:
+            return None
+        deltas = set(abs(distances1[node] - distances2[node])
+                     for node in closest)
+        if len(deltas) > 1:
+            ancester = self.__first_ancester(
+                idx1, idx2, distances1, distances2, set(closest))
+            deltas = [abs(distances1[ancester] - distances2[ancester])]
+        return (mindist, deltas.pop())
+
+    def __first_ancester(self, idx1, idx2, distances1, distances2,
+                         closest):
+        """ Return the closest common ancestor used by the path based
+        algorithm when several of them are at the same distance of the
+        two terms: the one of the first pair of paths, in the order of
+        iter_paths(), whose first common ancestor is one of them.
+        Such paths reach this ancestor the shortest way, so only the
+        shortest ways up are browsed.
+        :arg idx1, integer identifier of the first term.
+        :arg idx2, integer identifier of the second term.
+        :arg distances1, the distances of the ancestors of the first
+            term, as returned by __get_distances().
+        :arg distances2, the distances of the ancestors of the second
+            term.
+        :arg closest, the set of the closest common ancestors.
+        """
+        graph = self.goterms
+        grounded = self.__get_grounded()
+        # Ancestors of the first path of the first term reaching one of
+        # them, on which they are reached the shortest way
+        path = self.__first_path(idx1, distances1, closest)
+        node = path[-1]
+        while not graph.is_root(node):
+            node = [parent for (parent, _) in graph.parents(node)
+                    if grounded[parent]][0]
+            path.append(node)
+        targets = set(node for (dist, node) in enumerate(path)
+                      if node in closest and distances1[node] == dist)
+        return self.__first_path(idx2, distances2, targets)[-1]
+
+    def __first_path(self, idx, distances, targets):
+        """ Browse the paths going up from a term depth first, in the
+        order of iter_paths(), only following the shortest ways up, and
+        return the first path reaching one of the targets as a list of
+        integer identifiers.
+        :arg idx, integer identifier of a term.
+        :arg distances, the distances of the ancestors of the term, as
+            returned by __get_distances().
+        :arg targets, the set of the ancestors looked for.
+        """
+        graph = self.goterms
+        previous = {}
+        stack = [(idx, None)]
+        while stack:
+            (node, child) = stack.pop()
+            if node in previous:
+                continue
+            previous[node] = child
+            if node in targets:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = previous[node]
+                path.reverse()
+                return path
+            stack.extend(reversed([
+                (parent, node) for (parent, _) in graph.parents(node)
+                if distances.get(parent) == distances[node] + 1]))
+        return None
+
     def scores(self, id1, id2):
         """Returns the score between two given GO terms.
         :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
@@ -152,11 +320,18 @@ class GoDistanceCounter(object):
         :arg id2, identifier of a GO term (ie: GO:0043229, or whatever
             identifier is in your ontology).
         """
-        golib = PyGoLib(self.goterms)
+        with self.profiler.phase('score'):
+            return self.__scores(id1, id2)
+
+    def __scores(self, id1, id2):
+        """ Returns the score between two given GO terms, see scores().
+        """
+        if getattr(self.goterms, 'is_compiled', False):
+            return self.__scores_compiled(id1, id2)
         goterm1 = self.goterms[id1]
-        path1 = golib.get_path(goterm1, pred=goterm1['id'], paths=[])
+        path1 = self.__get_paths(id1)
         goterm2 = self.goterms[id2]
-        path2 = golib.get_path(goterm2, pred=goterm2['id'], paths=[])
+        path2 = self.__get_paths(id2)
         # We use goterm['id'] instead of the id provided to take into
         # account alt_id which are in the list of goterms but not in the
         # paths. Via goterm['id'] we get the 'normal' GO term identifier.
@@ -39,14 +39,25 @@ difference between the two terms.
 """
 
 
+import bisect
 import os
 import sys
 
 try:
-    from pygolib import get_logger, PyGoLib
+    from pygolib import (get_logger, get_parent_ids, LRUCache, PyGoLib,
+                         PyGoLibException)
 except ImportError:
     sys.path.insert(0, os.path.abspath('../'))
-    from src import get_logger, PyGoLib
+    from src import (get_logger, get_parent_ids, LRUCache, PyGoLib,
+                     PyGoLibException)
+
+# Semantic contribution factor of each type of relation (is_a, part_of)
+_WEIGHTS = (0.8, 0.6)
+# Default number of terms for which the semantic values are memoized
+CACHE_SIZE = 50000
+# Margin kept when comparing the upper bounds to the scores, for the
+# rounding errors
+_EPSILON = 1e-9
 
 
 def _get_ancester(path1, path2):
@@ -64,28 +75,157 @@ def _get_all_ancesters(path):
     """ For a given path, return all the ancesters in it. """
     ancesters = []
     for step in path:
-        for item in step.split(','):
+        for item in step:
             if item not in ['is_a', 'part_of'] \
                     and item not in ancesters:
                 ancesters.append(item)
     return ancesters
 
 
+def _upper_bound(shared_value, shared_count, total, direct=None,
+                 other_parents=0):
+    """ Returns an upper bound of the score between a term and another
+    term, not one of its ancestors, sharing with it some ancestors.
+    The semantic value of the other term in a shared ancestor is at most
+    the weight of an is_a relation if it is one of its parents, and its
+    square otherwise. The semantic value of the other term itself, 1, and
+    the ones of its parents which are not shared are not part of the
+    shared sum.
+    :arg shared_value, the sum of the semantic values of the term over
+        the shared ancestors.
+    :arg shared_count, the number of shared ancestors.
+    :arg total, the semantic value of the term.
+    :kwarg direct, the number of shared ancestors which are parents of
+        the other term, all of them by default.
+    :kwarg other_parents, the sum of the weights of the relations of the
+        other term with its parents which are not shared.
+    """
+    weight = max(_WEIGHTS)
+    if direct is None:
+        direct = shared_count
+    other = weight * direct + weight * weight * (shared_count - direct)
+    return (shared_value + other) / (total + other + 1 + other_parents)
+
+
+def _import_numpy():
+    """ Returns the numpy module and the scipy.sparse one, or None if
+    scipy is not installed. numpy is required.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise PyGoLibException(
+            'numpy is required to compute the similarity matrix')
+    try:
+        from scipy import sparse
+    except ImportError:
+        sparse = None
+    return (numpy, sparse)
+
+
+def _cross_scores(left, right):
+    """ Returns the matrix of the scores between two sets of terms given
+    by their vectors, see GsesameGO.get_term_vectors().
+    :arg left, the vectors of the terms of the rows.
+    :arg right, the vectors of the terms of the columns, sharing the
+        columns of left.
+    """
+    (values1, present1, totals1, _) = left
+    (values2, present2, totals2, _) = right
+    # shared[i, j] is the sum of the values of i over the ancestors it
+    # shares with j
+    shared = values1.dot(present2.T) + present1.dot(values2.T)
+    if hasattr(shared, 'toarray'):
+        shared = shared.toarray()
+    return shared / (totals1[:, None] + totals2[None, :])
+
+
+def _best_match_score(matrix):
+    """ Returns the semantic similarity of two genes from the matrix of
+    the scores between their GO terms.
+    :arg matrix, the NumPy array of the scores between the GO terms of
+        the first gene (rows) and the ones of the second gene (columns).
+    """
+    (rows, columns) = matrix.shape
+    return (matrix.max(axis=1).sum() + matrix.max(axis=0).sum()) / \
+        (rows + columns)
+
+
+def remap_cache(cache, keep, translate=None):
+    """ Returns a copy of a cache of the semantic values of the terms of
+    a compiled graph for another compiled graph (ie: a new release of the
+    ontology), see GsesameGO.
+    :arg cache, the LRUCache of the semantic values of the old graph.
+    :arg keep, the set of the integer identifiers in the old graph of the
+        terms whose ancestors are the same in both graphs, the only ones
+        kept.
+    :kwarg translate, the array giving the integer identifier in the new
+        graph of each term of the old graph, None if the terms have the
+        same integer identifiers in both graphs.
+    """
+    output = LRUCache(cache.maxsize)
+    for (key, value) in cache.items():
+        if key not in keep:
+            continue
+        if translate is not None:
+            (values, _, total) = value
+            values = dict((translate[idx], item)
+                          for (idx, item) in values.iteritems())
+            (key, value) = (translate[key],
+                            (values, frozenset(values), total))
+        output.set(key, value)
+    return output
+
+
 class GsesameGO(object):
     """ This class re-implement in python the algorithm used in the
     g-sesame program to compare two GO term to each other.
     see: http://bioinformatics.clemson.edu/G-SESAME/
+
+    The semantic values of the terms are memoized. The cache is stored
+    in the caches of the graph (a Graph or a CompiledGraph) and thus
+    shared by all the GsesameGO and GsesameGene instances working on it,
+    with the largest size they asked for.
     """
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, cache_size=CACHE_SIZE, profiler=None,
+                 max_paths=None):
         """ Constructor.
         :arg data, the graph of ontologies
+        :kwarg cache_size, the maximum number of terms for which the
+            semantic values are kept in memory, None for no limit.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, none are collected by default.
+        :kwarg max_paths, the maximum number of paths to the top of the
+            tree browsed for each term, None for no limit. It is not
+            used on compiled graphs, which do not browse the paths.
         """
         self.goterms = data
         if self.goterms is None:
             self.goterms = {}
         self.log = get_logger()
-        self.pygo = PyGoLib(self.goterms)
+        self.pygo = PyGoLib(self.goterms, profiler=profiler)
+        self.profiler = self.pygo.profiler
+        self.max_paths = max_paths
+        self.compiled = getattr(self.goterms, 'is_compiled', False)
+        caches = getattr(self.goterms, 'caches', None)
+        if caches is None:
+            self.cache = LRUCache(cache_size)
+        else:
+            # The semantic values read from the paths depend on max_paths
+            name = 'gsesame'
+            if not self.compiled and max_paths is not None:
+                name = 'gsesame-%s' % max_paths
+            self.cache = caches.get(name)
+            if self.cache is None:
+                self.cache = LRUCache(cache_size)
+                caches[name] = self.cache
+            elif self.cache.maxsize is not None and (
+                    cache_size is None or cache_size > self.cache.maxsize):
+                # The shared cache is only enlarged, not to evict the
+                # values of the other instances
+                self.cache.resize(cache_size)
+        self.profiler.watch_cache('gsesame', self.cache)
 
     def semantic_value(self, id1):
         """ Returns the semantic values of all the parents of a given
@@ -93,20 +233,40 @@ class GsesameGO(object):
         :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
             identifier is in your ontology).
         """
-        sem_values = self.semantic_values(id1)
-        return sum(sem_values.values())
+        return self.get_term_values(id1)[2]
 
-    def semantic_values(self, id1):
+    def _semantic_values_compiled(self, idx):
         """ Returns the semantic values of all the parents of a given
-        term.
-        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
-            identifier is in your ontology).
+        term of a compiled graph, indexed by their integer identifier.
+        The ancestors are visited once, children first, using the
+        ancestor closure of the graph, so the best contribution of a
+        parent is known once all its children have been seen.
+        :arg idx, integer identifier of a term.
         """
-        golib = PyGoLib(self.goterms)
-        goterm1 = self.goterms[id1]
-        path1 = golib.get_path(goterm1, pred=goterm1['id'], paths=[],
-                               details=True)
+        graph = self.goterms
+        if True not in graph.closure:
+            with self.profiler.phase('index'):
+                graph.build_closure(details=True)
+        semantic_values = {idx: 1}
+        edges = 0
+        for node in reversed(graph.ancesters_sorted(idx, details=True)):
+            value = semantic_values[node]
+            parents = graph.parents(node, details=True)
+            edges = edges + len(parents)
+            for (parent, rel) in parents:
+                score = value * _WEIGHTS[rel]
+                if score > semantic_values.get(parent, 0):
+                    semantic_values[parent] = score
+        self.profiler.count('edges', edges)
+        return semantic_values
 
+    def __semantic_values_paths(self, goterm1, path1):
+        """ Returns the semantic values of all the parents of a given
+        term from the list of its paths.
+        :arg goterm1, a GO term.
+        :arg path1, the list of paths of the term as returned by
+            iter_paths() with details set to True.
+        """
         semantic_values = {}
         for ancester in _get_all_ancesters(path1):
             if ancester == goterm1['id']:
@@ -116,7 +276,7 @@ class GsesameGO(object):
             for item in path1:
                 tmp_cnt = 1
                 if ancester in item:
-                    path_el = item.split(',')
+                    path_el = item
                     ind = path_el.index(ancester)
                     for step in range(ind - 1, 0, -2):
                         if path_el[step] == 'is_a':
@@ -127,6 +287,49 @@ class GsesameGO(object):
             semantic_values[ancester] = max(tmp_score)
         return semantic_values
 
+    def get_term_values(self, id1):
+        """ Returns, from the cache if possible, the semantic values of
+        all the parents of a given term, the set of its ancestors and
+        its semantic value, as a tuple.
+        On a compiled graph the terms are identified by their integer
+        identifier.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        """
+        if self.compiled:
+            key = self.goterms.term_index(id1)
+        else:
+            key = self.goterms[id1]['id']
+        output = self.cache.get(key)
+        if output is not None:
+            return output
+
+        if self.compiled:
+            values = self._semantic_values_compiled(key)
+            ancesters = frozenset(values)
+        else:
+            goterm1 = self.goterms[id1]
+            path1 = list(self.pygo.iter_paths(
+                goterm1, details=True, unique=True,
+                max_paths=self.max_paths))
+            ancesters = set(_get_all_ancesters(path1))
+            values = self.__semantic_values_paths(goterm1, path1)
+        output = (values, ancesters, sum(values.values()))
+        self.cache.set(key, output)
+        return output
+
+    def semantic_values(self, id1):
+        """ Returns the semantic values of all the parents of a given
+        term.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        """
+        values = self.get_term_values(id1)[0]
+        if self.compiled:
+            return dict((self.goterms.accession(idx), value)
+                        for (idx, value) in values.items())
+        return dict(values)
+
     def scores(self, id1, id2):
         """Returns the score between two given GO terms.
         :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
@@ -134,31 +337,262 @@ class GsesameGO(object):
         :arg id2, identifier of a GO term (ie: GO:0043229, or whatever
             identifier is in your ontology).
         """
-        golib = PyGoLib(self.goterms)
-        #golib.fix_go_graph()
-        goterm1 = self.goterms[id1]
-        path1 = golib.get_path(goterm1, pred=goterm1['id'], paths=[],
-                               details=True)
-        #print goterm1['id'], len(path1)
-        ancester1 = _get_all_ancesters(path1)
-        semantic_values1 = self.semantic_values(goterm1['id'])
-
-        goterm2 = self.goterms[id2]
-        path2 = golib.get_path(goterm2, pred=goterm2['id'], paths=[],
-                               details=True)
-        #print goterm2['id'], len(path2)
-        ancester2 = _get_all_ancesters(path2)
-        semantic_values2 = self.semantic_values(goterm2['id'])
-
-        common_ancester = list(set(ancester1).intersection(set(ancester2)))
+        with self.profiler.phase('score'):
+            score = self.__score_values(self.get_term_values(id1),
+                                        self.get_term_values(id2))
+        return score
+
+    def __score_values(self, first, second):
+        """ Returns the score between two terms from their values as
+        returned by get_term_values().
+        :arg first, the values of the first term.
+        :arg second, the values of the second term.
+        """
+        (semantic_values1, ancester1, total1) = first
+        (semantic_values2, ancester2, total2) = second
+
+        common_ancester = list(ancester1.intersection(ancester2))
         sum_comm_anc = 0
         for ancester in common_ancester:
             sum_comm_anc = sum_comm_anc + semantic_values2[ancester] + \
                 semantic_values1[ancester]
 
-        score = sum_comm_anc / (sum(semantic_values1.values())
-                                + sum(semantic_values2.values()))
-        return score
+        return sum_comm_anc / (total1 + total2)
+
+    def top_k(self, id1, k=10, namespace=None):
+        """ Returns the k terms the most similar to a given term, as a
+        list of (identifier, score) sorted by decreasing score (and by
+        identifier for the same score). The term itself is left out.
+        Only the terms sharing ancestors with the term can have a score,
+        they are found through the descendants of its ancestors, the
+        closest ancestors first. Each of these terms gets an upper bound
+        of its score from the ancestors it shares with the term and is
+        only scored if the bound can beat the k-th best score. The search
+        stops when the ancestors left cannot bring such a term.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        :kwarg k, the number of terms returned.
+        :kwarg namespace, only return the terms of this namespace (ie:
+            cellular_component).
+        """
+        graph = self.goterms
+        if self.compiled:
+            key = graph.term_index(id1)
+            accession = graph.accession
+            get_ancesters = lambda idx: graph.ancesters_sorted(
+                idx, details=True)
+            get_parents = lambda idx: graph.parents(idx, details=True)
+            get_children = lambda idx: graph.children(idx, details=True)
+        else:
+            key = graph[id1]['id']
+            accession = lambda termid: termid
+            get_ancesters = lambda termid: self.pygo.get_ancesters(
+                termid, details=True)
+            get_parents = self.__get_parents
+            get_children = None
+            if not getattr(graph, 'is_store', False):
+                children = self.pygo.get_children_index(details=True)
+                get_children = lambda termid: [
+                    (child, None) for child in children.get(termid, [])]
+
+        with self.profiler.phase('top_k'):
+            values1 = self.get_term_values(id1)
+            (semantic_values, _, total) = values1
+            ancesters = frozenset(semantic_values)
+            get_value = semantic_values.__getitem__
+            # The bound from the parents of a term only holds if its
+            # semantic values come from all its paths
+            all_paths = self.compiled or self.max_paths is None
+            # (-score, identifier) of the k best terms
+            best = []
+            counts = {'candidates': 0, 'scored': 0}
+
+            def score_terms(bounds):
+                """ Score the (bound, identifier) which can still enter
+                the k best terms, the highest bounds first. """
+                bounds.sort(reverse=True)
+                for (bound, termid) in bounds:
+                    if len(best) == k and bound + _EPSILON < -best[-1][0]:
+                        break
+                    score = self.__score_values(
+                        values1, self.get_term_values(termid))
+                    counts['scored'] += 1
+                    bisect.insort(best, (-score, termid))
+                    del best[k:]
+
+            def in_namespace(termid):
+                """ Whether the term is in the namespace asked for. """
+                return namespace is None or \
+                    graph[termid].get('namespace') == namespace
+
+            # The bound does not hold for the ancestors, they are scored
+            # first
+            score_terms([(1, accession(node)) for node in semantic_values
+                         if node != key and in_namespace(accession(node))])
+
+            # Sum and number of the ancestors whose descendants are left,
+            # the closest ancestors coming first
+            left_value = total
+            left_count = len(semantic_values)
+            covered = set()
+            for ancester in sorted(semantic_values, key=lambda node: (
+                    -semantic_values[node], node)):
+                # The terms not met yet only share with the term some of
+                # the ancestors left
+                if len(best) == k and _upper_bound(
+                        left_value, left_count, total) + _EPSILON < \
+                        -best[-1][0]:
+                    break
+                left_value = left_value - semantic_values[ancester]
+                left_count = left_count - 1
+                threshold = -1
+                if len(best) == k:
+                    threshold = -best[-1][0] - _EPSILON
+
+                bounds = []
+                for node in self.__iter_uncovered(
+                        ancester, covered, get_children):
+                    if node in ancesters:
+                        continue
+                    termid = accession(node)
+                    if not in_namespace(termid):
+                        continue
+                    counts['candidates'] += 1
+                    shared = ancesters.intersection(get_ancesters(node))
+                    shared_value = sum(map(get_value, shared))
+                    bound = _upper_bound(shared_value, len(shared), total)
+                    if bound < threshold:
+                        continue
+                    if all_paths:
+                        # A finer bound from the parents of the term
+                        direct = 0
+                        other_parents = 0
+                        for (parent, rel) in get_parents(node):
+                            if parent in ancesters:
+                                direct = direct + 1
+                            else:
+                                other_parents = other_parents + _WEIGHTS[rel]
+                        bound = _upper_bound(
+                            shared_value, len(shared), total, direct=direct,
+                            other_parents=other_parents)
+                        if bound < threshold:
+                            continue
+                    bounds.append((bound, termid))
+                score_terms(bounds)
+
+        for (name, value) in counts.items():
+            self.profiler.count(name, value)
+        return [(termid, -score) for (score, termid) in best]
+
+    def __iter_uncovered(self, termid, covered, get_children):
+        """ Yields the descendants of a term which are not covered yet
+        and adds them, with the term, to the covered terms. All the
+        descendants of a covered term are covered, so they are not
+        visited again.
+        :arg termid, the identifier of a term.
+        :arg covered, the set of the covered terms.
+        :arg get_children, the function returning the list of
+            (child, relation) of a term, None to query all the
+            descendants of the term at once.
+        """
+        covered.add(termid)
+        if get_children is None:
+            for node in self.pygo.get_descendants(termid, details=True):
+                if node not in covered:
+                    covered.add(node)
+                    yield node
+            return
+        stack = [termid]
+        while stack:
+            for (node, _) in get_children(stack.pop()):
+                if node not in covered:
+                    covered.add(node)
+                    stack.append(node)
+                    yield node
+
+    def __get_parents(self, termid):
+        """ Returns the list of (parent, relation) of a term of a graph
+        which is not compiled, the relation being 0 for is_a and 1 for
+        part_of as in the compiled graphs.
+        :arg termid, identifier of a GO term.
+        """
+        term = self.goterms[termid]
+        parents = []
+        for (rel, key) in enumerate(('is_a', 'part_of')):
+            for parentid in get_parent_ids(term, key):
+                if parentid in self.goterms:
+                    parents.append((self.goterms[parentid]['id'], rel))
+        return parents
+
+    def get_term_vectors(self, terms, columns=None):
+        """ Returns the semantic values of the given terms as sparse
+        vectors over their ancestors.
+        The output is a tuple with the matrix of the semantic values
+        (one row per term), the matrix of the presence of the ancestors,
+        the NumPy array of the semantic values of the terms and the
+        dictionary giving the column of each ancestor. The matrices are
+        scipy sparse matrices if scipy is installed, NumPy arrays
+        otherwise.
+        :arg terms, list of identifiers of GO terms (ie: GO:0043229, or
+            whatever identifier is in your ontology).
+        :kwarg columns, the dictionary giving the column of each
+            ancestor, as returned for other terms. The ancestors which
+            are not in it are left out, so the vectors can be compared
+            with the ones of these other terms. By default, the columns
+            are the ancestors of the given terms.
+        """
+        (numpy, sparse) = _import_numpy()
+        extend = columns is None
+        if extend:
+            columns = {}
+        rows = []
+        cols = []
+        data = []
+        totals = []
+        for (row, term) in enumerate(terms):
+            (values, _, total) = self.get_term_values(term)
+            totals.append(total)
+            for ancester in values:
+                if extend:
+                    col = columns.setdefault(ancester, len(columns))
+                else:
+                    col = columns.get(ancester)
+                    if col is None:
+                        continue
+                rows.append(row)
+                cols.append(col)
+                data.append(values[ancester])
+        shape = (len(terms), len(columns))
+
+        if sparse is not None:
+            values = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+            present = sparse.csr_matrix(
+                (numpy.ones(len(data)), (rows, cols)), shape=shape)
+        else:
+            values = numpy.zeros(shape)
+            values[rows, cols] = data
+            present = (values > 0).astype(float)
+        return (values, present, numpy.array(totals, dtype=float), columns)
+
+    def similarity_matrix(self, terms, others=None):
+        """ Returns the matrix of the scores between all the given GO
+        terms as a NumPy array.
+        The semantic values of each term are stored as a sparse vector
+        over the ancestors, the sums over the common ancestors of all the
+        pairs are then computed with a single matrix product. scipy is
+        used for the sparse matrices if it is installed.
+        :arg terms, list of identifiers of GO terms (ie: GO:0043229, or
+            whatever identifier is in your ontology).
+        :kwarg others, a second list of identifiers of GO terms, in which
+            case the scores between the terms of the first list (rows)
+            and the ones of the second list (columns) are returned.
+        """
+        if others is None:
+            vectors = self.get_term_vectors(terms)
+            return _cross_scores(vectors, vectors)
+        right = self.get_term_vectors(others)
+        left = self.get_term_vectors(terms, columns=right[3])
+        return _cross_scores(left, right)
 
 
 class GsesameGene(object):
@@ -167,14 +601,27 @@ class GsesameGene(object):
     see: http://bioinformatics.clemson.edu/G-SESAME/
     """
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, cache_size=CACHE_SIZE, profiler=None,
+                 max_paths=None):
         """ Constructor.
         :arg data, the graph of ontologies
+        :kwarg cache_size, the maximum number of terms for which the
+            semantic values are kept in memory, None for no limit.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, none are collected by default.
+        :kwarg max_paths, the maximum number of paths to the top of the
+            tree browsed for each term, see GsesameGO.
         """
         self.goterms = data
         if self.goterms is None:
             self.goterms = {}
         self.log = get_logger()
+        self.sesamego = GsesameGO(self.goterms, cache_size=cache_size,
+                                  profiler=profiler, max_paths=max_paths)
+        self.profiler = self.sesamego.profiler
+        # Vectors of the GO terms of the last gene index used
+        self.__index = None
+        self.__vectors = None
 
     def __get_go_score(self, goid, golist):
         """ For a given GO term return the semantic similarity between
@@ -184,9 +631,8 @@ class GsesameGene(object):
         :arg golist, list of GO terms
         """
         scores = []
-        sesamego = GsesameGO(self.goterms)
         for goterm in golist:
-            scores.append(sesamego.scores(goid, goterm))
+            scores.append(self.sesamego.scores(goid, goterm))
         return max(scores)
 
     def scores(self, gene1, gene2):
@@ -195,15 +641,91 @@ class GsesameGene(object):
         :arg gene1, list of GO term associated with the gene1
         :arg gene2, list of GO term associated with the gene2
         """
-        sim1 = 0
-        for goterm in gene1:
-            sim1 = sim1 + self.__get_go_score(goterm, gene2)
-        sim2 = 0
-        for goterm in gene2:
-            sim2 = sim2 + self.__get_go_score(goterm, gene1)
-        score = (sim1 + sim2) / (len(gene1) + len(gene2))
+        with self.profiler.phase('score'):
+            sim1 = 0
+            for goterm in gene1:
+                sim1 = sim1 + self.__get_go_score(goterm, gene2)
+            sim2 = 0
+            for goterm in gene2:
+                sim2 = sim2 + self.__get_go_score(goterm, gene1)
+            score = (sim1 + sim2) / (len(gene1) + len(gene2))
         return score
 
+    def __get_term_scores(self, terms, index):
+        """ Returns the matrix of the scores between the given GO terms
+        and all the GO terms of the gene index.
+        The vectors of the GO terms of the index are computed once.
+        :arg terms, list of GO terms.
+        :arg index, a GeneIndex as returned by GafIO.get_gene_index().
+        """
+        if self.__index is not index:
+            with self.profiler.phase('index'):
+                self.__vectors = self.sesamego.get_term_vectors(index.terms)
+            self.__index = index
+        left = self.sesamego.get_term_vectors(
+            terms, columns=self.__vectors[3])
+        return _cross_scores(left, self.__vectors)
+
+    def scores_against_all(self, gene, index):
+        """ Computes the semantic similarities between a gene and all the
+        genes of a gene index and yield the (gene, score) tuples.
+        The scores between the GO terms of the gene and all the GO terms
+        of the index are computed once, with a matrix product, each gene
+        is then scored from them.
+        :arg gene, the identifier of a gene of the index or the list of
+            GO terms associated with the gene.
+        :arg index, a GeneIndex as returned by GafIO.get_gene_index().
+        """
+        if isinstance(gene, basestring):
+            terms = index.get_terms(gene)
+        else:
+            terms = list(gene)
+        matrix = self.__get_term_scores(terms, index)
+        for other in index:
+            if other == gene:
+                continue
+            columns = index.get_term_positions(other)
+            yield (other, _best_match_score(matrix[:, columns]))
+
+    def all_scores(self, index, block_size=500):
+        """ Computes the semantic similarities between all the pairs of
+        genes of a gene index and yield the (gene1, gene2, score) tuples.
+        The genes are handled by blocks, the scores between the GO terms
+        of a block and all the GO terms of the index being computed once
+        per block.
+        :arg index, a GeneIndex as returned by GafIO.get_gene_index().
+        :kwarg block_size, the maximum number of distinct GO terms in a
+            block of genes, bounding the memory used.
+        """
+        genes = list(index)
+        start = 0
+        while start < len(genes):
+            # Gather the genes of the block and their GO terms
+            positions = {}
+            stop = start
+            while stop < len(genes):
+                new = set(index.get_term_positions(genes[stop])).difference(
+                    positions)
+                if stop > start and len(positions) + len(new) > block_size:
+                    break
+                for position in new:
+                    positions[position] = len(positions)
+                stop = stop + 1
+            terms = [None] * len(positions)
+            for (position, row) in positions.items():
+                terms[row] = index.terms[position]
+            matrix = self.__get_term_scores(terms, index)
+
+            for cnt in xrange(start, stop):
+                rows = [positions[position] for position in
+                        index.get_term_positions(genes[cnt])]
+                sub_matrix = matrix[rows]
+                for other in genes[cnt + 1:]:
+                    columns = index.get_term_positions(other)
+                    yield (genes[cnt], other,
+                           _best_match_score(sub_matrix[:, columns]))
+            start = stop
+
 if __name__ == '__main__':
     from oboio import OboIO
     from src import download_go_graph
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module computes the information content (IC) of the terms of an
+ontology from a corpus of annotations and the Resnik, Lin and
+Jiang-Conrath similarities of GO terms and of genes built on it.
+
+The IC of a term is -log(p), p being the share of the annotations of
+its root made to the term or to one of its descendants. It is computed
+once for all the terms of a compiled graph and stored in an array, so
+scoring two terms only requires to find their most informative common
+ancestor (MICA).
+"""
+
+import marshal
+import math
+import os
+import sys
+from array import array
+
+try:
+    from pygolib import get_logger, LRUCache, PyGoLib, PyGoLibException
+    from pygolib.snapshot import file_sha1
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger, LRUCache, PyGoLib, PyGoLibException
+    from src.snapshot import file_sha1
+
+MAGIC = 'PYGOIC'
+VERSION = 2
+# Similarity measures available
+MEASURES = ('resnik', 'lin', 'jc')
+# Default number of terms for which the ancestors are memoized
+CACHE_SIZE = 50000
+
+
+def corpus_key(filename, exclude_evidence=None):
+    """ Return the key identifying a corpus of annotations, made of the
+    SHA-1 digest of the GAF file and of the evidence codes excluded.
+    :arg filename, the name of the GAF file.
+    :kwarg exclude_evidence, the list of evidence codes for which the
+        annotations are skipped.
+    """
+    return '%s:%s' % (file_sha1(filename).encode('hex'),
+                      ','.join(sorted(set(exclude_evidence or []))))
+
+
+class InfoContent(object):
+    """ Table of the information content of the terms of an ontology.
+    The annotations made to a term are counted for all its ancestors,
+    the ancestor closure of the compiled graph being used so that an
+    ancestor reached through several paths counts them only once.
+    The terms without annotation have an IC of 0.
+    """
+
+    def __init__(self, data, index=None, details=True, profiler=None,
+                 corpus=None):
+        """ Constructor.
+        :arg data, the graph of ontologies, compiled or not.
+        :kwarg index, a GeneIndex as returned by GafIO.get_gene_index()
+            whose annotations are counted.
+        :kwarg details, if True the annotations are propagated through
+            the part_of relations as well as the is_a ones.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, none are collected by default.
+        :kwarg corpus, the key of the corpus of the annotations as
+            returned by corpus_key(), saved with the table.
+        """
+        self.log = get_logger()
+        pygo = PyGoLib(data, profiler=profiler)
+        self.profiler = pygo.profiler
+        self.graph = pygo.compile()
+        self.details = details
+        self.corpus = corpus
+        size = len(self.graph.ids)
+        self.counts = array('d', [0] * size)
+        self.values = array('d', [0] * size)
+        if index is not None:
+            self.compute(index)
+
+    def compute(self, index):
+        """ Count the annotations of the genes of an index for each term
+        and its ancestors and compute the IC of all the terms.
+        :arg index, a GeneIndex as returned by GafIO.get_gene_index().
+        """
+        graph = self.graph
+        with self.profiler.phase('index'):
+            direct = [0] * len(index.terms)
+            for position in index.term_idx:
+                direct[position] += 1
+            counts = array('d', [0] * len(graph.ids))
+            missing = 0
+            for (position, count) in enumerate(direct):
+                termid = index.terms[position]
+                if termid not in graph:
+                    missing = missing + 1
+                    continue
+                for node in graph.ancesters_sorted(
+                        graph.term_index(termid), details=self.details):
+                    counts[node] += count
+            if missing:
+                self.log.warning('%s GO terms of the annotations are not '
+                                 'in the ontology' % missing)
+
+            values = array('d', [0] * len(graph.ids))
+            for idx in xrange(len(graph.ids)):
+                if not counts[idx]:
+                    continue
+                total = max(counts[node] for node in graph.ancesters_sorted(
+                    idx, details=self.details) if graph.is_root(node))
+                values[idx] = math.log(total / counts[idx])
+        self.counts = counts
+        self.values = values
+
+    def get(self, termid):
+        """ Return the IC of a term.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        """
+        return self.values[self.graph.term_index(termid)]
+
+    def save(self, filename):
+        """ Write the table to the disk, to be read by load().
+        :arg filename, the name of the file to write.
+        """
+        data = marshal.dumps((MAGIC, VERSION, self.details, self.corpus,
+                              self.graph.ids, self.counts.tostring(),
+                              self.values.tostring()), 2)
+        stream = open(filename, 'wb')
+        try:
+            stream.write(data)
+        finally:
+            stream.close()
+
+    @classmethod
+    def load(cls, filename, data, profiler=None, corpus=None):
+        """ Read a table written by save().
+        A PyGoLibException is raised if the file is not a table of IC or
+        if the table was computed on another ontology or corpus.
+        :arg filename, the name of the file to read.
+        :arg data, the graph of ontologies the table was computed on.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, none are collected by default.
+        :kwarg corpus, the key of the corpus of the annotations as
+            returned by corpus_key(), not checked if None.
+        """
+        stream = open(filename, 'rb')
+        try:
+            try:
+                (magic, version, details, saved, ids, counts, values) = \
+                    marshal.loads(stream.read())
+            except (EOFError, ValueError, TypeError):
+                raise PyGoLibException('%s is not a table of IC' % filename)
+        finally:
+            stream.close()
+        if magic != MAGIC or version != VERSION:
+            raise PyGoLibException('%s is not a table of IC' % filename)
+        if corpus is not None and saved != corpus:
+            raise PyGoLibException('The table of IC %s was computed on '
+                                   'another corpus' % filename)
+        table = cls(data, details=details, profiler=profiler, corpus=saved)
+        if ids != table.graph.ids:
+            raise PyGoLibException('The table of IC %s was computed on '
+                                   'another ontology' % filename)
+        table.counts = array('d')
+        table.counts.fromstring(counts)
+        table.values = array('d')
+        table.values.fromstring(values)
+        return table
+
+
+class InfoContentGO(object):
+    """ This class computes the similarity of two GO terms from the IC
+    of their most informative common ancestor (MICA), with one of the
+    measures:
+     - resnik: IC(MICA)
+     - lin: 2 * IC(MICA) / (IC(term1) + IC(term2))
+     - jc: 1 / (1 + IC(term1) + IC(term2) - 2 * IC(MICA)), the similarity
+       derived from the distance of Jiang and Conrath.
+    The ancestors of the terms, sorted by decreasing IC, are memoized.
+    """
+
+    def __init__(self, table, measure='resnik', cache_size=CACHE_SIZE,
+                 profiler=None):
+        """ Constructor.
+        :arg table, the InfoContent of the terms.
+        :kwarg measure, the similarity measure: resnik, lin or jc.
+        :kwarg cache_size, the maximum number of terms for which the
+            ancestors are kept in memory, None for no limit.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, the one of the table by default.
+        """
+        if measure not in MEASURES:
+            raise PyGoLibException('Unknown measure: %s' % measure)
+        self.table = table
+        self.goterms = table.graph
+        self.measure = measure
+        self.log = get_logger()
+        self.profiler = profiler
+        if self.profiler is None:
+            self.profiler = table.profiler
+        self.cache = LRUCache(cache_size)
+        self.profiler.watch_cache('infocontent', self.cache)
+
+    def __get_ancesters(self, idx):
+        """ Returns, from the cache if possible, the set of the ancestors
+        of a term and the list of these ancestors sorted by decreasing
+        IC.
+        :arg idx, integer identifier of a term.
+        """
+        output = self.cache.get(idx)
+        if output is None:
+            ancesters = self.goterms.ancesters_sorted(
+                idx, details=self.table.details)
+            output = (frozenset(ancesters),
+                      sorted(ancesters, key=self.table.values.__getitem__,
+                             reverse=True))
+            self.cache.set(idx, output)
+        return output
+
+    def get_mica(self, id1, id2):
+        """ Returns the identifier of the most informative common
+        ancestor of two GO terms, or None if they have no common
+        ancestor.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        :arg id2, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        """
+        idx = self.__get_mica(self.goterms.term_index(id1),
+                              self.goterms.term_index(id2))
+        if idx is None:
+            return None
+        return self.goterms.accession(idx)
+
+    def __get_mica(self, idx1, idx2):
+        """ Returns the integer identifier of the most informative common
+        ancestor of two terms, see get_mica().
+        :arg idx1, integer identifier of a term.
+        :arg idx2, integer identifier of a term.
+        """
+        ancesters1 = self.__get_ancesters(idx1)[1]
+        ancesters2 = self.__get_ancesters(idx2)[0]
+        for ancester in ancesters1:
+            if ancester in ancesters2:
+                return ancester
+        return None
+
+    def scores(self, id1, id2):
+        """Returns the score between two given GO terms.
+        :arg id1, identifier of a GO term (ie: GO:0043231, or whatever
+            identifier is in your ontology).
+        :arg id2, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        """
+        with self.profiler.phase('score'):
+            idx1 = self.goterms.term_index(id1)
+            idx2 = self.goterms.term_index(id2)
+            values = self.table.values
+            mica = self.__get_mica(idx1, idx2)
+            value = 0.0
+            if mica is not None:
+                value = values[mica]
+            if self.measure == 'resnik':
+                return value
+            if self.measure == 'lin':
+                if not values[idx1] + values[idx2]:
+                    return float(idx1 == idx2)
+                return 2 * value / (values[idx1] + values[idx2])
+            return 1 / (1 + values[idx1] + values[idx2] - 2 * value)
+
+
+class InfoContentGene(object):
+    """ This class computes the similarity of two genes from the IC
+    based similarity of their GO terms, as the average of the best score
+    of each GO term of a gene against the GO terms of the other gene.
+    """
+
+    def __init__(self, table, measure='resnik', cache_size=CACHE_SIZE,
+                 profiler=None):
+        """ Constructor.
+        :arg table, the InfoContent of the terms.
+        :kwarg measure, the similarity measure: resnik, lin or jc.
+        :kwarg cache_size, the maximum number of terms for which the
+            ancestors are kept in memory, None for no limit.
+        :kwarg profiler, the Profiler collecting the statistics of the
+            computations, the one of the table by default.
+        """
+        self.log = get_logger()
+        self.icgo = InfoContentGO(table, measure=measure,
+                                  cache_size=cache_size, profiler=profiler)
+        self.goterms = self.icgo.goterms
+        self.profiler = self.icgo.profiler
+
+    def __get_go_score(self, goid, golist):
+        """ For a given GO term return the best similarity between this
+        GO term and the GO terms of the given list.
+        :arg goid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :arg golist, list of GO terms
+        """
+        return max(self.icgo.scores(goid, goterm) for goterm in golist)
+
+    def scores(self, gene1, gene2):
+        """ For two list of GO term associated with two genes, computes
+        the semantic similarities of the genes.
+        :arg gene1, list of GO term associated with the gene1
+        :arg gene2, list of GO term associated with the gene2
+        """
+        with self.profiler.phase('score'):
+            sim1 = 0
+            for goterm in gene1:
+                sim1 = sim1 + self.__get_go_score(goterm, gene2)
+            sim2 = 0
+            for goterm in gene2:
+                sim2 = sim2 + self.__get_go_score(goterm, gene1)
+            score = (sim1 + sim2) / (len(gene1) + len(gene2))
+        return score
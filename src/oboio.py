@@ -40,12 +40,377 @@ difference between the two terms.
 
 import sys
 import os
+import gzip
+import marshal
+import multiprocessing
 
 try:
-    from pygolib import get_logger
+    from pygolib import get_logger, Graph, PyGoLibException, __version__
 except ImportError:
     sys.path.insert(0, os.path.abspath('../'))
-    from src import get_logger
+    from src import get_logger, Graph, PyGoLibException, __version__
+
+# Fields of the terms kept in memory by Term, the other ones are read
+# back from the OBO file when they are accessed.
+# 'relationship' is only parsed for the part_of relations it holds.
+EAGER_FIELDS = ('id', 'name', 'namespace', 'is_a', 'part_of', 'alt_id',
+                'is_obsolete')
+_PARSED_FIELDS = frozenset(EAGER_FIELDS + ('relationship',))
+# Eager fields holding a list of identifiers
+_ID_FIELDS = ('is_a', 'part_of', 'alt_id')
+# Order in which the tags of a term are written, as recommended by the
+# OBO format, the other tags are written afterwards in alphabetical order.
+TAG_ORDER = ('id', 'is_anonymous', 'name', 'namespace', 'alt_id', 'def',
+             'comment', 'subset', 'synonym', 'xref', 'builtin',
+             'property_value', 'is_a', 'intersection_of', 'union_of',
+             'equivalent_to', 'disjoint_from', 'part_of', 'relationship',
+             'is_obsolete', 'replaced_by', 'consider', 'created_by',
+             'creation_date')
+# Tags whose values are identifiers of terms, commented with their name
+_PARENT_TAGS = frozenset(('is_a', 'part_of'))
+# Size of the chunks written to the OBO files
+BUFFER_SIZE = 1 << 20
+# Number of parts of the OBO file given to each process by get_graph()
+CHUNKS_PER_JOB = 4
+
+
+def _add_row(info, row, keys=None):
+    """ Parse one 'key: value' row of a term and store it in the term.
+    A key present several times is stored as a list of values.
+    :arg info, the dictionary of the term being read.
+    :arg row, the row to parse.
+    :kwarg keys, the set of keys to store, the other rows are skipped.
+        All the rows are stored by default.
+    """
+    (key, value) = row.split(':', 1)
+    key = key.strip()
+    if keys is not None and key not in keys:
+        return
+    if key == 'relationship':
+        if 'part_of' in value:
+            key = 'part_of'
+            value = value.split('part_of')[1].split(
+                '!')[0].strip()
+    if key in info:
+        if isinstance(info[key], str):
+            info[key] = [info[key], value.strip()]
+        elif isinstance(info[key], list):
+            info[key].append(value.strip())
+    else:
+        info[key] = value.strip()
+
+
+def _intern(value):
+    """ Return the interned version of a string, so that the identifiers
+    repeated through the graph share the same object.
+    :arg value, the string to intern.
+    """
+    if isinstance(value, str):
+        return intern(value)
+    return value
+
+
+def _parse_ids(values):
+    """ Return the tuple of the interned identifiers of a field of a
+    term, stripping the comment after the '!' if any.
+    :arg values, the value of the field: None, a string or a list.
+    """
+    if values is None:
+        return ()
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    return tuple(_intern(value.split('!')[0].strip()) for value in values)
+
+
+def _read_records(stream, keys=None, start=0, stop=None):
+    """ Read the [Term] stanzas of an OBO file line by line and yield the
+    position of the first row of each term along with the term.
+    :arg stream, the opened OBO file.
+    :kwarg keys, the set of fields of the terms to read, all of them
+        by default.
+    :kwarg start, the position of the first row to read, at the
+        beginning of a row.
+    :kwarg stop, the position at which the reading stops, at the
+        beginning of a stanza, the end of the file by default.
+    """
+    if start:
+        stream.seek(start)
+    info = None
+    offset = start
+    begin = None
+    for row in stream:
+        if stop is not None and offset >= stop:
+            break
+        offset = offset + len(row)
+        if not row.strip():
+            # A blank line closes the current stanza
+            if info:
+                yield (begin, info)
+            info = None
+        elif row.startswith('['):
+            if info:
+                yield (begin, info)
+            info = None
+            if row.strip() == '[Term]':
+                info = {}
+                begin = offset
+        elif info is not None and ':' in row:
+            _add_row(info, row, keys)
+    if info:
+        yield (begin, info)
+
+
+def _split_stanzas(filename, parts):
+    """ Split an OBO file in ranges of bytes of about the same size,
+    starting at the beginning of a stanza.
+    :arg filename, the name of the OBO file.
+    :arg parts, the number of ranges wanted.
+    """
+    size = os.path.getsize(filename)
+    bounds = [0]
+    stream = open(filename, 'rb')
+    try:
+        for cnt in range(1, parts):
+            stream.seek(max(size * cnt / parts, bounds[-1]))
+            # Skip the end of the current row, then up to the next stanza
+            stream.readline()
+            while True:
+                offset = stream.tell()
+                row = stream.readline()
+                if not row or row.startswith('['):
+                    break
+            if offset > bounds[-1]:
+                bounds.append(offset)
+    finally:
+        stream.close()
+    bounds.append(size)
+    return zip(bounds[:-1], bounds[1:])
+
+
+def _parse_range(task):
+    """ Read the terms of a range of bytes of an OBO file, in a worker
+    process of OboIO.get_graph().
+    The terms are returned as a marshal string of their Term.dump(),
+    which is fast to send back and keeps their identifiers interned.
+    :arg task, the tuple (absolute name of the file, start, stop).
+    """
+    (source, start, stop) = task
+    stream = open(source, 'rb')
+    try:
+        return marshal.dumps([
+            Term(info, source=source, offset=offset).dump()
+            for (offset, info) in _read_records(
+                stream, keys=_PARSED_FIELDS, start=start, stop=stop)])
+    finally:
+        stream.close()
+
+
+class Term(object):
+    """ A compact term of the ontology.
+    Only the identifier, the name, the namespace, the identifiers of the
+    parents and of the alt_id and the obsolete flag are kept in memory.
+    When the term is read from an OBO file, the other fields (def,
+    synonym, xref...) are read back from the file when they are
+    accessed.
+    The term can be used as a dictionary of its fields, in which a field
+    present several times is a list of values.
+    """
+
+    __slots__ = ('id', 'name', 'namespace', 'is_a', 'part_of', 'alt_id',
+                 'is_obsolete', 'source', 'offset', 'fields')
+
+    def __init__(self, info, source=None, offset=None):
+        """ Constructor.
+        :arg info, the dictionary of the fields of the term.
+        :kwarg source, the absolute name of the OBO file the term was
+            read from, the fields not kept in memory are read from it.
+        :kwarg offset, the position in the source of the first row of
+            the term.
+        """
+        self.id = _intern(info['id'])
+        self.name = info.get('name')
+        self.namespace = _intern(info.get('namespace'))
+        self.is_a = _parse_ids(info.get('is_a'))
+        self.part_of = _parse_ids(info.get('part_of'))
+        self.alt_id = _parse_ids(info.get('alt_id'))
+        self.is_obsolete = _intern(info.get('is_obsolete'))
+        self.source = None
+        self.offset = None
+        self.fields = None
+        if source is not None:
+            self.source = _intern(source)
+            self.offset = offset
+        else:
+            self.fields = dict(
+                (key, value) for (key, value) in info.items()
+                if key not in EAGER_FIELDS) or None
+
+    def __repr__(self):
+        return 'Term(%r)' % self.id
+
+    def __eq__(self, other):
+        if isinstance(other, Term):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getstate__(self):
+        return self.dump()
+
+    def __setstate__(self, state):
+        for (key, value) in zip(self.__slots__, state):
+            setattr(self, key, value)
+
+    def dump(self):
+        """ Return the content of the term as a tuple of built-in types,
+        which can be given back to Term.restore().
+        """
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    @classmethod
+    def restore(cls, state):
+        """ Return the term saved by dump().
+        :arg state, the tuple returned by dump().
+        """
+        term = cls.__new__(cls)
+        term.__setstate__(state)
+        return term
+
+    def get_fields(self, stream=None):
+        """ Return the dictionary of the fields of the term which are not
+        kept in memory, reading them from the OBO file if needed.
+        A PyGoLibException is raised if the term is no longer at its
+        position in the OBO file, which changed since it was read.
+        :kwarg stream, the OBO file of the term already opened, to avoid
+            opening it again when the fields of many terms are read.
+        """
+        if self.source is None:
+            return dict(self.fields or {})
+        info = {}
+        try:
+            if stream is None:
+                source = open(self.source, 'rb')
+            else:
+                source = stream
+            try:
+                source.seek(self.offset)
+                for row in source:
+                    if not row.strip() or row.startswith('['):
+                        break
+                    if ':' in row:
+                        _add_row(info, row)
+            finally:
+                if source is not stream:
+                    source.close()
+        except IOError, err:
+            get_logger().warning('Could not read the fields of %s: %s' %
+                                 (self.id, err))
+            return {}
+        if info.get('id') != self.id:
+            raise PyGoLibException(
+                'The term %s is no longer at its position in %s, the file '
+                'changed since it was read' % (self.id, self.source))
+        for key in EAGER_FIELDS:
+            info.pop(key, None)
+        return info
+
+    def __materialize(self):
+        """ Keep all the fields of the term in memory, before one of the
+        fields read from the OBO file is changed.
+        """
+        if self.source is not None:
+            self.fields = self.get_fields()
+            self.source = None
+            self.offset = None
+        elif self.fields is None:
+            self.fields = {}
+
+    def __getitem__(self, key):
+        if key in EAGER_FIELDS:
+            value = getattr(self, key)
+            if value is None or value == ():
+                raise KeyError(key)
+            if key in _ID_FIELDS:
+                if len(value) == 1:
+                    return value[0]
+                return list(value)
+            return value
+        return self.get_fields()[key]
+
+    def __setitem__(self, key, value):
+        if key in _ID_FIELDS:
+            setattr(self, key, _parse_ids(value))
+        elif key in EAGER_FIELDS:
+            if key == 'id':
+                # The identifier locates the term in the OBO file
+                self.__materialize()
+            setattr(self, key, _intern(value))
+        else:
+            self.__materialize()
+            self.fields[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in _ID_FIELDS:
+            setattr(self, key, ())
+        elif key in EAGER_FIELDS:
+            if key == 'id':
+                self.__materialize()
+            setattr(self, key, None)
+        else:
+            self.__materialize()
+            del self.fields[key]
+
+    def __contains__(self, key):
+        if key in EAGER_FIELDS:
+            return getattr(self, key) not in (None, ())
+        return key in self.get_fields()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        """ Return the value of a field, or default if the term does not
+        have it.
+        :arg key, the name of the field.
+        :kwarg default, the value to return if the field is missing.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """ Return the list of the fields of the term. """
+        return [key for key in EAGER_FIELDS if key in self] + \
+            self.get_fields().keys()
+
+    def values(self):
+        """ Return the list of the values of the fields of the term. """
+        return [value for (key, value) in self.items()]
+
+    def items(self):
+        """ Return the list of the (field, value) of the term. """
+        return self.to_dict().items()
+
+    def to_dict(self, stream=None):
+        """ Return all the fields of the term as a dictionary, as
+        returned by OboIO.iter_terms() (the comments of the parents
+        excepted).
+        :kwarg stream, the OBO file of the term already opened, see
+            get_fields().
+        """
+        info = self.get_fields(stream)
+        for key in EAGER_FIELDS:
+            if key in self:
+                info[key] = self[key]
+        return info
 
 
 class OboIO (object):
@@ -55,91 +420,221 @@ class OboIO (object):
         """ Constructor. """
         self.graph = graph
         if self.graph is None:
-            self.graph = {}
+            self.graph = Graph()
         self.log = get_logger()
 
-    def get_graph(self, filename, no_check_unique=True):
+    def iter_terms(self, filename):
+        """ Read the OBO file line by line and yield its terms one at a
+        time, as dictionaries.
+        Only the [Term] stanzas are built, the other stanzas ([Typedef],
+        [Instance]...) are skipped as they are read.
+        :arg filename, the name of the file to read or an already opened
+            stream.
+        """
+        for (offset, info) in self.__iter_records(filename):
+            yield info
+
+    def __iter_records(self, filename, keys=None):
+        """ Read the OBO file line by line and yield the position of the
+        first row of each term in the file along with the term, see
+        iter_terms().
+        :arg filename, the name of the file to read or an already opened
+            stream.
+        :kwarg keys, the set of fields of the terms to read, all of them
+            by default.
+        """
+        if hasattr(filename, 'read'):
+            stream = filename
+        else:
+            stream = open(filename, 'rb')
+        try:
+            for record in _read_records(stream, keys=keys):
+                yield record
+        finally:
+            if stream is not filename:
+                stream.close()
+
+    def add_term(self, info, no_check_unique=True):
+        """ Add a term to the graph, under its id and its alt_id.
+        :arg info, the term as returned by iter_terms(), or a Term.
+        :kwarg no_check_unique, a boolean to specify wether we should
+        check that IDs are unique in the ontology.
+        """
+        term = info
+        if not isinstance(term, Term):
+            term = Term(info)
+        if no_check_unique:
+            self.graph[term.id] = term
+        elif term.id not in self.graph:
+            self.graph[term.id] = term
+        else:
+            self.log.warning(
+                '%s is present several time in the ontology' % term.id)
+
+        for ids in term.alt_id:
+            if no_check_unique:
+                self.graph[ids] = term
+            elif ids not in self.graph:
+                self.graph[ids] = term
+            else:
+                self.log.warning(
+                    '%s is present several time in the ontology' %
+                    term.id)
+
+    def get_graph(self, filename, no_check_unique=True, jobs=1):
         """ From the OBO file, extract all the terms and store them in
         a graph.
+        The file is streamed, so only the graph is kept in memory. The
+        terms are stored as Term, which read their bulky fields (def,
+        synonym...) back from the file when they are accessed, unless
+        an opened stream is given.
+        With several jobs, the file is split at the stanzas in ranges of
+        bytes read by as many processes, and their terms are added to the
+        graph in the order of the file, so the graph and the warnings
+        about duplicated identifiers are the same as with a single one.
         :arg filename, the name of the file to read.
         :kwarg no_check_unique, a boolean to specify wether we should
         check that IDs are unique in the ontology. Influences speed
         greatly.
+        :kwarg jobs, the number of processes reading the file, an opened
+            stream is always read in the current process.
         """
-        stream = open(filename)
-        data = stream.read()
-        stream.close()
         self.log.info('Loading GO terms...')
-        for entry in data.split("\n\n"):
-            if '[Term]' in entry:
-                info = {}
-                rows = entry.split('\n')
-                for row in rows[1:]:
-                    if row and ':' in row:
-                        (key, value) = row.split(':', 1)
-                        key = key.strip()
-                        if key == 'relationship':
-                            if 'part_of' in value:
-                                key = 'part_of'
-                                value = value.split('part_of')[1].split(
-                                    '!')[0].strip()
-                        if key in info:
-                            if isinstance(info[key], str):
-                                info[key] = [info[key], value.strip()]
-                            elif isinstance(info[key], list):
-                                info[key].append(value.strip())
-                        else:
-                            info[key] = value.strip()
-
-                if no_check_unique:
-                    self.graph[info['id']] = info
-                elif info['id'] not in self.graph:
-                    self.graph[info['id']] = info
-                else:
-                    self.log.warning(
-                        '%s is present several time in the ontology' %
-                        info['id'])
-
-                if 'alt_id' in info:
-                    alt_ids = info['alt_id']
-                    if isinstance(alt_ids, str):
-                        if no_check_unique:
-                            self.graph[alt_ids] = info
-                        elif alt_ids not in self.graph:
-                            self.graph[alt_ids] = info
-                        else:
-                            self.log.warning(
-                                '%s is present several time in the ontology' %
-                                info['id'])
-                    elif isinstance(alt_ids, list):
-                        for ids in alt_ids:
-                            if no_check_unique:
-                                self.graph[ids] = info
-                            elif ids not in self.graph:
-                                self.graph[ids] = info
-                            else:
-                                self.log.warning(
-                                    '%s is present several '
-                                    'time in the ontology' %
-                                    info['id'])
+        if hasattr(filename, 'read'):
+            for (offset, info) in self.__iter_records(filename):
+                self.add_term(Term(info), no_check_unique=no_check_unique)
+        elif jobs > 1:
+            source = os.path.abspath(filename)
+            tasks = [(source, start, stop) for (start, stop) in
+                     _split_stanzas(source, jobs * CHUNKS_PER_JOB)]
+            pool = multiprocessing.Pool(min(jobs, len(tasks)))
+            try:
+                for data in pool.imap(_parse_range, tasks):
+                    for state in marshal.loads(data):
+                        self.add_term(Term.restore(state),
+                                      no_check_unique=no_check_unique)
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            source = os.path.abspath(filename)
+            for (offset, info) in self.__iter_records(
+                    source, keys=_PARSED_FIELDS):
+                self.add_term(Term(info, source=source, offset=offset),
+                              no_check_unique=no_check_unique)
         self.log.info("%s GO terms retrieved" % len(self.graph))
         return self.graph
 
-    def write_down_ontology(self, datafile):
+    def format_term(self, term, stream=None):
+        """ Return the [Term] stanza of a term, with its tags in the order
+        recommended by the OBO format, so that the same term always gives
+        the same text.
+        The identifiers of the parents are commented with their name when
+        they are in the graph.
+        :arg term, the term as returned by iter_terms(), or a Term.
+        :kwarg stream, the OBO file of the term already opened, see
+            Term.get_fields().
+        """
+        if isinstance(term, Term):
+            info = term.to_dict(stream)
+        else:
+            info = term
+        keys = [key for key in TAG_ORDER if key in info]
+        keys.extend(sorted(key for key in info if key not in TAG_ORDER))
+        rows = ['[Term]\n']
+        for key in keys:
+            values = info[key]
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            tag = key
+            prefix = ''
+            if key == 'part_of':
+                tag = 'relationship'
+                prefix = 'part_of '
+            for value in values:
+                if key in _PARENT_TAGS:
+                    value = value.split('!')[0].strip()
+                    parent = self.graph.get(value)
+                    if parent is not None and 'name' in parent:
+                        value = '%s ! %s' % (value, parent['name'])
+                rows.append('%s: %s%s\n' % (tag, prefix, value))
+        rows.append('\n')
+        return ''.join(rows)
+
+    def write_down_ontology(self, datafile, terms=None, compress=None,
+                            header=None):
         """ Writes graph to disk.
-        :arg datafile, the name of the file to which write the ontology.
+        Each term is written once, even if it is present in the graph
+        under its alt_id, and the terms are sorted by identifier so that
+        the same graph always gives the same file.
+        The stanzas are written by chunks of BUFFER_SIZE bytes.
+        :arg datafile, the name of the file to which write the ontology,
+            or an already opened stream.
+        :kwarg terms, an iterable of the terms to write, instead of the
+            terms of the graph.
+        :kwarg compress, a boolean to compress the file with gzip,
+            defaults to whether the name of the file ends with '.gz'.
+        :kwarg header, a dictionary of the tags to add to the header of
+            the file (ie: data-version, default-namespace).
         """
-        stream = open(datafile, 'w')
-        cnt = 0
-        for key in self.graph:
-            stream.write('\n[Term] \n')
-            cnt = cnt + 1
-            info = self.graph[key]
-            for infokey in info:
-                if isinstance(info[infokey], list):
-                    for entry in info[infokey]:
-                        stream.write(infokey + ': ' + entry + '\n')
-                else:
-                    stream.write(infokey + ': ' + info[infokey] + '\n')
-        stream.close()
-        print '%s terms written to the file %s' % (cnt, datafile)
+        if terms is None:
+            terms = self.graph.itervalues()
+        canonical = {}
+        for term in terms:
+            canonical.setdefault(term['id'], term)
+
+        tags = {'format-version': '1.2',
+                'auto-generated-by': 'pygolib %s' % __version__}
+        tags.update(header or {})
+        rows = ['format-version: %s\n' % tags.pop('format-version')]
+        for key in sorted(tags):
+            rows.append('%s: %s\n' % (key, tags[key]))
+        rows.append('\n')
+
+        if hasattr(datafile, 'write'):
+            output = datafile
+        else:
+            output = open(datafile, 'wb')
+        if compress is None:
+            compress = not hasattr(datafile, 'write') and \
+                datafile.endswith('.gz')
+        stream = output
+        if compress:
+            # No name nor time in the gzip header, to keep the file
+            # identical from one run to the other
+            stream = gzip.GzipFile(filename='', mode='wb', fileobj=output,
+                                   mtime=0)
+        sources = {}
+        try:
+            size = sum(len(row) for row in rows)
+            for termid in sorted(canonical):
+                term = canonical[termid]
+                source = None
+                if isinstance(term, Term) and term.source is not None:
+                    if term.source not in sources:
+                        try:
+                            sources[term.source] = open(term.source, 'rb')
+                        except IOError:
+                            # Term.get_fields() reports it for each term
+                            sources[term.source] = None
+                    source = sources[term.source]
+                stanza = self.format_term(term, stream=source)
+                rows.append(stanza)
+                size = size + len(stanza)
+                if size >= BUFFER_SIZE:
+                    stream.write(''.join(rows))
+                    rows = []
+                    size = 0
+            stream.write(''.join(rows))
+        finally:
+            for source in sources.values():
+                if source is not None:
+                    source.close()
+            if stream is not output:
+                stream.close()
+            if output is not datafile:
+                output.close()
+        self.log.info('%s terms written to the file %s' % (
+            len(canonical), getattr(datafile, 'name', datafile)))
+        return len(canonical)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module compares two releases of an ontology. It reports the terms
+added, removed, obsoleted and re-parented between them, and the terms
+whose ancestors changed, which are the only ones for which the data
+derived from the graph (ancestor closures, semantic values, scores of
+pairs of terms) has to be computed again.
+"""
+
+import os
+import sys
+from array import array
+
+try:
+    from pygolib import get_logger, get_parent_ids, PyGoLib
+    from pygolib.gsesame import remap_cache
+    from pygolib.oboio import OboIO
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger, get_parent_ids, PyGoLib
+    from src.gsesame import remap_cache
+    from src.oboio import OboIO
+
+
+def _get_terms(graph):
+    """ Return the dictionary of the terms of a graph by their main
+    identifier, the alt_id left out.
+    :arg graph, the graph of ontologies, compiled or not.
+    """
+    return dict((term['id'], term) for term in graph.values())
+
+
+class OntologyDiff(object):
+    """ The differences between two releases of an ontology. """
+
+    def __init__(self, old, new):
+        """ Constructor.
+        :arg old, the graph of the old release, compiled or not.
+        :arg new, the graph of the new release, compiled or not.
+        """
+        self.old = old
+        self.new = new
+        self.log = get_logger()
+        old_terms = _get_terms(old)
+        new_terms = _get_terms(new)
+        self.terms = frozenset(new_terms)
+        self.added = set(new_terms).difference(old_terms)
+        self.removed = set(old_terms).difference(new_terms)
+        self.obsoleted = set()
+        self.reparented = set()
+        # Terms whose parents changed, by value of `details`
+        self.__reparented = {False: set(), True: set()}
+        for termid in self.terms.intersection(old_terms):
+            old_term = old_terms[termid]
+            new_term = new_terms[termid]
+            if new_term.get('is_obsolete') == 'true' and \
+                    old_term.get('is_obsolete') != 'true':
+                self.obsoleted.add(termid)
+            for (details, key) in ((False, 'is_a'), (True, 'part_of')):
+                if set(get_parent_ids(old_term, key)) != \
+                        set(get_parent_ids(new_term, key)):
+                    self.reparented.add(termid)
+                    self.__reparented[True].add(termid)
+                    if not details:
+                        self.__reparented[False].add(termid)
+        # Terms whose ancestors changed, by value of `details`
+        self.__affected = {}
+
+    def get_affected(self, details=True):
+        """ Return the set of identifiers of the terms of the new release
+        whose ancestors changed: the terms added or re-parented and all
+        their descendants, in either release, as well as the descendants
+        of the terms removed.
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        if details in self.__affected:
+            return self.__affected[details]
+        sources = self.added.union(self.removed, self.__reparented[details])
+        affected = set()
+        for graph in (self.old, self.new):
+            golib = PyGoLib(graph)
+            done = set()
+            for termid in sources:
+                if termid not in graph or termid in done:
+                    continue
+                done.add(termid)
+                descendants = golib.get_descendants(termid, details=details)
+                done.update(descendants)
+                affected.add(termid)
+                affected.update(descendants)
+        self.__affected[details] = frozenset(affected.intersection(
+            self.terms))
+        return self.__affected[details]
+
+    def is_stable(self, termid, details=True):
+        """ Return whether a term has the same ancestors in both releases,
+        in which case the scores of the pairs of stable terms remain
+        valid.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        return self.new[termid]['id'] not in self.get_affected(
+            details=details)
+
+    def summary(self):
+        """ Return the number of terms of each kind of change as human
+        readable text. """
+        lines = []
+        for (name, terms) in (('added', self.added),
+                              ('removed', self.removed),
+                              ('obsoleted', self.obsoleted),
+                              ('re-parented', self.reparented),
+                              ('with new ancestors', self.get_affected())):
+            lines.append('%s terms %s' % (len(terms), name))
+        return '\n'.join(lines)
+
+
+def diff_ontologies(oldfile, newfile, no_check_unique=True):
+    """ Read two releases of an ontology from their OBO files and return
+    their differences, see OntologyDiff.
+    :arg oldfile, the name of the OBO file of the old release.
+    :arg newfile, the name of the OBO file of the new release.
+    :kwarg no_check_unique, a boolean to specify wether we should
+        check that IDs are unique in the ontology.
+    """
+    old = OboIO().get_graph(oldfile, no_check_unique=no_check_unique)
+    new = OboIO().get_graph(newfile, no_check_unique=no_check_unique)
+    return OntologyDiff(old, new)
+
+
+def _get_reuse(old, details, keep, translate):
+    """ Return the function giving, for the build_closure() of the new
+    compiled graph, the ancestors of the terms which did not change, from
+    the ancestor closure of the old compiled graph.
+    :arg old, the compiled graph of the old release.
+    :arg details, the value of `details` of the closure.
+    :arg keep, a dictionary giving the integer identifier in the old
+        graph of the terms of the new graph whose ancestors did not
+        change.
+    :arg translate, the array giving the integer identifier in the new
+        graph of each term of the old graph, None if they are the same.
+    """
+    (ptr, values) = old.closure[details]
+
+    def reuse(node):
+        """ Return the ancestors of a term of the new graph, or None. """
+        idx = keep.get(node)
+        if idx is None:
+            return None
+        if translate is None:
+            return values[ptr[idx]:ptr[idx + 1]]
+        return [translate[ancester]
+                for ancester in values[ptr[idx]:ptr[idx + 1]]]
+    return reuse
+
+
+def update_compiled(old, new, diff=None, profiler=None):
+    """ Return the compiled graph of a new release of an ontology.
+    The ancestor closures and the cached semantic values of the terms
+    whose ancestors did not change are taken from the compiled graph of
+    the old release instead of being computed again.
+    :arg old, the compiled graph of the old release.
+    :arg new, the graph of the new release.
+    :kwarg diff, the OntologyDiff between the two releases, computed if
+        not given.
+    :kwarg profiler, the Profiler collecting the statistics of the
+        computations, none are collected by default.
+    """
+    if diff is None:
+        diff = OntologyDiff(old, new)
+    compiled = PyGoLib(new, profiler=profiler).compile()
+    translate = None
+    if compiled.ids != old.ids:
+        translate = array('i', [-1] * len(old.ids))
+        for (idx, termid) in enumerate(old.ids):
+            if termid in compiled.index:
+                translate[idx] = compiled.index[termid]
+
+    # Integer identifiers in the old graph of the terms which did not
+    # change, by integer identifier in the new graph
+    keep = {}
+    for details in sorted(old.closure):
+        affected = diff.get_affected(details=details)
+        keep[details] = dict(
+            (idx, old.index[termid]) for (idx, termid)
+            in enumerate(compiled.ids) if termid not in affected)
+        compiled.build_closure(details=details, reuse=_get_reuse(
+            old, details, keep[details], translate))
+
+    cache = old.caches.get('gsesame')
+    if cache is not None:
+        if True not in keep:
+            affected = diff.get_affected(details=True)
+            keep[True] = dict(
+                (idx, old.index[termid]) for (idx, termid)
+                in enumerate(compiled.ids) if termid not in affected)
+        compiled.caches['gsesame'] = remap_cache(
+            cache, set(keep[True].itervalues()), translate=translate)
+        get_logger().info('%s semantic values kept out of %s' % (
+            len(compiled.caches['gsesame']), len(cache)))
+    return compiled
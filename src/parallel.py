@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module scores pairs of GO terms in several processes.
+The scorer, and thus the loaded ontology, is handed to the worker
+processes when they are forked, so it is neither parsed again nor
+pickled for each task. The pairs are sent to the workers by chunks and
+the results are yielded back in the order of the pairs.
+"""
+
+import multiprocessing
+import os
+import sys
+from collections import deque
+from itertools import islice
+
+try:
+    from pygolib import get_logger
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger
+
+# Scorer used by the current worker process
+_SCORER = None
+
+
+def _init_worker(scorer):
+    """ Store the scorer in the worker process.
+    :arg scorer, an object with a scores(id1, id2) method.
+    """
+    global _SCORER
+    _SCORER = scorer
+
+
+def _find_missing(scorer, id1, id2):
+    """ Return a GO term of a pair which is not in the ontology of the
+    scorer, None if they all are.
+    :arg scorer, an object with a scores(id1, id2) method, whose goterms
+        attribute is the graph of ontologies it works on. The terms are
+        not checked if it has none.
+    :arg id1, the first element of the pair, a GO term or the list of
+        the GO terms of a gene.
+    :arg id2, the second element of the pair.
+    """
+    graph = getattr(scorer, 'goterms', None)
+    if graph is None:
+        return None
+    for element in (id1, id2):
+        if isinstance(element, basestring):
+            element = (element,)
+        for termid in element:
+            if termid not in graph:
+                return termid
+    return None
+
+
+def _score(scorer, id1, id2, skip_missing=False):
+    """ Score one pair, returning None for pairs whose terms are not in
+    the ontology if skip_missing is True.
+    :arg scorer, an object with a scores(id1, id2) method.
+    :arg id1, the first element of the pair.
+    :arg id2, the second element of the pair.
+    :kwarg skip_missing, do not fail on terms missing in the ontology.
+    """
+    if skip_missing:
+        missing = _find_missing(scorer, id1, id2)
+        if missing is not None:
+            get_logger().warning("GO term '%s' was not found in the "
+                                 "ontology" % missing)
+            return None
+    return scorer.scores(id1, id2)
+
+
+def _score_chunk(chunk, skip_missing=False):
+    """ Score a chunk of pairs in a worker process.
+    :arg chunk, a list of (id1, id2) pairs.
+    :kwarg skip_missing, do not fail on terms missing in the ontology.
+    """
+    return [(id1, id2, _score(_SCORER, id1, id2, skip_missing))
+            for (id1, id2) in chunk]
+
+
+def iter_chunks(iterable, chunksize):
+    """ Split an iterable into lists of at most chunksize elements.
+    :arg iterable, the iterable to split.
+    :arg chunksize, the maximum number of elements per chunk.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_pairs(terms):
+    """ Iterate over all the pairs of the given list of terms, each pair
+    appearing once, in the order of the list.
+    :arg terms, a list of identifiers of GO terms.
+    """
+    terms = [term.strip() for term in terms]
+    for (cnt, term1) in enumerate(terms):
+        for term2 in terms[cnt + 1:]:
+            if term2:
+                yield (term1, term2)
+
+
+def read_pairs(stream, genes=False):
+    """ Iterate over the pairs of a stream with one pair per line, the two
+    elements being separated by a tabulation (or by spaces).
+    Empty lines and lines starting with '#' are skipped, as well as the
+    lines with a gene without GO term.
+    :arg stream, an iterable of lines, for example an opened file.
+    :kwarg genes, if True each element is a comma ( , ) separated list of
+        GO terms associated with a gene and is returned as a tuple.
+    """
+    for (cnt, row) in enumerate(stream):
+        row = row.strip()
+        if not row or row.startswith('#'):
+            continue
+        if '\t' in row:
+            fields = row.split('\t')
+        else:
+            fields = row.split()
+        if len(fields) < 2:
+            get_logger().warning('Line %s does not contain a pair' %
+                                 (cnt + 1))
+            continue
+        (first, second) = (fields[0].strip(), fields[1].strip())
+        if genes:
+            first = tuple(term.strip() for term in first.split(',')
+                          if term.strip())
+            second = tuple(term.strip() for term in second.split(',')
+                           if term.strip())
+            if not first or not second:
+                get_logger().warning('Line %s contains a gene without GO '
+                                     'term' % (cnt + 1))
+                continue
+        yield (first, second)
+
+
+def score_pairs(scorer, pairs, jobs=1, chunksize=1000, skip_missing=False,
+                cache=None):
+    """ Score pairs of GO terms and yield the (id1, id2, score) tuples in
+    the order of the pairs.
+    With more than one job, the pairs are scored by chunks in a pool of
+    worker processes; only a few chunks per worker are in flight at any
+    time so the pairs can be streamed.
+    :arg scorer, an object with a scores(id1, id2) method, for example a
+        GoDistanceCounter or a GsesameGO.
+    :arg pairs, an iterable of (id1, id2) pairs.
+    :kwarg jobs, the number of processes to use.
+    :kwarg chunksize, the number of pairs sent at once to a worker.
+    :kwarg skip_missing, score as None the pairs with a term which is
+        not in the ontology instead of failing.
+    :kwarg cache, a ScoreCache in which the scores of each chunk of pairs
+        are looked up before being computed, the scores computed being
+        written back to it.
+    """
+    if jobs <= 1 and cache is None:
+        for (id1, id2) in pairs:
+            yield (id1, id2, _score(scorer, id1, id2, skip_missing))
+        return
+
+    pool = None
+    if jobs > 1:
+        get_logger().debug('Scoring pairs with %s processes' % jobs)
+        pool = multiprocessing.Pool(jobs, _init_worker, (scorer,))
+    try:
+        pending = deque()
+        for chunk in iter_chunks(pairs, chunksize):
+            found = {}
+            if cache is not None:
+                found = cache.get_many(chunk)
+                missing = [pair for pair in chunk if pair not in found]
+            else:
+                missing = chunk
+            if pool is None:
+                results = _FinishedResult(
+                    [(id1, id2, _score(scorer, id1, id2, skip_missing))
+                     for (id1, id2) in missing])
+            else:
+                results = pool.apply_async(_score_chunk,
+                                           (missing, skip_missing))
+            pending.append((chunk, found, results))
+            if len(pending) >= 2 * max(jobs, 1):
+                for result in _merge_chunk(pending.popleft(), cache):
+                    yield result
+        while pending:
+            for result in _merge_chunk(pending.popleft(), cache):
+                yield result
+        if cache is not None:
+            cache.flush()
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+class _FinishedResult(object):
+    """ The scores of a chunk computed in the current process, behaving
+    like the result of Pool.apply_async(). """
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        """ Return the scores. """
+        return self.value
+
+
+def _merge_chunk(task, cache=None):
+    """ Return the (id1, id2, score) tuples of a chunk of pairs in their
+    order, from the scores found in the cache and the ones computed,
+    which are written to the cache.
+    :arg task, the tuple (chunk of pairs, scores found in the cache by
+        pair, result of the scoring of the other pairs).
+    :kwarg cache, the ScoreCache of the scores.
+    """
+    (chunk, found, results) = task
+    results = results.get()
+    if cache is None:
+        return results
+    cache.set_many(results)
+    computed = iter(results)
+    output = []
+    for pair in chunk:
+        if pair in found:
+            output.append(pair + (found[pair],))
+        else:
+            output.append(next(computed))
+    return output
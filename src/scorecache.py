@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module keeps the scores of the pairs of terms or of genes in a
+SQLite database, so that the pairs scored again against the same
+release of the ontology are read back instead of being computed.
+
+The scores are stored by version of the ontology (ie: the SHA-1 of the
+OBO file and the options with which it is loaded), measure and pair, the two elements of the pair being sorted
+as the measures are symmetric. The least recently used scores are
+removed when the cache grows over its maximum size.
+"""
+
+import marshal
+import os
+import sqlite3
+import sys
+
+try:
+    from pygolib import get_logger
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    version TEXT NOT NULL, measure TEXT NOT NULL, pair TEXT NOT NULL,
+    value BLOB NOT NULL, used INTEGER NOT NULL,
+    PRIMARY KEY (version, measure, pair));
+CREATE INDEX IF NOT EXISTS scores_used ON scores (used);
+"""
+# Maximum number of parameters given to one query
+_MAX_PARAMS = 500
+
+
+def _element_key(element):
+    """ Return the key of one element of a pair: the identifier of a
+    term, or the sorted identifiers of the terms of a gene.
+    :arg element, an identifier or a list of identifiers.
+    """
+    if isinstance(element, (list, tuple)):
+        return ','.join(sorted(element))
+    return element
+
+
+def pair_key(first, second):
+    """ Return the key under which the score of a pair is stored, the
+    same whatever the order of the two elements.
+    :arg first, the first element of the pair.
+    :arg second, the second element of the pair.
+    """
+    return '\t'.join(sorted((_element_key(first), _element_key(second))))
+
+
+class ScoreCache(object):
+    """ Persistent cache of the scores of one measure on one version of
+    the ontology. Several caches can share the same database.
+    """
+
+    def __init__(self, filename, version, measure, maxsize=1000000):
+        """ Constructor.
+        :arg filename, the name of the SQLite database, created if
+            needed.
+        :arg version, the version of the ontology, for example the
+            SHA-1 of the OBO file as returned by snapshot.file_sha1(),
+            which must include everything changing the scores (ie: the
+            options with which the ontology is loaded).
+        :arg measure, the name of the measure (ie: distance,
+            gs_godistance).
+        :kwarg maxsize, the maximum number of scores kept in the
+            database, all measures and versions included, None for no
+            limit.
+        """
+        self.filename = filename
+        self.version = version
+        self.measure = measure
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.log = get_logger()
+        self.conn = sqlite3.connect(filename)
+        self.conn.executescript(_SCHEMA)
+        # Logical clock of the uses of the scores, for the eviction
+        self.clock = (self.conn.execute(
+            'SELECT MAX(used) FROM scores').fetchone()[0] or 0) + 1
+        # Clock of the last use of the scores read, written by flush()
+        self.used = {}
+        # Number of scores in the database, counted again before removing
+        # some as other connections may have added scores
+        self.size = len(self)
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
+
+    def info(self):
+        """ Return the statistics of the cache as a dictionary, like
+        LRUCache.info(). """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self), 'maxsize': self.maxsize}
+
+    def close(self):
+        """ Write the uses of the scores read and close the database. """
+        self.flush()
+        self.conn.close()
+
+    def flush(self):
+        """ Write the uses of the scores read since the last call, in one
+        transaction. """
+        with self.conn:
+            self.__write_used()
+
+    def __write_used(self):
+        """ Write the uses of the scores read, in the current transaction.
+        """
+        if self.used:
+            self.conn.executemany(
+                'UPDATE scores SET used = ? WHERE version = ? AND '
+                'measure = ? AND pair = ?',
+                [(used, self.version, self.measure, key)
+                 for (key, used) in self.used.iteritems()])
+            self.used = {}
+
+    def __select(self, columns, keys):
+        """ Return the rows of the given pairs of the version and measure
+        of the cache.
+        :arg columns, the columns returned.
+        :arg keys, the list of the keys of the pairs.
+        """
+        rows = []
+        for start in xrange(0, len(keys), _MAX_PARAMS):
+            chunk = keys[start:start + _MAX_PARAMS]
+            rows.extend(self.conn.execute(
+                'SELECT %s FROM scores WHERE version = ? AND measure = ? '
+                'AND pair IN (%s)' % (columns, ','.join('?' * len(chunk))),
+                [self.version, self.measure] + chunk))
+        return rows
+
+    def get_many(self, pairs):
+        """ Return the scores of the pairs found in the cache, as a
+        dictionary by pair. Their use is kept in memory until flush().
+        :arg pairs, an iterable of (first, second) pairs.
+        """
+        keys = {}
+        for pair in pairs:
+            keys.setdefault(pair_key(*pair), []).append(pair)
+        found = self.__select('pair, value', keys.keys())
+        output = {}
+        for (key, value) in found:
+            value = marshal.loads(str(value))
+            for pair in keys[key]:
+                output[pair] = value
+            self.used[key] = self.clock
+        if found:
+            self.clock = self.clock + 1
+        self.hits = self.hits + len(output)
+        self.misses = self.misses + len(keys) - len(found)
+        return output
+
+    def set_many(self, scores):
+        """ Store scores in the cache, then remove the least recently
+        used ones if there are too many. The None scores are not stored.
+        :arg scores, an iterable of (first, second, score) tuples.
+        """
+        rows = dict((pair_key(first, second), (
+            self.version, self.measure, pair_key(first, second),
+            buffer(marshal.dumps(score)), self.clock))
+            for (first, second, score) in scores if score is not None)
+        if not rows:
+            return
+        with self.conn:
+            self.__write_used()
+            known = len(self.__select('pair', rows.keys()))
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)',
+                rows.values())
+            self.clock = self.clock + 1
+            self.size = self.size + len(rows) - known
+            if self.maxsize is not None and self.size > self.maxsize:
+                self.size = len(self)
+                extra = self.size - self.maxsize
+                if extra > 0:
+                    self.log.debug('Removing %s scores from %s' %
+                                   (extra, self.filename))
+                    self.conn.execute(
+                        'DELETE FROM scores WHERE rowid IN (SELECT rowid '
+                        'FROM scores ORDER BY used LIMIT ?)', (extra,))
+                    self.size = self.maxsize
+
+
+class CachedScorer(object):
+    """ Scorer looking up the scores of another scorer in a ScoreCache
+    before computing them, it can be used in place of a
+    GoDistanceCounter, GsesameGO or GsesameGene.
+    The scores computed are written to the cache by batches, flush()
+    writes the last ones and the uses of the scores read.
+    """
+
+    def __init__(self, scorer, cache, batch_size=1000):
+        """ Constructor.
+        :arg scorer, an object with a scores(id1, id2) method.
+        :arg cache, the ScoreCache of the measure of the scorer.
+        :kwarg batch_size, the number of scores written at once.
+        """
+        self.scorer = scorer
+        # The graph of the scorer, in which score_pairs() checks the terms
+        self.goterms = getattr(scorer, 'goterms', None)
+        self.cache = cache
+        self.batch_size = batch_size
+        self.pending = {}
+
+    def scores(self, id1, id2):
+        """ Score one pair, from the cache if possible.
+        :arg id1, the first element of the pair.
+        :arg id2, the second element of the pair.
+        """
+        key = pair_key(id1, id2)
+        if key in self.pending:
+            return self.pending[key][2]
+        found = self.cache.get_many([(id1, id2)])
+        if found:
+            return found[(id1, id2)]
+        score = self.scorer.scores(id1, id2)
+        if score is not None:
+            self.pending[key] = (id1, id2, score)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+        return score
+
+    def flush(self):
+        """ Write the scores computed since the last call to the cache,
+        along with the uses of the scores read from it.
+        """
+        self.cache.set_many(self.pending.values())
+        self.cache.flush()
+        self.pending = {}
@@ -0,0 +1,598 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module keeps an ontology, and the caches built on it, resident in a
+long-running process answering queries over a local HTTP (or Unix
+socket) JSON API, and provides the matching client.
+The requests are handled in threads while the pairs to score are
+gathered into batches by a single thread and scored by a pool of worker
+processes forked once the ontology is loaded.
+"""
+
+import httplib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import Queue
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn, UnixStreamServer
+
+try:
+    from pygolib import get_logger, PyGoLib, PyGoLibException
+    from pygolib.godistance import GoDistanceCounter
+    from pygolib.gsesame import GsesameGO, GsesameGene
+    from pygolib.parallel import _score, iter_chunks
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger, PyGoLib, PyGoLibException
+    from src.godistance import GoDistanceCounter
+    from src.gsesame import GsesameGO, GsesameGene
+    from src.parallel import _score, iter_chunks
+
+# Address used when none is given
+DEFAULT_ADDRESS = 'localhost:8642'
+# Commands scoring pairs, and whether the pairs are pairs of genes
+MEASURES = {
+    'distance': False,
+    'gs_godistance': False,
+    'gs_genedistance': True,
+}
+# Maximum number of pairs scored in one batch
+BATCH_SIZE = 1000
+# Time (in seconds) waited for other requests before scoring a batch
+BATCH_DELAY = 0.002
+
+# Scorers used by the current worker process
+_SCORERS = None
+
+
+def _init_worker(scorers):
+    """ Store the scorers in the worker process.
+    :arg scorers, a dictionary of the scorer of each measure.
+    """
+    global _SCORERS
+    _SCORERS = scorers
+
+
+def _score_batch(batch):
+    """ Score a batch of pairs with the scorers of the worker process.
+    :arg batch, a list of (measure, id1, id2) tuples.
+    """
+    return _score_entries(_SCORERS, batch)
+
+
+def _score_entries(scorers, batch):
+    """ Score a batch of pairs, returning None for the pairs which could
+    not be scored.
+    :arg scorers, a dictionary of the scorer of each measure.
+    :arg batch, a list of (measure, id1, id2) tuples.
+    """
+    results = []
+    for (measure, id1, id2) in batch:
+        try:
+            results.append(_score(scorers[measure], id1, id2,
+                                  skip_missing=True))
+        except Exception, err:
+            get_logger().warning('Could not score %s and %s: %s' % (
+                id1, id2, err))
+            results.append(None)
+    return results
+
+
+def _to_str(value):
+    """ Turn the unicode strings returned by the JSON decoder back into
+    UTF-8 encoded strings, as used in the graph.
+    :arg value, the decoded JSON value.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_to_str(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_to_str(key), _to_str(item))
+                    for (key, item) in value.items())
+    return value
+
+
+def parse_address(address):
+    """ Return the family and the address of a socket from its textual
+    form.
+    :arg address, either 'unix:/path/to/socket' for a Unix socket or
+        '[http://]host:port' for a TCP socket.
+    """
+    if address.startswith('unix:'):
+        return (socket.AF_UNIX, address[len('unix:'):])
+    if address.startswith('http://'):
+        address = address[len('http://'):]
+    address = address.rstrip('/')
+    if ':' in address:
+        (host, port) = address.rsplit(':', 1)
+    else:
+        (host, port) = (address, DEFAULT_ADDRESS.split(':')[1])
+    try:
+        port = int(port)
+    except ValueError:
+        raise PyGoLibException('Invalid server address: %s' % address)
+    return (socket.AF_INET, (host or 'localhost', port))
+
+
+def iter_tree(graph, term, max_paths=None, shared=False):
+    """ Iterate over the ancesters of a term, depth first, and yield the
+    (level, parent) tuples of the lines of its tree, as printed by
+    PyGoLib.get_path(verbose=True): the parent is followed by its name,
+    see PyGoLib.get_label().
+    :arg graph, the graph of ontologies.
+    :arg term, a GO term as stored in the graph.
+    :kwarg max_paths, stop once this number of paths reached the top of
+        the tree, None for no limit.
+    :kwarg shared, expand each ancester once and yield the (level,
+        parent, expanded) tuples of PyGoLib.iter_dag() instead,
+        max_paths is not used then.
+    """
+    if shared:
+        for (level, parent, _, expanded) in PyGoLib(graph).iter_dag(term):
+            yield (level, parent, expanded)
+        return
+    golib = PyGoLib(graph)
+    for (level, parent, _) in golib.iter_tree(term, max_paths=max_paths):
+        yield (level, golib.get_label(parent))
+
+
+class _Job(object):
+    """ The pairs of one request waiting to be scored. """
+
+    def __init__(self, measure, pairs):
+        """ Constructor.
+        :arg measure, the measure used to score the pairs.
+        :arg pairs, the list of (id1, id2) pairs.
+        """
+        self.measure = measure
+        self.pairs = pairs
+        self.results = [None] * len(pairs)
+        self.remaining = len(pairs)
+        self.done = threading.Event()
+
+
+class Batcher(object):
+    """ Gather the pairs sent by concurrent requests into batches and
+    score them, in a pool of worker processes if more than one job is
+    requested.
+    """
+
+    def __init__(self, scorers, jobs=1, batch_size=BATCH_SIZE,
+                 delay=BATCH_DELAY):
+        """ Constructor.
+        :arg scorers, a dictionary of the scorer of each measure.
+        :kwarg jobs, the number of worker processes to use.
+        :kwarg batch_size, the maximum number of pairs in a batch.
+        :kwarg delay, the time (in seconds) waited for other requests
+            before scoring a batch which is not full.
+        """
+        self.scorers = scorers
+        self.batch_size = batch_size
+        self.delay = delay
+        self.log = get_logger()
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+        self.pool = None
+        self.in_flight = threading.Semaphore(max(2 * jobs, 1))
+        # Batches sent to the pool, with the result of their scoring
+        self.sent = Queue.Queue()
+        if jobs > 1:
+            self.pool = multiprocessing.Pool(jobs, _init_worker, (scorers,))
+            collector = threading.Thread(target=self.__collect)
+            collector.daemon = True
+            collector.start()
+        self.thread = threading.Thread(target=self.__run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def score(self, measure, pairs):
+        """ Score the given pairs, waiting for the batches they are part
+        of, and return the list of their scores.
+        :arg measure, the measure used to score the pairs.
+        :arg pairs, the list of (id1, id2) pairs.
+        """
+        job = _Job(measure, pairs)
+        if not pairs:
+            return job.results
+        for start in xrange(0, len(pairs), self.batch_size):
+            self.queue.put((job, start, pairs[start:start + self.batch_size]))
+        # Waiting with a timeout keeps the thread interruptible
+        while not job.done.wait(60):
+            pass
+        return job.results
+
+    def close(self):
+        """ Stop the worker processes. """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+    def __run(self):
+        """ Build the batches from the queue and score them. """
+        while True:
+            parts = [self.queue.get()]
+            size = len(parts[0][2])
+            deadline = time.time() + self.delay
+            while size < self.batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    part = self.queue.get(timeout=timeout)
+                except Queue.Empty:
+                    break
+                parts.append(part)
+                size = size + len(part[2])
+            batch = [(job.measure, id1, id2)
+                     for (job, _, pairs) in parts for (id1, id2) in pairs]
+            self.log.debug('Scoring a batch of %s pairs from %s requests' %
+                           (len(batch), len(parts)))
+            if self.pool is None:
+                self.__dispatch(parts, _score_entries(self.scorers, batch))
+            else:
+                self.in_flight.acquire()
+                self.sent.put((parts, self.pool.apply_async(
+                    _score_batch, (batch,))))
+
+    def __collect(self):
+        """ Wait for the batches scored by the pool and hand their scores
+        back, the pairs of a batch which failed being scored as None. """
+        while True:
+            (parts, result) = self.sent.get()
+            try:
+                results = result.get()
+            except Exception, err:
+                self.log.warning('Could not score a batch of pairs: %s' %
+                                 err)
+                results = [None] * sum(len(pairs) for (_, _, pairs) in parts)
+            self.__dispatch(parts, results)
+
+    def __dispatch(self, parts, results):
+        """ Hand the scores of a batch back to the requests.
+        :arg parts, the list of (job, start, pairs) parts of the batch.
+        :arg results, the list of the scores of the batch.
+        """
+        position = 0
+        for (job, start, pairs) in parts:
+            job.results[start:start + len(pairs)] = \
+                results[position:position + len(pairs)]
+            position = position + len(pairs)
+            with self.lock:
+                job.remaining = job.remaining - len(pairs)
+                if job.remaining == 0:
+                    job.done.set()
+        if self.pool is not None:
+            self.in_flight.release()
+
+
+class GoServer(object):
+    """ Keep an ontology loaded and answer the queries made on it. """
+
+    def __init__(self, graph, jobs=1, batch_size=BATCH_SIZE,
+                 delay=BATCH_DELAY):
+        """ Constructor.
+        :arg graph, the graph of ontologies, preferably compiled.
+        :kwarg jobs, the number of worker processes scoring the pairs.
+        :kwarg batch_size, the maximum number of pairs in a batch.
+        :kwarg delay, the time (in seconds) waited for other requests
+            before scoring a batch which is not full.
+        """
+        self.graph = graph
+        self.log = get_logger()
+        scorers = {
+            'distance': GoDistanceCounter(graph),
+            'gs_godistance': GsesameGO(graph),
+            'gs_genedistance': GsesameGene(graph),
+        }
+        self.batcher = Batcher(scorers, jobs=jobs, batch_size=batch_size,
+                               delay=delay)
+
+    def get_term(self, params):
+        """ Return the GO term given in the parameters of a request.
+        :arg params, the parameters of the request.
+        """
+        termid = params.get('term')
+        if not termid:
+            raise PyGoLibException('No GO term specified')
+        return self.graph[termid]
+
+    def handle(self, command, params):
+        """ Answer a request and return its result as a dictionary.
+        A KeyError is raised for an unknown GO term and a
+        PyGoLibException for an invalid request.
+        :arg command, the command requested (ie: info, distance).
+        :arg params, the dictionary of the parameters of the request.
+        """
+        if command == 'status':
+            return {'terms': len(self.graph)}
+        if command == 'info':
+            term = self.get_term(params)
+            return {'term': [[key, term[key]] for key in term.keys()]}
+        if command == 'tree':
+            term = self.get_term(params)
+            max_paths = params.get('max_paths')
+            if max_paths is not None and not isinstance(max_paths, int):
+                raise PyGoLibException('Invalid max_paths: %s' % max_paths)
+            return {'id': term['id'],
+                    'tree': list(iter_tree(
+                        self.graph, term, max_paths=max_paths,
+                        shared=bool(params.get('shared'))))}
+        if command not in MEASURES:
+            raise PyGoLibException('Unknown command: %s' % command)
+        pairs = params.get('pairs')
+        if not isinstance(pairs, list) or [
+                pair for pair in pairs
+                if not isinstance(pair, list) or len(pair) != 2]:
+            raise PyGoLibException('A list of pairs is expected')
+        if MEASURES[command]:
+            pairs = [(tuple(id1), tuple(id2)) for (id1, id2) in pairs]
+        else:
+            pairs = [(id1, id2) for (id1, id2) in pairs]
+        return {'scores': self.batcher.score(command, pairs)}
+
+    def get_http_server(self, address=DEFAULT_ADDRESS):
+        """ Return the HTTP server listening to the given address and
+        answering the requests with this object.
+        :kwarg address, the address to listen to, see parse_address().
+        """
+        (family, location) = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(location):
+                os.unlink(location)
+            server = _UnixHTTPServer(location, _RequestHandler)
+        else:
+            server = _HTTPServer(location, _RequestHandler)
+        server.app = self
+        return server
+
+    def serve_forever(self, address=DEFAULT_ADDRESS):
+        """ Answer the requests sent to the given address until
+        interrupted.
+        :kwarg address, the address to listen to, see parse_address().
+        """
+        server = self.get_http_server(address)
+        self.log.info('Listening on %s' % address)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self.batcher.close()
+            if isinstance(server, _UnixHTTPServer) and \
+                    os.path.exists(server.server_address):
+                os.unlink(server.server_address)
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    """ HTTP server handling each connection in a thread. """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """ HTTP server over a Unix socket handling each connection in a
+    thread. """
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """ Handle the HTTP requests sent to a GoServer: a POST request on
+    /<command> with the JSON parameters as body. """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """ Answer the status requests. """
+        self.answer(self.path.strip('/'), {})
+
+    def do_POST(self):
+        """ Answer the requests with parameters. """
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = _to_str(json.loads(self.rfile.read(length) or '{}'))
+        except ValueError:
+            return self.send_json(400, {'error': 'Invalid JSON'})
+        if not isinstance(params, dict):
+            return self.send_json(400, {'error': 'A JSON object is '
+                                        'expected'})
+        self.answer(self.path.strip('/'), params)
+
+    def answer(self, command, params):
+        """ Send the result of a command, or its error.
+        :arg command, the command requested.
+        :arg params, the dictionary of the parameters of the request.
+        """
+        try:
+            result = self.server.app.handle(command, params)
+        except KeyError, err:
+            return self.send_json(404, {'error': 'GO term %s was not found '
+                                        'in the ontology' % err})
+        except PyGoLibException, err:
+            return self.send_json(400, {'error': str(err)})
+        self.send_json(200, result)
+
+    def send_json(self, code, result):
+        """ Send a JSON response.
+        :arg code, the HTTP status code.
+        :arg result, the object to send.
+        """
+        body = json.dumps(result)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        """ Unix sockets have no client address. """
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, fmt, *args):
+        """ Log the requests with the logger of the library. """
+        get_logger().debug('%s - %s' % (self.address_string(), fmt % args))
+
+
+class _UnixHTTPConnection(httplib.HTTPConnection):
+    """ HTTP connection over a Unix socket. """
+
+    def __init__(self, path, timeout=None):
+        """ Constructor.
+        :arg path, the path of the Unix socket.
+        :kwarg timeout, the timeout (in seconds) of the socket.
+        """
+        httplib.HTTPConnection.__init__(self, 'localhost')
+        self.socket_path = path
+        self.socket_timeout = timeout
+
+    def connect(self):
+        """ Connect to the Unix socket. """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.socket_timeout is not None:
+            self.sock.settimeout(self.socket_timeout)
+        self.sock.connect(self.socket_path)
+
+
+class GoClient(object):
+    """ Client of a GoServer, sending the requests over one persistent
+    connection. """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        """ Constructor.
+        :kwarg address, the address of the server, see parse_address().
+        :kwarg timeout, the timeout (in seconds) of the connection.
+        """
+        (family, location) = parse_address(address)
+        if family == socket.AF_UNIX:
+            self.connection = _UnixHTTPConnection(location, timeout)
+        else:
+            self.connection = httplib.HTTPConnection(
+                location[0], location[1], timeout=timeout)
+
+    def request(self, command, **params):
+        """ Send a request to the server and return its result.
+        A KeyError is raised for an unknown GO term and a
+        PyGoLibException for any other error.
+        :arg command, the command requested (ie: info, distance).
+        :kwarg params, the parameters of the command.
+        """
+        body = json.dumps(params)
+        try:
+            self.connection.request(
+                'POST', '/%s' % command, body,
+                {'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            result = _to_str(json.loads(response.read()))
+        except (socket.error, httplib.HTTPException), err:
+            self.connection.close()
+            raise PyGoLibException('Could not query the server: %s' % err)
+        if response.status == 404:
+            raise KeyError(params.get('term'))
+        if response.status != 200:
+            raise PyGoLibException(result.get('error'))
+        return result
+
+    def get_term(self, termid):
+        """ Return the GO term with the given identifier as a list of
+        (key, value) tuples.
+        :arg termid, identifier of a GO term.
+        """
+        return [tuple(item) for item in
+                self.request('info', term=termid)['term']]
+
+    def get_tree(self, termid, max_paths=None, shared=False):
+        """ Return the identifier of a GO term and the lines of its tree,
+        see iter_tree().
+        :arg termid, identifier of a GO term.
+        :kwarg max_paths, stop once this number of paths reached the top
+            of the tree, None for no limit.
+        :kwarg shared, expand each ancester once, see iter_tree().
+        """
+        result = self.request('tree', term=termid, max_paths=max_paths,
+                              shared=shared)
+        return (result['id'], [tuple(line) for line in result['tree']])
+
+    def get_scorer(self, measure):
+        """ Return a scorer of the server for the given measure.
+        :arg measure, the measure to use: distance, gs_godistance or
+            gs_genedistance.
+        """
+        return RemoteScorer(self, measure)
+
+
+class RemoteScorer(object):
+    """ Scorer computing the scores on a GoServer, it can be used in
+    place of a GoDistanceCounter, GsesameGO or GsesameGene. """
+
+    def __init__(self, client, measure):
+        """ Constructor.
+        :arg client, the GoClient connected to the server.
+        :arg measure, the measure to use: distance, gs_godistance or
+            gs_genedistance.
+        """
+        self.client = client
+        self.measure = measure
+
+    def __convert(self, score):
+        """ JSON turns the tuples of the scores into lists. """
+        if isinstance(score, list):
+            return tuple(score)
+        return score
+
+    def scores(self, id1, id2):
+        """ Score one pair.
+        :arg id1, the first element of the pair.
+        :arg id2, the second element of the pair.
+        """
+        result = self.client.request(self.measure, pairs=[[id1, id2]])
+        return self.__convert(result['scores'][0])
+
+    def score_pairs(self, pairs, chunksize=BATCH_SIZE):
+        """ Score pairs, sending them by chunks, and yield the
+        (id1, id2, score) tuples in the order of the pairs. The pairs
+        which could not be scored get None as score.
+        :arg pairs, an iterable of (id1, id2) pairs.
+        :kwarg chunksize, the number of pairs sent in one request.
+        """
+        for chunk in iter_chunks(pairs, chunksize):
+            result = self.client.request(
+                self.measure, pairs=[list(pair) for pair in chunk])
+            for ((id1, id2), score) in zip(chunk, result['scores']):
+                yield (id1, id2, self.__convert(score))
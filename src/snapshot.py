@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module keeps binary snapshots of the parsed ontologies on disk so
+that loading the same OBO file again does not require to parse it.
+
+A snapshot is keyed by the size, the modification time and the SHA-1 of
+the content of the OBO file; it is rebuilt automatically when the file
+changes. It contains the graph and, if requested, the arrays of the
+compiled graph, laid out in sections. The file is read at once and
+each section is decoded in full, from a buffer on the data read.
+"""
+
+import hashlib
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+try:
+    from pygolib import get_logger, Graph, PyGoLib
+    from pygolib.compiled import CompiledGraph
+    from pygolib.oboio import OboIO, Term
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger, Graph, PyGoLib
+    from src.compiled import CompiledGraph
+    from src.oboio import OboIO, Term
+
+MAGIC = 'PYGOSNAP'
+VERSION = 3
+# magic, version, size, mtime, sha1, number of sections
+_HEADER = struct.Struct('<8sIqd20sI')
+_MTIME_OFFSET = struct.calcsize('<8sIq')
+# name, typecode, item size, offset, length
+_SECTION = struct.Struct('<24scBqq')
+# Arrays of the compiled graph stored in the snapshot
+_ARRAYS = ('parent_ptr', 'parent_idx', 'parent_rel',
+           'child_ptr', 'child_idx', 'child_rel', 'rank')
+
+LOG = get_logger()
+
+
+def get_cache_dir():
+    """ Return the default folder in which the snapshots are stored. """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pygolib')
+
+
+def file_sha1(filename):
+    """ Return the SHA-1 digest of the content of a file, reading it by
+    blocks.
+    :arg filename, the name of the file to hash.
+    """
+    sha1 = hashlib.sha1()
+    stream = open(filename, 'rb')
+    try:
+        for block in iter(lambda: stream.read(1 << 20), ''):
+            sha1.update(block)
+    finally:
+        stream.close()
+    return sha1.digest()
+
+
+def get_snapshot_name(filename, cache_dir=None, no_check_unique=True,
+                      add_root=False, compiled=False):
+    """ Return the name of the snapshot file of an ontology.
+    :arg filename, the name of the OBO file.
+    :kwarg cache_dir, the folder in which the snapshots are stored.
+    :kwarg no_check_unique, the option used to load the ontology.
+    :kwarg add_root, whether the root element is added to the ontology.
+    :kwarg compiled, whether the snapshot contains the compiled graph.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    key = '%s|%d|%d|%d' % (os.path.abspath(filename),
+                            bool(no_check_unique), bool(add_root),
+                            bool(compiled))
+    return os.path.join(
+        cache_dir, '%s.snap' % hashlib.sha1(key).hexdigest()[:20])
+
+
+def _get_sections(graph):
+    """ Return the list of (name, typecode, data) to store for a graph.
+    The terms are stored once each, alt_id only point to their term,
+    the Term being stored as the tuple returned by Term.dump().
+    :arg graph, a graph of ontologies, compiled or not.
+    """
+    terms = []
+    positions = {}
+    keys = {}
+    for key in graph:
+        term = graph[key]
+        if id(term) not in positions:
+            positions[id(term)] = len(terms)
+            if isinstance(term, Term):
+                terms.append(term.dump())
+            else:
+                terms.append(term)
+        keys[key] = positions[id(term)]
+    sections = [('terms', 'm', marshal.dumps(terms, 2)),
+                ('keys', 'm', marshal.dumps(keys, 2))]
+    if getattr(graph, 'is_compiled', False):
+        sections.append(('ids', 'm', marshal.dumps(graph.ids, 2)))
+        for name in _ARRAYS:
+            if getattr(graph, name) is not None:
+                sections.append((name, getattr(graph, name).typecode,
+                                 getattr(graph, name).tostring()))
+        for details in graph.closure:
+            (ptr, idx) = graph.closure[details]
+            sections.append(('closure%d_ptr' % details, ptr.typecode,
+                             ptr.tostring()))
+            sections.append(('closure%d_idx' % details, idx.typecode,
+                             idx.tostring()))
+    return sections
+
+
+def write_snapshot(snapshot, filename, graph, sha1=None, stat=None):
+    """ Write the snapshot of a graph to the disk.
+    The file is written under a temporary name and then renamed so that
+    readers never see a partial snapshot.
+    :arg snapshot, the name of the snapshot file.
+    :arg filename, the name of the OBO file the graph comes from.
+    :arg graph, the graph of ontologies, compiled or not.
+    :kwarg sha1, the SHA-1 digest of the OBO file when it was read.
+    :kwarg stat, the result of os.stat on the OBO file when it was read.
+    """
+    if stat is None:
+        stat = os.stat(filename)
+    if sha1 is None:
+        sha1 = file_sha1(filename)
+    sections = _get_sections(graph)
+
+    folder = os.path.dirname(snapshot)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    (fd, tmpname) = tempfile.mkstemp(dir=folder or '.', suffix='.tmp')
+    stream = os.fdopen(fd, 'wb')
+    try:
+        stream.write(_HEADER.pack(MAGIC, VERSION, stat.st_size,
+                                  stat.st_mtime, sha1, len(sections)))
+        offset = _HEADER.size + _SECTION.size * len(sections)
+        for (name, typecode, data) in sections:
+            itemsize = 1
+            if typecode != 'm':
+                itemsize = array(typecode).itemsize
+            stream.write(_SECTION.pack(name, typecode, itemsize, offset,
+                                       len(data)))
+            offset = offset + len(data)
+        for (name, typecode, data) in sections:
+            stream.write(data)
+    finally:
+        stream.close()
+    os.chmod(tmpname, 0644)
+    os.rename(tmpname, snapshot)
+    LOG.debug('Snapshot of %s written in %s' % (filename, snapshot))
+
+
+def _update_mtime(snapshot, mtime):
+    """ Update the modification time of the OBO file stored in the
+    header of a snapshot.
+    :arg snapshot, the name of the snapshot file.
+    :arg mtime, the new modification time.
+    """
+    try:
+        stream = open(snapshot, 'r+b')
+        try:
+            stream.seek(_MTIME_OFFSET)
+            stream.write(struct.pack('<d', mtime))
+        finally:
+            stream.close()
+    except (IOError, OSError), err:
+        LOG.debug('Could not update the snapshot %s: %s' % (snapshot, err))
+
+
+def read_snapshot(snapshot, filename=None):
+    """ Read a snapshot from the disk and return the graph it contains,
+    or None if the snapshot does not exist, is unreadable or if it does
+    not match the current content of the OBO file.
+    :arg snapshot, the name of the snapshot file.
+    :kwarg filename, the name of the OBO file the snapshot must match.
+    """
+    if not os.path.exists(snapshot):
+        return None
+    stream = open(snapshot, 'rb')
+    try:
+        header = stream.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        (magic, version, size, mtime, sha1, nsections) = _HEADER.unpack(
+            header)
+        if magic != MAGIC or version != VERSION:
+            return None
+        if filename is not None:
+            stat = os.stat(filename)
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                if stat.st_size != size or file_sha1(filename) != sha1:
+                    LOG.info('Snapshot %s is outdated' % snapshot)
+                    return None
+                # Same content, only remember the new modification time
+                _update_mtime(snapshot, stat.st_mtime)
+        # The offsets of the sections are from the start of the file
+        stream.seek(0)
+        data = stream.read()
+    finally:
+        stream.close()
+    sections = {}
+    try:
+        for cnt in xrange(nsections):
+            (name, typecode, itemsize, offset, length) = \
+                _SECTION.unpack_from(data, _HEADER.size + cnt * _SECTION.size)
+            if offset + length > len(data):
+                return None
+            chunk = buffer(data, offset, length)
+            name = name.rstrip('\0')
+            if typecode == 'm':
+                sections[name] = marshal.loads(chunk)
+            else:
+                values = array(typecode)
+                if values.itemsize != itemsize:
+                    return None
+                values.fromstring(chunk)
+                sections[name] = values
+    except (struct.error, EOFError, ValueError, TypeError):
+        LOG.info('Snapshot %s is corrupted' % snapshot)
+        return None
+
+    terms = [Term.restore(term) if isinstance(term, tuple) else term
+             for term in sections['terms']]
+    keys = sections['keys']
+    graph = Graph((key, terms[keys[key]]) for key in keys)
+    if 'ids' not in sections:
+        return graph
+    closure = {}
+    for details in (False, True):
+        if 'closure%d_ptr' % details in sections:
+            closure[details] = (sections['closure%d_ptr' % details],
+                                sections['closure%d_idx' % details])
+    arrays = dict((name, sections.get(name)) for name in _ARRAYS)
+    return CompiledGraph.restore(graph, sections['ids'], arrays, closure)
+
+
+def load_ontology(filename, cache_dir=None, no_check_unique=True,
+                  add_root=False, compiled=False, jobs=1):
+    """ Load the graph of an ontology, from its snapshot if there is an
+    up to date one, from the OBO file otherwise, in which case the
+    snapshot is (re)built.
+    :arg filename, the name of the OBO file.
+    :kwarg cache_dir, the folder in which the snapshots are stored.
+    :kwarg no_check_unique, a boolean to specify wether we should
+        check that IDs are unique in the ontology.
+    :kwarg add_root, add a root element linking the three main
+        categories of the gene ontology.
+    :kwarg compiled, return the compiled graph, with its ancestor
+        closures, instead of the dictionary.
+    :kwarg jobs, the number of processes reading the OBO file when
+        there is no snapshot, see OboIO.get_graph().
+    """
+    snapshot = get_snapshot_name(
+        filename, cache_dir=cache_dir, no_check_unique=no_check_unique,
+        add_root=add_root, compiled=compiled)
+    graph = read_snapshot(snapshot, filename)
+    if graph is not None:
+        LOG.info('%s GO terms loaded from %s' % (len(graph), snapshot))
+        return graph
+
+    stat = os.stat(filename)
+    sha1 = file_sha1(filename)
+    obio = OboIO()
+    graph = obio.get_graph(filename, no_check_unique=no_check_unique,
+                           jobs=jobs)
+    golib = PyGoLib(graph)
+    if add_root:
+        graph = golib.fix_go_graph()
+    if compiled:
+        graph = golib.compile()
+        graph.build_closure(details=False)
+        graph.build_closure(details=True)
+    try:
+        write_snapshot(snapshot, filename, graph, sha1=sha1, stat=stat)
+    except (IOError, OSError), err:
+        LOG.warning('Could not write the snapshot %s: %s' % (snapshot, err))
+    return graph
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012-2013, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+This module stores the ontologies in SQLite databases, so that several
+processes can query the same ontology without each of them keeping its
+own copy of the graph in memory: the terms are read from the database
+when they are needed, and the pages of the database are shared through
+the page cache of the system.
+
+The database is built once from the OBO file. It holds the terms, their
+alt_id, the edges between them and the ancestor closures of the
+compiled graph, and is built again when the OBO file changes.
+"""
+
+import hashlib
+import marshal
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from array import array
+
+try:
+    from pygolib import get_logger, LRUCache, PyGoLib, PyGoLibException
+    from pygolib.oboio import OboIO, Term
+    from pygolib.snapshot import get_cache_dir, file_sha1
+except ImportError:
+    sys.path.insert(0, os.path.abspath('../'))
+    from src import get_logger, LRUCache, PyGoLib, PyGoLibException
+    from src.oboio import OboIO, Term
+    from src.snapshot import get_cache_dir, file_sha1
+
+VERSION = 1
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE terms (idx INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,
+                    name TEXT, namespace TEXT, is_obsolete TEXT,
+                    state BLOB NOT NULL);
+CREATE TABLE alt_ids (alt_id TEXT PRIMARY KEY, idx INTEGER NOT NULL);
+CREATE TABLE edges (child INTEGER NOT NULL, parent INTEGER NOT NULL,
+                    rel INTEGER NOT NULL);
+CREATE INDEX edges_child ON edges (child, rel);
+CREATE INDEX edges_parent ON edges (parent, rel);
+CREATE TABLE closure (idx INTEGER NOT NULL, details INTEGER NOT NULL,
+                      ancesters BLOB NOT NULL, PRIMARY KEY (idx, details));
+"""
+_DESCENDANTS = """
+WITH RECURSIVE descendants(idx) AS (
+    SELECT child FROM edges WHERE parent = ? AND rel <= ?
+    UNION
+    SELECT edges.child FROM edges JOIN descendants
+        ON edges.parent = descendants.idx WHERE edges.rel <= ?)
+SELECT terms.id FROM descendants JOIN terms ON terms.idx = descendants.idx
+"""
+# Maximum number of parameters given to one query
+_MAX_PARAMS = 500
+
+LOG = get_logger()
+
+
+def get_store_name(filename, cache_dir=None, no_check_unique=True,
+                   add_root=False):
+    """ Return the name of the SQLite database of an ontology.
+    :arg filename, the name of the OBO file.
+    :kwarg cache_dir, the folder in which the databases are stored.
+    :kwarg no_check_unique, the option used to load the ontology.
+    :kwarg add_root, whether the root element is added to the ontology.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    key = '%s|%d|%d' % (os.path.abspath(filename), bool(no_check_unique),
+                        bool(add_root))
+    return os.path.join(
+        cache_dir, '%s.sqlite' % hashlib.sha1(key).hexdigest()[:20])
+
+
+def import_ontology(filename, database, no_check_unique=True,
+                    add_root=False, jobs=1):
+    """ Import an OBO file in a SQLite database, replacing the existing
+    one if any. The database is written to a temporary file renamed at
+    the end, so the readers never see a partial database.
+    :arg filename, the name of the OBO file.
+    :arg database, the name of the database to write.
+    :kwarg no_check_unique, a boolean to specify wether we should
+        check that IDs are unique in the ontology.
+    :kwarg add_root, add a root element linking the three main
+        categories of the gene ontology.
+    :kwarg jobs, the number of processes reading the OBO file.
+    """
+    stat = os.stat(filename)
+    sha1 = file_sha1(filename)
+    graph = OboIO().get_graph(filename, no_check_unique=no_check_unique,
+                              jobs=jobs)
+    golib = PyGoLib(graph)
+    if add_root:
+        graph = golib.fix_go_graph()
+    compiled = golib.compile()
+
+    folder = os.path.dirname(os.path.abspath(database))
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    (handle, tmpname) = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    os.close(handle)
+    try:
+        conn = sqlite3.connect(tmpname)
+        try:
+            conn.executescript(_SCHEMA)
+            conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+                ('version', VERSION),
+                ('source', os.path.abspath(filename)),
+                ('size', stat.st_size),
+                ('mtime', stat.st_mtime),
+                ('sha1', sha1.encode('hex'))])
+            conn.executemany(
+                'INSERT INTO terms VALUES (?, ?, ?, ?, ?, ?)',
+                _iter_terms(compiled))
+            conn.executemany(
+                'INSERT INTO alt_ids VALUES (?, ?)',
+                ((key, compiled.index[key]) for key in graph
+                 if key != graph[key]['id']))
+            conn.executemany(
+                'INSERT INTO edges VALUES (?, ?, ?)',
+                ((idx, parent, rel) for idx in xrange(len(compiled.ids))
+                 for (parent, rel) in compiled.parents(idx, details=True)))
+            for details in (False, True):
+                (ptr, values) = compiled.build_closure(details=details)
+                conn.executemany(
+                    'INSERT INTO closure VALUES (?, ?, ?)',
+                    ((idx, details,
+                      buffer(values[ptr[idx]:ptr[idx + 1]].tostring()))
+                     for idx in xrange(len(compiled.ids))))
+            conn.commit()
+        finally:
+            conn.close()
+        os.rename(tmpname, database)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+    LOG.info('%s GO terms imported in %s' % (len(compiled.ids), database))
+    return database
+
+
+def _iter_terms(compiled):
+    """ Yield the rows of the terms table of a compiled graph.
+    :arg compiled, the compiled graph.
+    """
+    for (idx, termid) in enumerate(compiled.ids):
+        term = compiled[termid]
+        if not isinstance(term, Term):
+            term = Term(term)
+        yield (idx, termid, term.name, term.namespace, term.is_obsolete,
+               buffer(marshal.dumps(term.dump())))
+
+
+def _is_up_to_date(database, filename):
+    """ Return whether a database exists and matches the current content
+    of its OBO file, remembering the new modification time of the file
+    if only it changed.
+    :arg database, the name of the database.
+    :arg filename, the name of the OBO file.
+    """
+    if not os.path.exists(database):
+        return False
+    try:
+        conn = sqlite3.connect(database)
+        try:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            if meta.get('version') != VERSION:
+                return False
+            stat = os.stat(filename)
+            if (stat.st_size, stat.st_mtime) == (meta['size'],
+                                                 meta['mtime']):
+                return True
+            if stat.st_size != meta['size'] or \
+                    file_sha1(filename).encode('hex') != meta['sha1']:
+                LOG.info('Database %s is outdated' % database)
+                return False
+            # Same content, only remember the new modification time
+            with conn:
+                conn.execute('UPDATE meta SET value = ? WHERE key = ?',
+                             (stat.st_mtime, 'mtime'))
+            return True
+        finally:
+            conn.close()
+    except sqlite3.Error, err:
+        LOG.debug('Could not read the database %s: %s' % (database, err))
+        return False
+
+
+def load_store(filename, cache_dir=None, no_check_unique=True,
+               add_root=False, jobs=1, cache_size=10000):
+    """ Return the SqliteGraph of an ontology, importing the OBO file in
+    its database first if there is no up to date one.
+    :arg filename, the name of the OBO file.
+    :kwarg cache_dir, the folder in which the databases are stored.
+    :kwarg no_check_unique, a boolean to specify wether we should
+        check that IDs are unique in the ontology.
+    :kwarg add_root, add a root element linking the three main
+        categories of the gene ontology.
+    :kwarg jobs, the number of processes reading the OBO file.
+    :kwarg cache_size, the maximum number of terms kept in memory.
+    """
+    database = get_store_name(
+        filename, cache_dir=cache_dir, no_check_unique=no_check_unique,
+        add_root=add_root)
+    if not _is_up_to_date(database, filename):
+        import_ontology(filename, database, no_check_unique=no_check_unique,
+                        add_root=add_root, jobs=jobs)
+    return SqliteGraph(database, cache_size=cache_size)
+
+
+class SqliteGraph(object):
+    """ Read-only view of the graph of an ontology stored in a SQLite
+    database by import_ontology().
+    It behaves like the dictionary returned by OboIO.get_graph(), so it
+    can be given to PyGoLib, but the terms are only read from the
+    database when they are accessed, and the most recently used ones are
+    kept in memory. The scorers (GoDistanceCounter, GsesameGO) accept it
+    too but browse the paths of the terms one query at a time, they are
+    much faster on the compiled graph.
+    The ancestors and the descendants of the terms are queried from the
+    database, see get_ancesters() and get_descendants().
+    Each process and thread uses its own connection to the database.
+    """
+
+    is_compiled = False
+    is_store = True
+
+    def __init__(self, database, cache_size=10000):
+        """ Constructor.
+        :arg database, the name of the SQLite database.
+        :kwarg cache_size, the maximum number of terms kept in memory,
+            None for no limit.
+        """
+        self.database = database
+        self.cache_size = cache_size
+        self.cache = LRUCache(cache_size)
+        self.log = get_logger()
+        self.__local = threading.local()
+        try:
+            row = self.__query(
+                'SELECT value FROM meta WHERE key = ?', ('version',))
+        except sqlite3.Error, err:
+            raise PyGoLibException('%s is not a valid ontology database: '
+                                   '%s' % (database, err))
+        if row != [(VERSION,)]:
+            raise PyGoLibException('%s is not a valid ontology database'
+                                   % database)
+
+    def __getstate__(self):
+        return (self.database, self.cache_size)
+
+    def __setstate__(self, state):
+        self.__init__(state[0], cache_size=state[1])
+
+    def __get_connection(self):
+        """ Return the connection of the current process and thread to
+        the database, opening it if needed.
+        """
+        local = self.__local
+        if getattr(local, 'pid', None) != os.getpid():
+            # A connection must not be used across a fork
+            local.conn = sqlite3.connect(self.database)
+            local.conn.execute('PRAGMA query_only = ON')
+            local.pid = os.getpid()
+        return local.conn
+
+    def __query(self, query, params=()):
+        """ Run a query on the database and return all its rows.
+        :arg query, the SQL query.
+        :kwarg params, the parameters of the query.
+        """
+        return self.__get_connection().execute(query, params).fetchall()
+
+    def close(self):
+        """ Close the connection of the current thread to the database.
+        """
+        local = self.__local
+        if getattr(local, 'pid', None) == os.getpid():
+            local.conn.close()
+        local.pid = None
+
+    def __getitem__(self, key):
+        term = self.cache.get(key)
+        if term is not None:
+            return term
+        rows = self.__query('SELECT state FROM terms WHERE id = ?', (key,))
+        if not rows:
+            rows = self.__query(
+                'SELECT terms.state FROM alt_ids JOIN terms '
+                'ON terms.idx = alt_ids.idx WHERE alt_ids.alt_id = ?',
+                (key,))
+        if not rows:
+            raise KeyError(key)
+        term = Term.restore(marshal.loads(str(rows[0][0])))
+        # A term and its alt_id share the same object, as in the graph
+        term = self.cache.get(term.id) or term
+        self.cache.set(term.id, term)
+        self.cache.set(key, term)
+        return term
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for (key,) in self.__get_connection().execute(
+                'SELECT id FROM terms ORDER BY idx'):
+            yield key
+        for (key,) in self.__get_connection().execute(
+                'SELECT alt_id FROM alt_ids ORDER BY alt_id'):
+            yield key
+
+    def __len__(self):
+        return self.__query('SELECT (SELECT COUNT(*) FROM terms) + '
+                            '(SELECT COUNT(*) FROM alt_ids)')[0][0]
+
+    def get(self, key, default=None):
+        """ Return the term of the given identifier, or default if it is
+        not in the ontology.
+        :arg key, the identifier of a term or one of its alt_id.
+        :kwarg default, the value to return if the term is missing.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """ Return the list of the identifiers of the terms and of their
+        alt_id. """
+        return list(self)
+
+    def itervalues(self):
+        """ Iterate over the terms, once for their identifier and once
+        for each of their alt_id, like the values of the graph.
+        The terms are read from the database without being cached.
+        """
+        for (state,) in self.__get_connection().execute(
+                'SELECT state FROM terms ORDER BY idx'):
+            yield Term.restore(marshal.loads(str(state)))
+        for (state,) in self.__get_connection().execute(
+                'SELECT terms.state FROM alt_ids JOIN terms '
+                'ON terms.idx = alt_ids.idx ORDER BY alt_ids.alt_id'):
+            yield Term.restore(marshal.loads(str(state)))
+
+    def values(self):
+        """ Return the list of the terms, see itervalues(). """
+        return list(self.itervalues())
+
+    def items(self):
+        """ Return the list of the (identifier, term) of the graph. """
+        return zip(self.keys(), self.values())
+
+    def __get_ids(self, indexes):
+        """ Return the set of the identifiers of terms given by their
+        integer identifier.
+        :arg indexes, a sequence of integer identifiers.
+        """
+        output = set()
+        for start in xrange(0, len(indexes), _MAX_PARAMS):
+            chunk = list(indexes[start:start + _MAX_PARAMS])
+            output.update(key for (key,) in self.__query(
+                'SELECT id FROM terms WHERE idx IN (%s)' %
+                ','.join('?' * len(chunk)), chunk))
+        return output
+
+    def get_ancesters(self, termid, details=False):
+        """ Return the set of identifiers of all the ancestors of a term,
+        the term included, from the ancestor closure of the database.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        rows = self.__query(
+            'SELECT ancesters FROM closure JOIN terms '
+            'ON terms.idx = closure.idx '
+            'WHERE terms.id = ? AND closure.details = ?',
+            (self[termid].id, int(bool(details))))
+        ancesters = array('i')
+        ancesters.fromstring(str(rows[0][0]))
+        return self.__get_ids(ancesters)
+
+    def get_descendants(self, termid, details=False):
+        """ Return the set of identifiers of all the terms having the
+        given term as ancestor, queried through the edges of the
+        database.
+        :arg termid, identifier of a GO term (ie: GO:0043229, or whatever
+            identifier is in your ontology).
+        :kwarg details, if True the part_of relations are followed as
+            well as the is_a ones.
+        """
+        idx = self.__query('SELECT idx FROM terms WHERE id = ?',
+                           (self[termid].id,))[0][0]
+        rel = int(bool(details))
+        return set(key for (key,) in self.__query(
+            _DESCENDANTS, (idx, rel, rel)))
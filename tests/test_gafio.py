@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the GafIO class and the scoring of the genes of a GAF
+file.
+"""
+
+import os
+import sys
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.abspath('../'))
+from src import PyGoLib
+from src.gafio import GafIO
+from src.gsesame import GsesameGene
+from src.oboio import OboIO
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test3.obo' % folder
+
+GAF = """!gaf-version: 2.0
+UniProtKB\tP1\tGENE1\t\t0043229\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP1\tGENE1\t\t0044424\tREF\tIEA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP2\tGENE2\t\t0043231\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP2\tGENE2\t\t0043227\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP2\tGENE2\tNOT\t0005623\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP3\tGENE3\t\t0005623\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP3\tGENE3\t\t9999999\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP4\tGENE4\t\t0044464\tREF\tIDA\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+UniProtKB\tP4\tGENE4\t\t0043229\tREF\tTAS\t\tC\t\t\tprotein\ttaxon:1\t20120101\tDB
+"""
+
+
+class GafIOTests(unittest.TestCase):
+    """ GafIO tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def test_iter_annotations(self):
+        """ Test the iter_annotations function. """
+        gafio = GafIO()
+        annotations = list(gafio.iter_annotations(StringIO(GAF)))
+        self.assertEqual(8, len(annotations))
+        self.assertEqual(('UniProtKB:P1', '0043229'), annotations[0])
+        annotations = list(gafio.iter_annotations(
+            StringIO(GAF), key='symbol', exclude_evidence=['IEA']))
+        self.assertEqual(7, len(annotations))
+        self.assertEqual(('GENE2', '0043231'), annotations[1])
+
+    def test_get_gene_index(self):
+        """ Test the get_gene_index function. """
+        terms = OboIO().get_graph(GOFILE)
+        index = GafIO(terms).get_gene_index(StringIO(GAF), key='symbol')
+        self.assertEqual(['GENE1', 'GENE2', 'GENE3', 'GENE4'], list(index))
+        self.assertTrue('GENE3' in index)
+        self.assertEqual(['0043229', '0044424'],
+                         sorted(index.get_terms('GENE1')))
+        # Terms missing in the ontology are skipped
+        self.assertEqual(['0005623'], index.get_terms('GENE3'))
+        self.assertEqual(6, len(index.terms))
+        self.assertRaises(ValueError, index.add_gene, 'GENE1', [0])
+
+    def test_all_scores(self):
+        """ Test the scores_against_all and all_scores functions. """
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        terms = OboIO().get_graph(GOFILE)
+        index = GafIO(terms).get_gene_index(StringIO(GAF), key='symbol')
+        for graph in [terms, PyGoLib(terms).compile()]:
+            sesamegene = GsesameGene(graph)
+            scores = list(sesamegene.scores_against_all('GENE1', index))
+            self.assertEqual(['GENE2', 'GENE3', 'GENE4'],
+                             [gene for (gene, _) in scores])
+            self.assertAlmostEqual(0.6743128041470686, scores[0][1])
+            # Genes may be given by their GO terms
+            self.assertEqual(
+                scores, list(sesamegene.scores_against_all(
+                    ['0043229', '0044424'], index))[1:])
+
+            scores = list(sesamegene.all_scores(index, block_size=2))
+            self.assertEqual(6, len(scores))
+            for (gene1, gene2, score) in scores:
+                self.assertAlmostEqual(
+                    sesamegene.scores(index.get_terms(gene1),
+                                      index.get_terms(gene2)),
+                    score)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(GafIOTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
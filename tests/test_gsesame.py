@@ -101,6 +101,108 @@ class GsesameGOTests(unittest.TestCase):
         output = 0.7727272727272726
         self.assertEqual(output, gsgo.scores('0043229','0043231'))
 
+    def test_scores_compiled(self):
+        """ Test the scores function on a compiled graph. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE2)
+        gsgo = GsesameGO(PyGoLib(terms).compile())
+        self.assertAlmostEqual(5.5952, gsgo.semantic_value('0043231'))
+        self.assertEqual(
+            sorted(GsesameGO(terms).semantic_values('0043231')),
+            sorted(gsgo.semantic_values('0043231')))
+        output = 0.8259052924791086
+        self.assertAlmostEqual(output, gsgo.scores('0043229','0043231'))
+
+    def test_cache(self):
+        """ Test the cache of the semantic values. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE2)
+        graph = PyGoLib(terms).compile()
+        gsgo = GsesameGO(graph, cache_size=2)
+        gsgo.scores('0043229', '0043231')
+        self.assertEqual((0, 2), (gsgo.cache.hits, gsgo.cache.misses))
+        # The cache is shared by the instances working on the same graph
+        gsgo2 = GsesameGO(graph, cache_size=2)
+        self.assertTrue(gsgo2.cache is gsgo.cache)
+        gsgo2.scores('0043229', '0043231')
+        self.assertEqual((2, 2), (gsgo.cache.hits, gsgo.cache.misses))
+        # Least recently used entries are evicted
+        gsgo2.semantic_value('0005575')
+        self.assertEqual(2, len(gsgo.cache))
+        self.assertFalse(graph.term_index('0043229') in gsgo.cache)
+        self.assertTrue(graph.term_index('0043231') in gsgo.cache)
+        # The shared cache is enlarged but never shrunk
+        GsesameGO(graph, cache_size=3)
+        self.assertEqual(3, gsgo.cache.maxsize)
+        GsesameGO(graph, cache_size=1)
+        self.assertEqual(3, gsgo.cache.maxsize)
+        self.assertEqual(2, len(gsgo.cache))
+        GsesameGO(graph, cache_size=None)
+        GsesameGO(graph)
+        self.assertEqual(None, gsgo.cache.maxsize)
+
+        # The cache is shared on the graph read from the OBO file too
+        gsgo = GsesameGO(terms)
+        gsgo.scores('0043229', '0043231')
+        self.assertEqual((0, 2), (gsgo.cache.hits, gsgo.cache.misses))
+        gsgene = GsesameGene(terms)
+        self.assertTrue(gsgene.sesamego.cache is gsgo.cache)
+        gsgene.scores(['0043229'], ['0043231'])
+        self.assertEqual(2, gsgo.cache.misses)
+        self.assertFalse(GsesameGO(terms, max_paths=1).cache is gsgo.cache)
+        # but not on another graph
+        other = OboIO().get_graph(GOFILE2)
+        self.assertFalse(GsesameGO(other).cache is gsgo.cache)
+
+    def test_top_k(self):
+        """ Test the top_k function against the scores of all the terms.
+        """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE2)
+        ids = sorted(set(term['id'] for term in terms.values()))
+        for graph in (terms, PyGoLib(terms).compile()):
+            gsgo = GsesameGO(graph)
+            for termid in ids:
+                expected = sorted(
+                    (-gsgo.scores(termid, other), other) for other in ids
+                    if other != termid)
+                for k in (1, 3, 20):
+                    output = gsgo.top_k(termid, k)
+                    self.assertEqual([other for (_, other) in expected[:k]],
+                                     [other for (other, _) in output])
+                    for ((score, _), (_, value)) in zip(expected, output):
+                        self.assertAlmostEqual(-score, value)
+            [(other, score)] = gsgo.top_k('0043231', 1)
+            self.assertEqual('0043229', other)
+            self.assertAlmostEqual(0.8259052924791086, score)
+
+        # Only the terms of the namespace are returned
+        for termid in ('0043229', '0044424', '0005622'):
+            terms[termid]['namespace'] = 'cellular_component'
+        gsgo = GsesameGO(terms)
+        self.assertEqual(['0043229', '0044424', '0005622'],
+                         [other for (other, _) in gsgo.top_k(
+                             '0043231', 5, namespace='cellular_component')])
+        self.assertEqual([], gsgo.top_k('0043231', 5, namespace='other'))
+
+    def test_similarity_matrix(self):
+        """ Test the similarity_matrix function. """
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE2)
+        goids = ['0043229', '0043231', '0044424', '0005575', '0005623']
+        for graph in [terms, PyGoLib(terms).compile()]:
+            gsgo = GsesameGO(graph)
+            matrix = gsgo.similarity_matrix(goids)
+            self.assertEqual((5, 5), matrix.shape)
+            for (cnt1, id1) in enumerate(goids):
+                for (cnt2, id2) in enumerate(goids):
+                    self.assertAlmostEqual(gsgo.scores(id1, id2),
+                                           matrix[cnt1, cnt2])
+
 
 class GsesameGeneTests(unittest.TestCase):
     """ GsesameGene tests. """
@@ -120,6 +222,8 @@ class GsesameGeneTests(unittest.TestCase):
         self.assertEqual(output, sesamegene.scores(gene1, gene2))
 
 
-suite = unittest.TestLoader().loadTestsFromTestCase(GsesameGOTests)
-suite = unittest.TestLoader().loadTestsFromTestCase(GsesameGeneTests)
+suite = unittest.TestSuite([
+    unittest.TestLoader().loadTestsFromTestCase(GsesameGOTests),
+    unittest.TestLoader().loadTestsFromTestCase(GsesameGeneTests),
+])
 unittest.TextTestRunner(verbosity=2).run(suite)
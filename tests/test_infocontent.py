@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the information content based similarities.
+"""
+
+import math
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.abspath('../'))
+from src import PyGoLibException
+from src.gafio import GafIO
+from src.infocontent import (corpus_key, InfoContent, InfoContentGO,
+                             InfoContentGene)
+from src.oboio import OboIO
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test.obo' % folder
+GOFILE2 = '%s/test2.obo' % folder
+
+GAF = """!gaf-version: 2.0
+DB\tP1\tGENE1\t\t5\tREF\tIDA\t\tP\t\t\tprotein\ttaxon:1\t20120101\tDB
+DB\tP1\tGENE1\t\t9\tREF\tIDA\t\tP\t\t\tprotein\ttaxon:1\t20120101\tDB
+DB\tP2\tGENE2\t\t9\tREF\tIDA\t\tP\t\t\tprotein\ttaxon:1\t20120101\tDB
+DB\tP3\tGENE3\t\t11\tREF\tIDA\t\tP\t\t\tprotein\ttaxon:1\t20120101\tDB
+DB\tP4\tGENE4\t\t2\tREF\tIDA\t\tP\t\t\tprotein\ttaxon:1\t20120101\tDB
+"""
+
+
+class InfoContentTests(unittest.TestCase):
+    """ InfoContent tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def get_table(self):
+        """ Return the InfoContent of the test ontology. """
+        terms = OboIO().get_graph(GOFILE)
+        index = GafIO(terms).get_gene_index(StringIO(GAF), key='symbol')
+        return InfoContent(terms, index)
+
+    def test_info_content(self):
+        """ Test the computation of the IC of the terms. """
+        table = self.get_table()
+        self.assertEqual(5, table.counts[table.graph.term_index('0')])
+        self.assertEqual(3, table.counts[table.graph.term_index('3')])
+        self.assertEqual(0, table.get('1'))
+        self.assertAlmostEqual(math.log(5 / 3.), table.get('3'))
+        self.assertAlmostEqual(math.log(5), table.get('11'))
+        # No annotation
+        self.assertEqual(0, table.get('8'))
+
+    def test_save(self):
+        """ Test saving and loading the table of IC. """
+        table = self.get_table()
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'test.ic')
+            gaf = os.path.join(folder, 'test.gaf')
+            stream = open(gaf, 'w')
+            stream.write(GAF)
+            stream.close()
+            corpus = corpus_key(gaf)
+            self.assertEqual(corpus, corpus_key(gaf, []))
+            table.corpus = corpus
+            table.save(filename)
+            loaded = InfoContent.load(filename, table.graph, corpus=corpus)
+            self.assertEqual(table.values, loaded.values)
+            self.assertEqual(table.counts, loaded.counts)
+            self.assertEqual(corpus, loaded.corpus)
+            # The table is refused for other annotations
+            self.assertRaises(PyGoLibException, InfoContent.load, filename,
+                              table.graph, corpus=corpus_key(gaf, ['IEA']))
+            stream = open(gaf, 'a')
+            stream.write(GAF.splitlines()[-1] + '\n')
+            stream.close()
+            self.assertRaises(PyGoLibException, InfoContent.load, filename,
+                              table.graph, corpus=corpus_key(gaf))
+            self.assertRaises(PyGoLibException, InfoContent.load, filename,
+                              OboIO().get_graph(GOFILE2))
+            stream = open(filename, 'w')
+            stream.write('garbage')
+            stream.close()
+            self.assertRaises(PyGoLibException, InfoContent.load, filename,
+                              table.graph)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_scores(self):
+        """ Test the Resnik, Lin and Jiang-Conrath similarities. """
+        table = self.get_table()
+        icgo = InfoContentGO(table)
+        self.assertEqual('3', icgo.get_mica('9', '11'))
+        ic3 = math.log(5 / 3.)
+        self.assertAlmostEqual(ic3, icgo.scores('9', '11'))
+        self.assertEqual(0, icgo.scores('5', '9'))
+        icgo = InfoContentGO(table, measure='lin')
+        self.assertAlmostEqual(2 * ic3 / (math.log(2.5) + math.log(5)),
+                               icgo.scores('9', '11'))
+        self.assertEqual(1, icgo.scores('9', '9'))
+        self.assertEqual(1, icgo.scores('0', '0'))
+        icgo = InfoContentGO(table, measure='jc')
+        self.assertAlmostEqual(
+            1 / (1 + math.log(2.5) + math.log(5) - 2 * ic3),
+            icgo.scores('9', '11'))
+        self.assertRaises(PyGoLibException, InfoContentGO, table, 'other')
+
+        icgene = InfoContentGene(table, measure='lin')
+        self.assertEqual(1, icgene.scores(['5', '9'], ['9', '5']))
+        lin = InfoContentGO(table, measure='lin').scores('11', '9')
+        self.assertAlmostEqual((2 + lin) / 3,
+                               icgene.scores(['9'], ['11', '9']))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(InfoContentTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
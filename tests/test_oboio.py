@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the OboIO class.
+"""
+
+import gzip
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.abspath('../'))
+from src import PyGoLibException, __version__
+from src.oboio import OboIO, Term, _split_stanzas
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test.obo' % folder
+
+OBO = """format-version: 1.2
+
+[Term]
+id: GO:1
+name: root
+def: "The root of the ontology." []
+synonym: "top" EXACT []
+synonym: "all" BROAD []
+
+[Typedef]
+id: part_of
+name: part of
+
+[Term]
+id: GO:2
+name: child
+alt_id: GO:3
+is_a: GO:1 ! root
+relationship: part_of GO:1 ! root
+[Instance]
+id: inst
+instance_of: GO:1
+"""
+
+
+class OboIOTests(unittest.TestCase):
+    """ OboIO tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def test_iter_terms(self):
+        """ Test the iter_terms function. """
+        obio = OboIO()
+        terms = list(obio.iter_terms(StringIO(OBO)))
+        self.assertEqual(['GO:1', 'GO:2'], [term['id'] for term in terms])
+        self.assertEqual({'id': 'GO:2', 'name': 'child', 'alt_id': 'GO:3',
+                          'is_a': 'GO:1 ! root', 'part_of': 'GO:1'},
+                         terms[1])
+        terms = list(obio.iter_terms(GOFILE))
+        self.assertEqual(12, len(terms))
+        self.assertEqual(['12'], [term['alt_id'] for term in terms
+                                  if term['id'] == '7'])
+
+    def test_get_graph(self):
+        """ Test the get_graph function. """
+        obio = OboIO()
+        graph = obio.get_graph(StringIO(OBO))
+        self.assertEqual(['GO:1', 'GO:2', 'GO:3'], sorted(graph))
+        self.assertTrue(graph['GO:3'] is graph['GO:2'])
+        graph = OboIO().get_graph(GOFILE, no_check_unique=False)
+        self.assertEqual(15, len(graph))
+
+    def test_get_graph_jobs(self):
+        """ Test the get_graph function with several processes. """
+        ranges = _split_stanzas(GOFILE, 5)
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(os.path.getsize(GOFILE), ranges[-1][1])
+        content = open(GOFILE, 'rb').read()
+        for (start, stop) in ranges[1:]:
+            self.assertTrue(content[start:].startswith('['))
+        for no_check_unique in (True, False):
+            graph = OboIO().get_graph(GOFILE, no_check_unique=no_check_unique)
+            parallel = OboIO().get_graph(
+                GOFILE, no_check_unique=no_check_unique, jobs=3)
+            self.assertEqual(sorted(graph), sorted(parallel))
+            for termid in graph:
+                self.assertEqual(graph[termid].dump(),
+                                 parallel[termid].dump())
+            self.assertTrue(parallel['13'] is parallel['8'])
+            self.assertTrue(parallel['8'].is_a[0] is parallel['6'].id)
+
+    def test_term(self):
+        """ Test the Term read from an OBO file. """
+        folder = tempfile.mkdtemp()
+        try:
+            obofile = os.path.join(folder, 'test.obo')
+            stream = open(obofile, 'w')
+            stream.write(OBO)
+            stream.close()
+            graph = OboIO().get_graph(obofile)
+            term = graph['GO:1']
+            self.assertTrue(isinstance(term, Term))
+            self.assertEqual(None, term.fields)
+            self.assertEqual('"The root of the ontology." []', term['def'])
+            self.assertEqual(['"top" EXACT []', '"all" BROAD []'],
+                             term['synonym'])
+            self.assertEqual(['id', 'name', 'def', 'synonym'],
+                             term.keys()[:2] + sorted(term.keys()[2:]))
+            term = graph['GO:3']
+            self.assertEqual(('GO:1',), term.is_a)
+            self.assertEqual('GO:1', term['is_a'])
+            self.assertEqual('GO:1', term['part_of'])
+            self.assertFalse('def' in term)
+            self.assertTrue(term.is_a[0] is graph['GO:1'].id)
+            self.assertEqual(term, pickle.loads(pickle.dumps(term)))
+
+            # Changing a field read from the file keeps them in memory
+            term = graph['GO:1']
+            term['comment'] = 'A comment'
+            self.assertEqual(None, term.source)
+            self.assertEqual('A comment', term['comment'])
+            self.assertEqual(['"top" EXACT []', '"all" BROAD []'],
+                             term.get('synonym'))
+            term['is_a'] = ['GO:0 ! other root']
+            self.assertEqual(('GO:0',), term.is_a)
+
+            # The fields are not read from a file which changed
+            term = graph['GO:3']
+            stream = open(obofile, 'w')
+            stream.write(OBO.replace('[Term]', '[Term]\n', 1))
+            stream.close()
+            self.assertRaises(PyGoLibException, term.get_fields)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_write_down_ontology(self):
+        """ Test the write_down_ontology function. """
+        folder = tempfile.mkdtemp()
+        try:
+            obofile = os.path.join(folder, 'test.obo')
+            stream = open(obofile, 'w')
+            stream.write(OBO)
+            stream.close()
+            obio = OboIO()
+            graph = obio.get_graph(obofile)
+            output = StringIO()
+            self.assertEqual(2, obio.write_down_ontology(output))
+            self.assertEqual(
+                'format-version: 1.2\n'
+                'auto-generated-by: pygolib %s\n\n'
+                '[Term]\nid: GO:1\nname: root\n'
+                'def: "The root of the ontology." []\n'
+                'synonym: "top" EXACT []\nsynonym: "all" BROAD []\n\n'
+                '[Term]\nid: GO:2\nname: child\nalt_id: GO:3\n'
+                'is_a: GO:1 ! root\nrelationship: part_of GO:1 ! root\n\n'
+                % __version__, output.getvalue())
+
+            # Any iterable of terms, written once in the same order
+            outfile = os.path.join(folder, 'out.obo')
+            obio.write_down_ontology(
+                outfile, terms=[graph['GO:3'], graph['GO:1'], graph['GO:2']])
+            self.assertEqual(output.getvalue(), open(outfile).read())
+            terms = list(obio.iter_terms(outfile))
+            self.assertEqual(['GO:1', 'GO:2'], [term['id'] for term in terms])
+
+            # Compressed files are identical from one run to the other
+            gzfile = os.path.join(folder, 'out.obo.gz')
+            obio.write_down_ontology(gzfile, header={'data-version': '1'})
+            content = open(gzfile, 'rb').read()
+            obio.write_down_ontology(gzfile, header={'data-version': '1'})
+            self.assertEqual(content, open(gzfile, 'rb').read())
+            self.assertTrue('data-version: 1\n' in
+                            gzip.open(gzfile).read())
+        finally:
+            shutil.rmtree(folder)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(OboIOTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
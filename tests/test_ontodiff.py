@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the comparison of two releases of an ontology.
+"""
+
+import os
+import sys
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.abspath('../'))
+from src import PyGoLib
+from src.gsesame import GsesameGO
+from src.oboio import OboIO
+from src.ontodiff import OntologyDiff, update_compiled
+
+OLD = """[Term]
+id: 1
+name: root
+
+[Term]
+id: 2
+is_a: 1
+
+[Term]
+id: 3
+is_a: 1
+
+[Term]
+id: 4
+is_a: 2
+
+[Term]
+id: 5
+is_a: 4
+
+[Term]
+id: 6
+is_a: 3
+
+[Term]
+id: 7
+is_a: 3
+
+[Term]
+id: 8
+is_a: 7
+"""
+
+NEW = """[Term]
+id: 1
+name: root
+
+[Term]
+id: 2
+is_a: 1
+
+[Term]
+id: 3
+is_a: 1
+
+[Term]
+id: 4
+is_a: 3
+relationship: part_of 2
+
+[Term]
+id: 5
+is_a: 4
+
+[Term]
+id: 6
+is_a: 3
+is_obsolete: true
+
+[Term]
+id: 8
+is_a: 3
+
+[Term]
+id: 9
+is_a: 8
+"""
+
+
+class OntologyDiffTests(unittest.TestCase):
+    """ OntologyDiff tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def test_diff(self):
+        """ Test the changes found between two releases. """
+        old = OboIO().get_graph(StringIO(OLD))
+        new = OboIO().get_graph(StringIO(NEW))
+        diff = OntologyDiff(old, new)
+        self.assertEqual(set(['9']), diff.added)
+        self.assertEqual(set(['7']), diff.removed)
+        self.assertEqual(set(['6']), diff.obsoleted)
+        self.assertEqual(set(['4', '8']), diff.reparented)
+        self.assertEqual(set(['4', '5', '8', '9']), diff.get_affected())
+        self.assertTrue(diff.is_stable('6'))
+        self.assertFalse(diff.is_stable('5'))
+        self.assertTrue('1 terms removed' in diff.summary())
+
+    def test_update_compiled(self):
+        """ Test building the compiled graph of a new release from the one
+        of the old release. """
+        old = PyGoLib(OboIO().get_graph(StringIO(OLD))).compile()
+        old.build_closure(details=False)
+        gsgo = GsesameGO(old)
+        for termid in old.ids:
+            gsgo.get_term_values(termid)
+        new = OboIO().get_graph(StringIO(NEW))
+        compiled = update_compiled(old, new)
+        # 1, 2, 3 and 6 kept their semantic values
+        self.assertEqual(4, len(compiled.caches['gsesame']))
+
+        expected = PyGoLib(OboIO().get_graph(StringIO(NEW))).compile()
+        for details in (False, True):
+            for idx in xrange(len(expected.ids)):
+                self.assertEqual(
+                    list(expected.ancesters_sorted(idx, details=details)),
+                    list(compiled.ancesters_sorted(idx, details=details)))
+        expected = GsesameGO(expected)
+        gsgo = GsesameGO(compiled)
+        for termid in compiled.ids:
+            self.assertEqual(expected.semantic_values(termid),
+                             gsgo.semantic_values(termid))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(OntologyDiffTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the persistent cache of the scores.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath('../'))
+from src.godistance import GoDistanceCounter
+from src.gsesame import GsesameGO
+from src.oboio import OboIO
+from src.parallel import iter_pairs, score_pairs
+from src.scorecache import CachedScorer, ScoreCache, pair_key
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test.obo' % folder
+
+
+class CountingScorer(object):
+    """ Scorer counting the pairs it scores. """
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+        self.calls = 0
+
+    def scores(self, id1, id2):
+        self.calls = self.calls + 1
+        return self.scorer.scores(id1, id2)
+
+
+class ScoreCacheTests(unittest.TestCase):
+    """ ScoreCache tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def setUp(self):
+        """ Work in a temporary folder. """
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'scores.sqlite')
+        self.terms = OboIO().get_graph(GOFILE)
+
+    def tearDown(self):
+        """ Remove the temporary folder. """
+        shutil.rmtree(self.folder)
+
+    def test_score_cache(self):
+        """ Test the ScoreCache class. """
+        self.assertEqual(pair_key('5', '11'), pair_key('11', '5'))
+        self.assertEqual(pair_key(('5', '9'), ('11',)),
+                         pair_key(('11',), ('9', '5')))
+        cache = ScoreCache(self.filename, 'v1', 'distance', maxsize=3)
+        cache.set_many([('5', '11', (7, 1)), ('5', '9', None),
+                        ('1', '2', (1, 1))])
+        self.assertEqual({('11', '5'): (7, 1)},
+                         cache.get_many([('11', '5'), ('5', '9')]))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        # Another version or measure does not see the scores
+        other = ScoreCache(self.filename, 'v2', 'distance')
+        self.assertEqual({}, other.get_many([('5', '11')]))
+
+        # The least recently used scores are removed
+        cache.set_many([('3', '4', (1, 0)), ('6', '7', (2, 0))])
+        self.assertEqual(3, len(cache))
+        # The uses of the scores read are only written by flush()
+        changes = cache.conn.total_changes
+        self.assertEqual(['11', '3', '6'], sorted(
+            first for (first, second) in cache.get_many(
+                [('11', '5'), ('1', '2'), ('3', '4'), ('6', '7')])))
+        self.assertEqual(changes, cache.conn.total_changes)
+        cache.flush()
+        self.assertEqual(changes + 3, cache.conn.total_changes)
+        cache.close()
+        cache = ScoreCache(self.filename, 'v1', 'distance')
+        self.assertEqual(3, len(cache.get_many(
+            [('11', '5'), ('3', '4'), ('6', '7')])))
+
+    def test_score_pairs(self):
+        """ Test the score_pairs function with a cache. """
+        pairs = list(iter_pairs([str(cnt) for cnt in range(12)]))
+        expected = list(score_pairs(GsesameGO(self.terms), pairs))
+        for jobs in (1, 2):
+            scorer = CountingScorer(GsesameGO(self.terms))
+            cache = ScoreCache(self.filename, 'v%s' % jobs, 'gs_godistance')
+            self.assertEqual(expected[:20], list(score_pairs(
+                scorer, pairs[:20], jobs=jobs, chunksize=7, cache=cache)))
+            self.assertEqual(expected, list(score_pairs(
+                scorer, pairs, jobs=jobs, chunksize=7, cache=cache)))
+            self.assertEqual(len(pairs), cache.misses)
+            self.assertEqual(20, cache.hits)
+            if jobs == 1:
+                self.assertEqual(len(pairs), scorer.calls)
+
+    def test_cached_scorer(self):
+        """ Test the CachedScorer class. """
+        cache = ScoreCache(self.filename, 'v1', 'distance')
+        counter = CountingScorer(GoDistanceCounter(self.terms))
+        scorer = CachedScorer(counter, cache, batch_size=2)
+        self.assertEqual((7, 1), scorer.scores('5', '11'))
+        self.assertEqual((7, 1), scorer.scores('11', '5'))
+        self.assertEqual(1, counter.calls)
+        self.assertEqual(0, len(cache))
+        scorer.scores('5', '9')
+        self.assertEqual(2, len(cache))
+        scorer = CachedScorer(counter, cache)
+        self.assertEqual((7, 1), scorer.scores('11', '5'))
+        self.assertEqual(2, counter.calls)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(ScoreCacheTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
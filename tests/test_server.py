@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the query server and its client.
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath('../'))
+from src import PyGoLib, PyGoLibException
+from src.godistance import GoDistanceCounter
+from src.gsesame import GsesameGO
+from src.oboio import OboIO
+from src.server import Batcher, GoClient, GoServer, parse_address
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test.obo' % folder
+
+
+class UnpicklableScorer(object):
+    """ A scorer whose scores cannot be sent back by a worker process.
+    """
+
+    def scores(self, id1, id2):
+        """ Return a score which cannot be pickled. """
+        return lambda: None
+
+
+class GoServerTests(unittest.TestCase):
+    """ GoServer tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def setUp(self):
+        """ Start a server on a free port. """
+        terms = OboIO().get_graph(GOFILE)
+        self.graph = PyGoLib(terms).compile()
+        self.app = GoServer(self.graph, batch_size=4)
+        self.server = self.app.get_http_server('localhost:0')
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.address = 'localhost:%s' % self.server.server_address[1]
+
+    def tearDown(self):
+        """ Stop the server. """
+        self.server.shutdown()
+        self.server.server_close()
+        self.app.batcher.close()
+
+    def test_parse_address(self):
+        """ Test the parse_address function. """
+        self.assertEqual((2, ('localhost', 8080)),
+                         parse_address('http://localhost:8080/'))
+        self.assertEqual('/tmp/go.sock', parse_address('unix:/tmp/go.sock')[1])
+        self.assertRaises(PyGoLibException, parse_address, 'localhost:go')
+
+    def test_info(self):
+        """ Test the info and tree requests. """
+        client = GoClient(self.address)
+        term = dict(client.get_term('13'))
+        self.assertEqual('8', term['id'])
+        self.assertEqual(['13', '14'], term['alt_id'])
+        self.assertRaises(KeyError, client.get_term, '99')
+        (termid, tree) = client.get_tree('11')
+        self.assertEqual('11', termid)
+        self.assertEqual([(0, '10 ! .'), (1, '7 ! E'), (2, '3 ! C'),
+                          (3, '1 ! A'), (4, '0 ! root')], tree)
+        (termid, tree) = client.get_tree('11', shared=True)
+        self.assertEqual([(0, '10', True), (1, '7', True), (2, '3', True),
+                          (3, '1', True), (4, '0', True)], tree)
+        self.assertRaises(PyGoLibException, client.request, 'unknown')
+
+    def test_scores(self):
+        """ Test the scoring requests. """
+        client = GoClient(self.address)
+        pairs = [('5', '9'), ('5', '11'), ('9', '99'), ('11', '12'),
+                 ('8', '10'), ('4', '6')]
+        scorer = client.get_scorer('distance')
+        gdc = GoDistanceCounter(self.graph)
+        self.assertEqual(gdc.scores('5', '9'), scorer.scores('5', '9'))
+        expected = [(id1, id2, None if id2 == '99' else gdc.scores(id1, id2))
+                    for (id1, id2) in pairs]
+        self.assertEqual(expected, list(scorer.score_pairs(pairs,
+                                                           chunksize=4)))
+        scorer = client.get_scorer('gs_genedistance')
+        self.assertTrue(scorer.scores(['5', '9'], ['11', '4']) > 0)
+
+    def test_batching(self):
+        """ Test the requests sent concurrently. """
+        gsgo = GsesameGO(self.graph)
+        terms = [str(cnt) for cnt in range(12)]
+        results = {}
+
+        def query(term):
+            """ Score a term against all the others. """
+            scorer = GoClient(self.address).get_scorer('gs_godistance')
+            results[term] = list(scorer.score_pairs(
+                [(term, other) for other in terms]))
+
+        threads = [threading.Thread(target=query, args=(term,))
+                   for term in terms]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for term in terms:
+            self.assertEqual(
+                [(term, other, gsgo.scores(term, other)) for other in terms],
+                results[term])
+
+    def test_failed_batch(self):
+        """ Test a batch which fails in a worker process. """
+        batcher = Batcher({'distance': UnpicklableScorer()}, jobs=2,
+                          batch_size=2)
+        try:
+            for _ in range(5):
+                self.assertEqual([None] * 3, batcher.score(
+                    'distance', [('5', '9'), ('5', '11'), ('4', '6')]))
+        finally:
+            batcher.close()
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(GoServerTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
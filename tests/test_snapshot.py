@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the snapshots of the ontologies.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath('../'))
+from src.gsesame import GsesameGO
+from src.oboio import OboIO
+from src.snapshot import get_snapshot_name, load_ontology, read_snapshot
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test3.obo' % folder
+
+
+class SnapshotTests(unittest.TestCase):
+    """ Snapshot tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def setUp(self):
+        """ Work on a copy of the ontology in a temporary folder. """
+        self.folder = tempfile.mkdtemp()
+        self.gofile = os.path.join(self.folder, 'test3.obo')
+        shutil.copy(GOFILE, self.gofile)
+
+    def tearDown(self):
+        """ Remove the temporary folder. """
+        shutil.rmtree(self.folder)
+
+    def test_load_ontology(self):
+        """ Test the load_ontology function. """
+        terms = OboIO().get_graph(GOFILE)
+        graph = load_ontology(self.gofile, cache_dir=self.folder)
+        snapshot = get_snapshot_name(self.gofile, cache_dir=self.folder)
+        self.assertTrue(os.path.exists(snapshot))
+        self.assertEqual(terms, graph)
+        graph = load_ontology(self.gofile, cache_dir=self.folder)
+        self.assertEqual(terms, graph)
+
+    def test_load_compiled(self):
+        """ Test loading a compiled graph from its snapshot. """
+        graph = load_ontology(self.gofile, cache_dir=self.folder,
+                              compiled=True)
+        cached = load_ontology(self.gofile, cache_dir=self.folder,
+                               compiled=True)
+        self.assertTrue(cached.is_compiled)
+        self.assertEqual(graph.ids, cached.ids)
+        self.assertEqual(graph.closure, cached.closure)
+        self.assertEqual(GsesameGO(graph).scores('0043229', '0043231'),
+                         GsesameGO(cached).scores('0043229', '0043231'))
+
+    def test_outdated_snapshot(self):
+        """ Test that a snapshot is rebuilt when the file changes. """
+        graph = load_ontology(self.gofile, cache_dir=self.folder)
+        self.assertFalse('0000001' in graph)
+        stream = open(self.gofile, 'a')
+        stream.write('\n[Term]\nid: 0000001\nname: new\n')
+        stream.close()
+        graph = load_ontology(self.gofile, cache_dir=self.folder)
+        self.assertTrue('0000001' in graph)
+        # Same content, different modification time
+        mtime = os.stat(self.gofile).st_mtime + 10
+        os.utime(self.gofile, (mtime, mtime))
+        graph = load_ontology(self.gofile, cache_dir=self.folder)
+        self.assertTrue('0000001' in graph)
+
+    def test_truncated_snapshot(self):
+        """ Test that a truncated snapshot is not read. """
+        graph = load_ontology(self.gofile, cache_dir=self.folder,
+                              compiled=True)
+        snapshot = get_snapshot_name(self.gofile, cache_dir=self.folder,
+                                     compiled=True)
+        stream = open(snapshot, 'r+b')
+        stream.truncate(os.path.getsize(snapshot) - 10)
+        stream.close()
+        self.assertEqual(None, read_snapshot(snapshot, self.gofile))
+        cached = load_ontology(self.gofile, cache_dir=self.folder,
+                               compiled=True)
+        self.assertEqual(graph.closure, cached.closure)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(SnapshotTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This project is licensed under the New BSD License:
+
+Copyright (c) 2012, Pierre-Yves Chibon
+
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+* Redistributions of source code must retain the above copyright notice,
+this list of conditions and the following disclaimer.
+* Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+* Neither the name of the Wageningen University nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ''AS IS'' AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS OR CONTRIBUTORS BE
+LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+"""
+Unit-tests for the SQLite databases of the ontologies.
+"""
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath('../'))
+from src import PyGoLib, PyGoLibException
+from src.godistance import GoDistanceCounter
+from src.gsesame import GsesameGO
+from src.oboio import OboIO
+from src.sqlstore import SqliteGraph, get_store_name, load_store
+
+if os.path.dirname(__file__):
+    folder = os.path.dirname(__file__)
+else:
+    folder = '.'
+GOFILE = '%s/test.obo' % folder
+
+
+class SqliteGraphTests(unittest.TestCase):
+    """ SqliteGraph tests. """
+
+    def __init__(self, methodName='runTest'):
+        """ Constructor. """
+        unittest.TestCase.__init__(self, methodName)
+
+    def setUp(self):
+        """ Work on a copy of the ontology in a temporary folder. """
+        self.folder = tempfile.mkdtemp()
+        self.gofile = os.path.join(self.folder, 'test.obo')
+        shutil.copy(GOFILE, self.gofile)
+        self.terms = OboIO().get_graph(self.gofile)
+
+    def tearDown(self):
+        """ Remove the temporary folder. """
+        shutil.rmtree(self.folder)
+
+    def test_load_store(self):
+        """ Test the load_store function. """
+        graph = load_store(self.gofile, cache_dir=self.folder, cache_size=4)
+        database = get_store_name(self.gofile, cache_dir=self.folder)
+        self.assertEqual(database, graph.database)
+        self.assertEqual(sorted(self.terms), sorted(graph))
+        self.assertEqual(len(self.terms), len(graph))
+        for key in self.terms:
+            self.assertEqual(self.terms[key], graph[key])
+        self.assertTrue(graph['13'] is graph['8'])
+        self.assertTrue(graph['8'].is_a[0] is graph['6'].id)
+        self.assertFalse('99' in graph)
+        self.assertRaises(KeyError, graph.__getitem__, '99')
+        self.assertEqual(4, len(graph.cache))
+        graph = pickle.loads(pickle.dumps(graph))
+        self.assertEqual(self.terms['8'], graph['8'])
+
+        # Only a change of the content rebuilds the database
+        inode = os.stat(database).st_ino
+        os.utime(self.gofile, (time.time() + 10, time.time() + 10))
+        load_store(self.gofile, cache_dir=self.folder)
+        self.assertEqual(inode, os.stat(database).st_ino)
+        stream = open(self.gofile, 'a')
+        stream.write('\n[Term]\nid: 99\nname: new\nis_a: 0\n')
+        stream.close()
+        graph = load_store(self.gofile, cache_dir=self.folder)
+        self.assertEqual(('0',), graph['99'].is_a)
+
+        self.assertRaises(PyGoLibException, SqliteGraph, self.gofile)
+
+    def test_queries(self):
+        """ Test the ancestors, descendants and scores of the terms. """
+        graph = load_store(self.gofile, cache_dir=self.folder)
+        golib = PyGoLib(self.terms)
+        store = PyGoLib(graph)
+        for key in self.terms:
+            for details in (False, True):
+                self.assertEqual(golib.get_ancesters(key, details),
+                                 store.get_ancesters(key, details))
+                self.assertEqual(golib.get_descendants(key, details),
+                                 store.get_descendants(key, details))
+        self.assertEqual(sorted(golib.get_sub_graph(self.terms, '6')),
+                         sorted(store.get_sub_graph(graph, '6')))
+        for (id1, id2) in [('5', '11'), ('9', '13'), ('8', '10')]:
+            self.assertEqual(GsesameGO(self.terms).scores(id1, id2),
+                             GsesameGO(graph).scores(id1, id2))
+            self.assertEqual(GoDistanceCounter(self.terms).scores(id1, id2),
+                             GoDistanceCounter(graph).scores(id1, id2))
+        for key in ('5', '9', '11'):
+            self.assertEqual(GsesameGO(self.terms).top_k(key, 3),
+                             GsesameGO(graph).top_k(key, 3))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(SqliteGraphTests)
+unittest.TextTestRunner(verbosity=2).run(suite)
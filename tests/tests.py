@@ -36,20 +36,74 @@ THE POSSIBILITY OF SUCH DAMAGE.
 Unit-tests for the goutil library.
 """
 
+import BaseHTTPServer
+import gzip
+import json
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
+from StringIO import StringIO
 
 sys.path.insert(0, os.path.abspath('../'))
-from src import PyGoLib
+from src import (PyGoLib, NullProfiler, Profiler, PyGoLibException,
+                 download_go_graph)
 from src.godistance import GoDistanceCounter
+from src.gsesame import GsesameGene
 from src.oboio import OboIO
+from src.parallel import iter_pairs, read_pairs, score_pairs
 
 if os.path.dirname(__file__):
     folder = os.path.dirname(__file__)
 else:
     folder = '.'
 GOFILE = '%s/test.obo' % folder
+GOFILE3 = '%s/test3.obo' % folder
+
+
+class OntologyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serve the test ontology, plain or compressed with gzip, like
+    geneontology.org does.
+    """
+    content = open(GOFILE, 'rb').read()
+    etag = '"1"'
+    # Number of bytes sent before cutting the connection, None to send
+    # the whole file
+    cut = None
+    requests = []
+
+    def do_GET(self):
+        """ Send the ontology, or a part of it. """
+        self.requests.append(dict(self.headers))
+        content = self.content
+        if self.path.endswith('.gz'):
+            stream = StringIO()
+            gzfile = gzip.GzipFile(fileobj=stream, mode='wb', mtime=0)
+            gzfile.write(content)
+            gzfile.close()
+            content = stream.getvalue()
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get('Range') and \
+                self.headers.get('If-Range') == self.etag:
+            start = int(self.headers['Range'][6:-1])
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', len(content) - start)
+        self.end_headers()
+        self.wfile.write(content[start:self.cut])
+
+    def log_message(self, *args):
+        """ Keep the output of the tests quiet. """
+        pass
+
 
 class GoDistanceCounterTests(unittest.TestCase):
     """ GoDistanceCounter tests. """
@@ -78,6 +132,103 @@ class GoDistanceCounterTests(unittest.TestCase):
         output = ['2,1,0']
         self.assertEqual(output, 
                 golib.get_path(term, paths=[]))
+        # The tree shows the name of the parents
+        self.assertEqual('2 ! B', golib.get_label('2'))
+        self.assertEqual('x', PyGoLib({'x': {'id': 'x'}}).get_label('x'))
+
+    def test_iter_paths(self):
+        """ Test the iter_paths and iter_tree functions. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        golib = PyGoLib(terms)
+        self.assertEqual([('4', '2', '1', '0')],
+                         list(golib.iter_paths(terms['4'])))
+        # The paths given are not filled by the next calls
+        paths = golib.get_path(terms['4'])
+        self.assertEqual(['2,1,0'], golib.get_path(terms['4']))
+        self.assertEqual(['2,1,0'], paths)
+
+        terms = {'a': {'id': 'a'},
+                 'b': {'id': 'b', 'is_a': 'a'},
+                 'c': {'id': 'c', 'is_a': ['a ! A', 'b'], 'part_of': 'b'},
+                 'd': {'id': 'd', 'is_a': ['c', 'c']}}
+        golib = PyGoLib(terms)
+        self.assertEqual([('d', 'c', 'a'), ('d', 'c', 'b', 'a')] * 2,
+                         list(golib.iter_paths(terms['d'])))
+        self.assertEqual([('d', 'c', 'a'), ('d', 'c', 'b', 'a')],
+                         list(golib.iter_paths(terms['d'], unique=True)))
+        self.assertEqual([('d', 'c', 'a')],
+                         list(golib.iter_paths(terms['d'], max_paths=1)))
+        self.assertEqual(
+            [('c', 'is_a', 'a'), ('c', 'is_a', 'b', 'is_a', 'a'),
+             ('c', 'part_of', 'b', 'is_a', 'a')],
+            list(golib.iter_paths(terms['c'], details=True)))
+        self.assertEqual(['c,is_a,a', 'c,is_a,b,is_a,a',
+                          'c,part_of,b,is_a,a'],
+                         golib.get_path(terms['c'], pred='c', details=True))
+        self.assertEqual([(0, 'a', 'is_a'), (0, 'b', 'is_a'),
+                          (1, 'a', 'is_a')],
+                         list(golib.iter_tree(terms['c'])))
+        self.assertEqual([(0, 'a', 'is_a')],
+                         list(golib.iter_tree(terms['c'], max_paths=1)))
+
+        # The depth of the graph is not limited by the recursion limit
+        terms = {'0': {'id': '0'}}
+        for cnt in range(1, 2000):
+            terms[str(cnt)] = {'id': str(cnt), 'is_a': str(cnt - 1)}
+        golib = PyGoLib(terms)
+        self.assertEqual(2000,
+                         len(list(golib.iter_paths(terms['1999']))[0]))
+        self.assertEqual(1999, len(list(golib.iter_tree(terms['1999']))))
+
+    def test_iter_dag(self):
+        """ Test the iter_dag and export_ancesters functions. """
+        terms = OboIO().get_graph(GOFILE3)
+        golib = PyGoLib(terms)
+        term = terms['0043231']
+        self.assertEqual(
+            [(0, '0043227', True), (1, '0043226', True),
+             (2, '0005575', True), (0, '0043229', True),
+             (1, '0043226', False), (1, '0044424', True),
+             (2, '0044464', True), (3, '0005575', False)],
+            [(level, parent, expanded) for (level, parent, _, expanded)
+             in golib.iter_dag(term)])
+        # The same ancesters as the tree, each of them expanded once
+        for details in (False, True):
+            tree = set(parent for (_, parent, _) in
+                       golib.iter_tree(term, details=details))
+            lines = list(golib.iter_dag(term, details=details))
+            expanded = [line[1] for line in lines if line[3]]
+            self.assertEqual(sorted(tree), sorted(expanded))
+            edges = golib.get_ancester_edges(term, details=details)
+            self.assertEqual(len(lines), len(edges))
+            self.assertEqual(len(edges), len(set(edges)))
+        self.assertTrue(('0044424', '0005622', 'part_of') in edges)
+
+        dot = golib.export_ancesters(term)
+        self.assertTrue(dot.startswith('digraph "0043231" {'))
+        self.assertTrue('  "0043229" -> "0043226";' in dot)
+        graph = json.loads(golib.export_ancesters(term, fmt='json',
+                                                  details=True))
+        self.assertEqual('0043231', graph['term'])
+        self.assertEqual(len(edges), len(graph['edges']))
+        self.assertEqual(sorted(golib.get_ancesters('0043231', True)),
+                         [node['id'] for node in graph['nodes']])
+        self.assertRaises(PyGoLibException, golib.export_ancesters, term,
+                          fmt='png')
+
+    def test_get_ancesters(self):
+        """ Test the get_ancesters and get_common_ancesters functions. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        for graph in [terms, PyGoLib(terms).compile()]:
+            golib = PyGoLib(graph)
+            self.assertEqual(set(['8', '6', '3', '1', '0']),
+                             golib.get_ancesters('13'))
+            self.assertEqual(set(['3', '1', '0']),
+                             golib.get_common_ancesters('9', '11'))
+            self.assertEqual(set(['5', '4', '2', '1', '0']),
+                             golib.get_common_ancesters('5', '5'))
 
     def test_scores(self):
         """ Test the scores function. """
@@ -90,6 +241,39 @@ class GoDistanceCounterTests(unittest.TestCase):
         self.assertEqual((5, 1), gdc.scores('7', '5'))
         self.assertEqual((6, 0), gdc.scores('8', '5'))
 
+    def test_score_pairs(self):
+        """ Test scoring pairs in several processes. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        gdc = GoDistanceCounter(PyGoLib(terms).compile())
+        pairs = list(iter_pairs(['0', '5', ' 7', '8', '9', '11', '13']))
+        self.assertEqual(21, len(pairs))
+        self.assertEqual(('0', '7'), pairs[1])
+        expected = [(id1, id2, gdc.scores(id1, id2)) for (id1, id2) in pairs]
+        self.assertEqual(expected, list(score_pairs(gdc, pairs)))
+        self.assertEqual(expected, list(score_pairs(gdc, iter(pairs), jobs=2,
+                                                    chunksize=4)))
+
+    def test_read_pairs(self):
+        """ Test reading pairs from a stream and scoring them. """
+        stream = ['# GO terms\n', '11\t0\n', '\n', '9 5\n', '7\n',
+                  '12\t404\n']
+        pairs = list(read_pairs(stream))
+        self.assertEqual([('11', '0'), ('9', '5'), ('12', '404')], pairs)
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        gdc = GoDistanceCounter(PyGoLib(terms).compile())
+        self.assertEqual(
+            [('11', '0', (5, 5)), ('9', '5', (6, 0)), ('12', '404', None)],
+            list(score_pairs(gdc, pairs, skip_missing=True)))
+        # The GO terms of the genes are checked too
+        self.assertEqual([(('11',), ('0', '404'), None)], list(score_pairs(
+            GsesameGene(gdc.goterms), [(('11',), ('0', '404'))],
+            skip_missing=True)))
+        self.assertEqual([(('1', '2'), ('3',))],
+                         list(read_pairs(['1, 2,\t3\n', ',\t3\n', '1\t ,\n'],
+                                         genes=True)))
+
     def test_alt_id(self):
         """ Test that a GO term with an alt_id is added to the list. """
         obio = OboIO()
@@ -103,5 +287,136 @@ class GoDistanceCounterTests(unittest.TestCase):
         self.assertEqual((5, 1), gdc.scores('12', '5'))
         self.assertEqual((6, 0), gdc.scores('13', '5'))
 
+    def test_scores_compiled(self):
+        """ Test the scores function on a compiled graph. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        graph = PyGoLib(terms).compile()
+        gdc = GoDistanceCounter(graph)
+        legacy = GoDistanceCounter(terms)
+        self.assertEqual((5, 5), gdc.scores('11', '0'))
+        self.assertEqual((5, 1), gdc.scores('12', '5'))
+        for id1 in ['0', '5', '7', '8', '9', '11', '13']:
+            for id2 in ['0', '1', '5', '6', '10', '12']:
+                self.assertEqual(legacy.scores(id1, id2),
+                                 gdc.scores(id1, id2))
+
+        # The common ancestors a and b are at the same distance of t1 and
+        # t2, the one reached by the first paths is used
+        terms = {'r': {'id': 'r'},
+                 'a': {'id': 'a', 'is_a': 'r'},
+                 'b': {'id': 'b', 'is_a': 'r'},
+                 'c': {'id': 'c', 'is_a': 'b'},
+                 'x': {'id': 'x', 'is_a': 'a'},
+                 'y': {'id': 'y', 'is_a': 'x'},
+                 'z': {'id': 'z', 'is_a': 'b'},
+                 't1': {'id': 't1', 'is_a': ['a', 'c']},
+                 't2': {'id': 't2', 'is_a': ['y', 'z']}}
+        for (parents, expected) in [(['a', 'c'], (4, 2)),
+                                    (['c', 'a'], (4, 0))]:
+            terms['t1']['is_a'] = parents
+            self.assertEqual(expected,
+                             GoDistanceCounter(terms).scores('t1', 't2'))
+            self.assertEqual(expected, GoDistanceCounter(
+                PyGoLib(terms).compile()).scores('t1', 't2'))
+
+    def test_get_sub_graph_compiled(self):
+        """ Test the get_sub_graph function on a compiled graph. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        graph = PyGoLib(terms).compile()
+        subgraph = PyGoLib(graph).get_sub_graph(graph, '3')
+        self.assertEqual(sorted(PyGoLib(terms).get_sub_graph(terms, '3')),
+                         sorted(subgraph))
+        self.assertEqual(['10', '11', '6', '7', '8', '9'], sorted(subgraph))
+
+    def test_get_sub_graph(self):
+        """ Test the get_sub_graph function. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        # '1' is a substring of '10' and '11', which are children of '1'
+        subgraph = PyGoLib(terms).get_sub_graph(terms, '1')
+        self.assertEqual(['10', '11', '2', '3', '4', '5', '6', '7', '8', '9'],
+                         sorted(subgraph))
+        self.assertEqual(set(['8', '9']), PyGoLib(terms).get_descendants('6'))
+        self.assertEqual(set(), PyGoLib(terms).get_descendants('14'))
+
+    def test_profiler(self):
+        """ Test the statistics collected by the Profiler. """
+        obio = OboIO()
+        terms = obio.get_graph(GOFILE)
+        profiler = Profiler()
+        gdc = GoDistanceCounter(terms, profiler=profiler)
+        self.assertTrue(gdc.profiler is profiler)
+        gdc.scores('5', '11')
+        # 1 path for each term, of 4 and 5 edges
+        self.assertEqual(2, profiler.counters['paths'])
+        self.assertEqual(9, profiler.counters['edges'])
+        self.assertEqual(5, profiler.counters['max_depth'])
+        self.assertEqual(1, profiler.timers['score'][1])
+
+        profiler.reset()
+        gdc = GoDistanceCounter(PyGoLib(terms).compile(), profiler=profiler)
+        gdc.scores('5', '11')
+        gdc.scores('5', '9')
+        self.assertEqual(2, profiler.timers['score'][1])
+        self.assertEqual(1, profiler.timers['index'][1])
+        self.assertFalse('paths' in profiler.counters)
+        report = profiler.report()
+        self.assertEqual(2, report['timers']['score']['calls'])
+        self.assertTrue('peak_memory_kb' in report)
+        self.assertTrue('score' in profiler.summary())
+
+        # Nothing is collected unless a Profiler is given
+        gdc = GoDistanceCounter(terms)
+        self.assertTrue(isinstance(gdc.profiler, NullProfiler))
+        gdc.scores('5', '11')
+        self.assertEqual({}, gdc.profiler.counters)
+        self.assertEqual({}, gdc.profiler.timers)
+
+    def test_download_go_graph(self):
+        """ Test the download_go_graph function against a local server.
+        """
+        server = BaseHTTPServer.HTTPServer(('localhost', 0), OntologyHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://localhost:%s/go.obo' % server.server_address[1]
+        workdir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        try:
+            os.chdir(workdir)
+            # An older version which did not change upstream is reused
+            shutil.copy(os.path.join(cwd, GOFILE), 'geneontology-2000.obo')
+            stream = open('geneontology-2000.obo.http', 'w')
+            stream.write('{"url": "%s", "ETag": "\\"1\\""}' % url)
+            stream.close()
+            self.assertEqual('geneontology-2000.obo',
+                             download_go_graph(url=url))
+            self.assertEqual('"1"',
+                             OntologyHandler.requests[-1]['if-none-match'])
+
+            # An interrupted download is resumed
+            OntologyHandler.cut = 100
+            self.assertRaises(PyGoLibException, download_go_graph,
+                              'go2.obo', url=url)
+            self.assertTrue(os.path.exists('go2.obo.part'))
+            OntologyHandler.cut = None
+            self.assertEqual('go2.obo', download_go_graph('go2.obo', url=url))
+            self.assertEqual('bytes=100-',
+                             OntologyHandler.requests[-1]['range'])
+            self.assertEqual(OntologyHandler.content, open('go2.obo').read())
+            self.assertFalse(os.path.exists('go2.obo.part'))
+
+            # A compressed ontology is decompressed
+            self.assertEqual('go3.obo',
+                             download_go_graph('go3.obo', url=url + '.gz'))
+            self.assertEqual(OntologyHandler.content, open('go3.obo').read())
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir)
+            server.shutdown()
+            server.server_close()
+
 suite = unittest.TestLoader().loadTestsFromTestCase(GoDistanceCounterTests)
 unittest.TextTestRunner(verbosity=2).run(suite)